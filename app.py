@@ -1,17 +1,35 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Form
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from pydantic import BaseModel
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-import pandas as pd
+import asyncio
+import contextvars
 import json
 import os
+import time
 from datetime import datetime, timedelta
 from typing import List, Optional
 
-from database import get_db, License, RequestLog, ParsedData, init_db
-from auth import verify_license, create_license_key
-from parser import YandexMapsParser
+from database import get_db, SessionLocal, License, RequestLog, RequestOrganization, SearchJob, SearchBatch, init_db
+from auth import verify_license, create_license_key, license_cache
+from pool import parser_pool, PoolExhausted
+from executor import parser_executor, JobTimeout
+from jobs import job_scheduler, job_to_dict
+from storage import save_organizations, load_request_organizations, organization_to_dict, store_stats
+from cache import search_cache, make_cache_key, normalize
+from enrichment import detail_enricher, DETAIL_MODES
+from exporter import export_stream
+from quota import admit, release, record_request
+from usage import record_usage, usage_history, bucket_start, licenses_page, LICENSE_SORTS, PERIODS
+from maintenance import maintenance
+from batches import create_batch, unique_items, batch_to_dict, batch_request_ids
+from metrics import registry, Trace, current_trace, API_STAGE_SECONDS, PARSER_POOL
+from politeness import politeness, current_priority
+from search_index import search_index, SORTS
+from delta import DeltaTracker, load_diff
 from config import settings
 
 app = FastAPI(title="Yandex Maps Parser", version="1.0.0")
@@ -28,19 +46,71 @@ if not os.path.exists("templates"):
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# Глобальные переменные
-parser_instance = None
+background_tasks = set()
 
-def get_parser():
-    global parser_instance
-    if parser_instance is None:
-        parser_instance = YandexMapsParser(headless=True)
-    return parser_instance
+@app.on_event("startup")
+async def startup_event():
+    # Драйверы запускаются в фоне, приложение начинает принимать запросы сразу
+    asyncio.get_running_loop().run_in_executor(None, parser_pool.prewarm)
+    job_scheduler.resume_pending()
+    task = asyncio.create_task(maintenance.run_periodically())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
 @app.on_event("shutdown")
 def shutdown_event():
-    if parser_instance:
-        parser_instance.close()
+    for task in list(background_tasks):
+        task.cancel()
+    parser_executor.shutdown()
+    parser_pool.close()
+
+def search_or_raise(parser, query: str, city: str, limit: int):
+    """Задача исполнителя: ошибка парсера поднимается, а не становится пустой выдачей"""
+    organizations = parser.search_organizations(query, city, limit)
+    if parser.last_error is not None:
+        raise parser.last_error
+    return organizations
+
+async def run_search(db: Session, query: str, city: str, limit: int):
+    """Поиск через кэш с объединением одинаковых одновременных запросов
+
+    Возвращает список организаций и признак ответа из кэша.
+    """
+    key = make_cache_key(query, city, limit)
+    cached = search_cache.lookup(db, key)
+    if cached is not None:
+        return cached, True
+    
+    future, leader = search_cache.begin(key)
+    if not leader:
+        # shield: таймаут одного ожидающего не отменяет общий future
+        waiter = asyncio.wrap_future(future)
+        try:
+            organizations = await asyncio.wait_for(asyncio.shield(waiter), timeout=settings.TIMEOUT)
+        except asyncio.TimeoutError:
+            # Результат лидера больше никто не прочитает
+            waiter.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise JobTimeout(f"Превышено время ожидания ({settings.TIMEOUT} с)")
+        return [dict(org) for org in organizations], True
+    
+    try:
+        organizations = await parser_executor.run(search_or_raise, query, city, limit)
+    except BaseException as e:
+        # В том числе отмена запроса при отключении клиента: ожидающие
+        # получают ошибку, а ключ освобождается для следующих запросов
+        search_cache.complete(key, error=e if isinstance(e, Exception) else JobTimeout("Поиск прерван"))
+        raise
+    search_cache.complete(key, organizations)
+    return organizations, False
+
+def discard_request_log(db: Session, request_log: RequestLog):
+    """Удаление записи о запросе, завершившемся ошибкой"""
+    db.rollback()
+    db.query(RequestOrganization).filter(RequestOrganization.request_id == request_log.id).delete()
+    release(db, request_log.license_id, day=request_log.requested_at.date())
+    record_usage(db, request_log.license_id, errors=1)
+    db.delete(request_log)
+    db.commit()
 
 # API Endpoints
 @app.post("/api/search")
@@ -49,73 +119,349 @@ async def search_organizations(
     query: str = Form(...),
     city: str = Form(""),
     limit: int = Form(50),
+    async_job: bool = Form(False),
+    details: str = Form("none"),
+    timings: bool = Form(False),
+    fallback: bool = Form(False),
+    delta: bool = Form(False),
     db: Session = Depends(get_db)
 ):
-    """Поиск организаций"""
+    """Поиск организаций
+
+    При async_job=true запрос ставится в очередь и сразу возвращается
+    идентификатор задачи для опроса через /api/jobs/{job_id}.
+    details управляет загрузкой карточек организаций: none, missing
+    (только отсутствующие или устаревшие) или refresh.
+    При timings=true в ответ добавляется разбивка времени по этапам.
+    При fallback=true, если живой поиск не удался или ничего не нашел,
+    ответ собирается из локального индекса сохраненных организаций.
+    При delta=true выдача сравнивается с сохраненными организациями:
+    карточки загружаются и записываются только для новых и изменившихся,
+    а в ответе diff - разница с предыдущим таким же запросом лицензии.
+    """
+    request_trace = Trace() if timings else None
+    if request_trace is not None:
+        # Запрос обрабатывается в своей задаче asyncio со своим контекстом
+        current_trace.set(request_trace)
+    
+    if details not in DETAIL_MODES:
+        raise HTTPException(status_code=400, detail=f"details должен быть одним из: {', '.join(DETAIL_MODES)}")
     
     # Проверка лицензии
     license_key = request.headers.get("X-License-Key")
     if not license_key:
         raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
     
-    license = verify_license(db, license_key)
+    with API_STAGE_SECONDS.time(stage="license"):
+        license = verify_license(db, license_key)
+        # Одно время для списания и журнала: при ошибке запрос возвращается в лимит тех же суток
+        requested_at = datetime.utcnow()
+        used_requests = admit(db, license, day=requested_at.date())
+    current_priority.set(license.priority)
+    
+    limit = min(limit, settings.MAX_RESULTS)
     
     # Логирование запроса
     request_log = RequestLog(
         license_id=license.id,
         query=query,
+        cache_key=make_cache_key(query, city, limit),
+        city=normalize(city),
+        requested_at=requested_at,
         ip_address=request.client.host,
         user_agent=request.headers.get("user-agent")
     )
     db.add(request_log)
     db.flush()
     
+    if async_job:
+        job = job_scheduler.create_job(db, license.id, request_log.id, query, city, limit, details, delta)
+        cached = search_cache.lookup(db, request_log.cache_key) if details == "none" else None
+        if cached is not None:
+            job_scheduler.complete_from_cache(db, job, request_log, cached)
+        record_request(db, license.id)
+        db.commit()
+        if cached is None:
+            job_scheduler.enqueue(job.id)
+        return JSONResponse(status_code=202, content={
+            "success": True,
+            "job_id": job.id,
+            "request_id": request_log.id,
+            "status": job.status,
+            "from_cache": cached is not None,
+            "remaining_requests": license.requests_per_day - used_requests
+        })
+    
+    # Запрос фиксируется до парсинга, чтобы не держать блокировку записи
+    # SQLite все время работы браузера
+    db.commit()
+    
     # Поиск организаций
-    parser = get_parser()
     try:
-        organizations = parser.search_organizations(query, city, min(limit, 100))
+        with API_STAGE_SECONDS.time(stage="search"):
+            search_failed = False
+            try:
+                organizations, from_cache = await run_search(db, query, city, limit)
+            except Exception:
+                # Живой поиск не удался: при fallback ответ из локального индекса
+                if not fallback:
+                    raise
+                organizations, from_cache = [], False
+                search_failed = True
+        
+        source = "live"
+        if fallback and not organizations:
+            # Ответ без парсинга по ранее сохраненным организациям
+            organizations = search_index.lookup(db, query, city, limit)
+            from_cache = True
+            source = "local"
+        
+        # Сравнение с последним известным состоянием до загрузки карточек
+        tracker = DeltaTracker(db, request_log) if delta else None
+        targets = tracker.observe(db, organizations) if tracker else organizations
+        
+        # Загрузка деталей организаций
+        if details != "none" and source == "live":
+            deadline = time.monotonic() + settings.TIMEOUT
+            context = contextvars.copy_context()
+            with API_STAGE_SECONDS.time(stage="details"):
+                await asyncio.get_running_loop().run_in_executor(
+                    None, context.run, lambda: detail_enricher.enrich(targets, details, deadline=deadline)
+                )
         
         # Сохранение результатов
-        for org in organizations:
-            parsed_data = ParsedData(
-                request_id=request_log.id,
-                organization_id=org.get('id'),
-                name=org.get('name', ''),
-                categories=org.get('categories', ''),
-                address=org.get('address', ''),
-                phones=org.get('phones', ''),
-                website=org.get('website', ''),
-                rating=org.get('rating', ''),
-                reviews_count=int(org.get('reviews_count', 0)) if org.get('reviews_count', '0').isdigit() else 0,
-                schedule=org.get('schedule', ''),
-                latitude=org.get('latitude', ''),
-                longitude=org.get('longitude', ''),
-                attributes=json.dumps(org.get('attributes', {})),
-                social_networks=json.dumps(org.get('social_networks', {}))
-            )
-            db.add(parsed_data)
+        with API_STAGE_SECONDS.time(stage="save"):
+            save_organizations(db, request_log.id, organizations, known=tracker.known if tracker else None)
+            
+            request_log.from_cache = from_cache
+            request_log.source = source
+            request_log.results_count = len(organizations)
+            diff = tracker.result() if tracker else None
+            if diff is not None:
+                request_log.diff = json.dumps(diff, ensure_ascii=False)
+            record_request(db, license.id, results=len(organizations), errors=int(search_failed))
+            db.commit()
         
-        request_log.results_count = len(organizations)
-        license.total_requests += 1
-        db.commit()
+        # Ответ читается из хранилища, куда уже слиты ранее загруженные детали
+        with API_STAGE_SECONDS.time(stage="response"):
+            data = [organization_to_dict(item) for _, item in load_request_organizations(db, request_log.id)]
         
-        return {
+        result = {
             "success": True,
-            "count": len(organizations),
-            "data": organizations,
-            "remaining_requests": license.requests_per_day - db.query(RequestLog).filter(
-                RequestLog.license_id == license.id,
-                RequestLog.requested_at >= datetime.utcnow().date()
-            ).count()
+            "request_id": request_log.id,
+            "count": len(data),
+            "from_cache": from_cache,
+            "source": source,
+            "data": data,
+            "remaining_requests": license.requests_per_day - used_requests
         }
+        if diff is not None:
+            result["diff"] = diff
+        if request_trace is not None:
+            result["timings"] = request_trace.to_dict()
+        return result
         
+    except PoolExhausted as e:
+        discard_request_log(db, request_log)
+        raise HTTPException(status_code=503, detail=str(e))
+    except JobTimeout as e:
+        discard_request_log(db, request_log)
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
-        db.rollback()
+        discard_request_log(db, request_log)
         raise HTTPException(status_code=500, detail=f"Ошибка при парсинге: {str(e)}")
 
+@app.get("/api/organizations/search")
+async def search_stored_organizations(
+    request: Request,
+    q: str = "",
+    city: str = "",
+    min_rating: Optional[float] = None,
+    min_reviews: Optional[int] = None,
+    sort: Optional[str] = None,
+    page: int = 1,
+    per_page: int = 50,
+    db: Session = Depends(get_db)
+):
+    """Поиск по уже собранным организациям без парсинга и без расхода лимита
+
+    q ищется в названии, категориях и адресе; sort: relevance, rating
+    или reviews. В ответе общее число совпадений и фасеты по городу
+    и рейтингу.
+    """
+    license_key = request.headers.get("X-License-Key")
+    if not license_key:
+        raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
+    verify_license(db, license_key, check_quota=False)
+    
+    if sort is not None and sort not in SORTS:
+        raise HTTPException(status_code=400, detail=f"sort должен быть одним из: {', '.join(SORTS)}")
+    if page < 1 or not 1 <= per_page <= settings.MAX_RESULTS:
+        raise HTTPException(status_code=400, detail=f"page от 1, per_page от 1 до {settings.MAX_RESULTS}")
+    
+    return search_index.search(db, q, city, min_rating, min_reviews, sort, page, per_page)
+
+def get_license_job(db: Session, request: Request, job_id: str) -> SearchJob:
+    license_key = request.headers.get("X-License-Key")
+    if not license_key:
+        raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
+    
+    license = verify_license(db, license_key, check_quota=False)
+    
+    job = db.query(SearchJob).filter(SearchJob.id == job_id).first()
+    if not job or job.license_id != license.id:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str, request: Request, db: Session = Depends(get_db)):
+    """Статус и прогресс фоновой задачи"""
+    job = get_license_job(db, request, job_id)
+    result = job_to_dict(job)
+    if job.delta:
+        result["diff"] = load_diff(db, job.request_id)
+    return result
+
+@app.get("/api/jobs/{job_id}/results")
+async def get_job_results(
+    job_id: str,
+    request: Request,
+    offset: int = 0,
+    db: Session = Depends(get_db)
+):
+    """Частичные результаты задачи начиная с offset"""
+    job = get_license_job(db, request, job_id)
+    
+    items = load_request_organizations(db, job.request_id, offset=offset)
+    
+    return {
+        "status": job.status,
+        "progress": job.progress,
+        "next_offset": offset + len(items),
+        "data": [organization_to_dict(item) for _, item in items]
+    }
+
+@app.get("/api/jobs/{job_id}/stream")
+async def stream_job_results(job_id: str, request: Request, db: Session = Depends(get_db)):
+    """Потоковая выдача результатов задачи в формате NDJSON"""
+    job = get_license_job(db, request, job_id)
+    request_id = job.request_id
+    
+    async def generate():
+        last_position = -1
+        while True:
+            session = SessionLocal()
+            try:
+                status = session.query(SearchJob.status).filter(SearchJob.id == job_id).scalar()
+                items = load_request_organizations(session, request_id, after_position=last_position)
+                records = [organization_to_dict(item) for _, item in items]
+            finally:
+                session.close()
+            
+            for (position, _), record in zip(items, records):
+                last_position = position
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+            
+            if status in ("done", "failed") and not items:
+                yield json.dumps({"status": status}) + "\n"
+                break
+            if await request.is_disconnected():
+                break
+            await asyncio.sleep(1)
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+class BatchItem(BaseModel):
+    query: str
+    city: str = ""
+    limit: int = 50
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    details: str = "none"
+    delta: bool = False
+
+@app.post("/api/batches")
+async def create_search_batch(
+    batch_request: BatchRequest,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """Пакетный поиск по нескольким парам запрос - город
+
+    Лимит проверяется один раз на весь пакет, элементы выполняются
+    фоновыми задачами параллельно на свободных парсерах. Состояние -
+    /api/batches/{batch_id}, общий файл без повторов организаций -
+    /api/batches/{batch_id}/export.
+    """
+    if batch_request.details not in DETAIL_MODES:
+        raise HTTPException(status_code=400, detail=f"details должен быть одним из: {', '.join(DETAIL_MODES)}")
+    
+    items = unique_items([
+        (item.query, item.city, max(min(item.limit, settings.MAX_RESULTS), 1))
+        for item in batch_request.items if item.query.strip()
+    ])
+    if not items:
+        raise HTTPException(status_code=400, detail="Пакет не содержит запросов")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"В пакете не более {settings.BATCH_MAX_ITEMS} запросов")
+    
+    license_key = request.headers.get("X-License-Key")
+    if not license_key:
+        raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
+    
+    license = verify_license(db, license_key)
+    used_requests = admit(db, license, amount=len(items))
+    
+    batch, pending = create_batch(
+        db, license.id, items, batch_request.details,
+        ip_address=request.client.host,
+        user_agent=request.headers.get("user-agent"),
+        delta=batch_request.delta
+    )
+    record_request(db, license.id, amount=len(items))
+    db.commit()
+    for job_id in pending:
+        job_scheduler.enqueue(job_id)
+    
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        "batch_id": batch.id,
+        "items": len(items),
+        "from_cache": len(items) - len(pending),
+        "remaining_requests": license.requests_per_day - used_requests
+    })
+
+def get_license_batch(db: Session, request: Request, batch_id: str) -> SearchBatch:
+    license_key = request.headers.get("X-License-Key")
+    if not license_key:
+        raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
+    
+    license = verify_license(db, license_key, check_quota=False)
+    
+    batch = db.query(SearchBatch).filter(SearchBatch.id == batch_id).first()
+    if not batch or batch.license_id != license.id:
+        raise HTTPException(status_code=404, detail="Пакет не найден")
+    return batch
+
+@app.get("/api/batches/{batch_id}")
+async def get_search_batch(batch_id: str, request: Request, db: Session = Depends(get_db)):
+    """Состояние пакета и его задач"""
+    batch = get_license_batch(db, request, batch_id)
+    return batch_to_dict(db, batch)
+
+def export_response(request_ids, format: str, name: str, unique: bool = False) -> StreamingResponse:
+    content, media_type, extension = export_stream(request_ids, format, unique)
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{extension}"'}
+    )
+
 @app.get("/api/export/{request_id}")
 async def export_results(
     request_id: int,
+    request: Request,
     format: str = "json",
     db: Session = Depends(get_db)
 ):
@@ -125,46 +471,56 @@ async def export_results(
     if not license_key:
         raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
     
-    license = verify_license(db, license_key)
+    license = verify_license(db, license_key, check_quota=False)
     
-    # Получение данных
-    data = db.query(ParsedData).filter(ParsedData.request_id == request_id).all()
+    # Проверка наличия данных
+    exists = db.query(RequestOrganization.position).join(
+        RequestLog, RequestLog.id == RequestOrganization.request_id
+    ).filter(
+        RequestOrganization.request_id == request_id,
+        RequestLog.license_id == license.id
+    ).first()
     
-    if not data:
+    if not exists:
         raise HTTPException(status_code=404, detail="Данные не найдены")
     
-    # Преобразование в DataFrame
-    records = []
-    for item in data:
-        record = {
-            'ID': item.organization_id,
-            'Название': item.name,
-            'Категории': item.categories,
-            'Адрес': item.address,
-            'Телефоны': item.phones,
-            'Сайт': item.website,
-            'Рейтинг': item.rating,
-            'Отзывов': item.reviews_count,
-            'График': item.schedule,
-            'Широта': item.latitude,
-            'Долгота': item.longitude
-        }
-        records.append(record)
+    return export_response([request_id], format, f"results_{request_id}")
+
+@app.get("/api/export")
+async def export_range(
+    request: Request,
+    date_from: datetime,
+    date_to: Optional[datetime] = None,
+    format: str = "json",
+    db: Session = Depends(get_db)
+):
+    """Экспорт результатов всех запросов лицензии за период"""
     
-    df = pd.DataFrame(records)
+    license_key = request.headers.get("X-License-Key")
+    if not license_key:
+        raise HTTPException(status_code=401, detail="Лицензионный ключ обязателен")
     
-    if format == "csv":
-        filename = f"results_{request_id}.csv"
-        df.to_csv(f"static/{filename}", index=False, encoding='utf-8-sig')
-        return FileResponse(f"static/{filename}", filename=filename)
+    license = verify_license(db, license_key, check_quota=False)
     
-    elif format == "excel":
-        filename = f"results_{request_id}.xlsx"
-        df.to_excel(f"static/{filename}", index=False)
-        return FileResponse(f"static/{filename}", filename=filename)
+    request_ids = select(RequestLog.id).where(
+        RequestLog.license_id == license.id,
+        RequestLog.requested_at >= date_from
+    )
+    if date_to is not None:
+        request_ids = request_ids.where(RequestLog.requested_at < date_to)
     
-    else:
-        return JSONResponse(content=records)
+    return export_response(request_ids, format, f"results_{license.id}_{date_from:%Y%m%d}")
+
+@app.get("/api/batches/{batch_id}/export")
+async def export_batch(
+    batch_id: str,
+    request: Request,
+    format: str = "json",
+    db: Session = Depends(get_db)
+):
+    """Экспорт результатов пакета одним файлом, каждая организация один раз"""
+    batch = get_license_batch(db, request, batch_id)
+    return export_response(batch_request_ids(batch.id), format, f"batch_{batch.id[:8]}", unique=True)
 
 # Admin endpoints
 @app.post("/api/admin/licenses")
@@ -173,6 +529,7 @@ async def create_license(
     email: str = Form(...),
     duration_days: int = Form(30),
     requests_per_day: int = Form(100),
+    priority: int = Form(0),
     db: Session = Depends(get_db)
 ):
     """Создание новой лицензии (только для админа)"""
@@ -185,50 +542,145 @@ async def create_license(
         owner_name=owner_name,
         email=email,
         expires_at=expires_at,
-        requests_per_day=requests_per_day
+        requests_per_day=requests_per_day,
+        priority=priority
     )
     
     db.add(license)
     db.commit()
+    license_cache.invalidate(license_key)
     
     return {
         "success": True,
         "license_key": license_key,
         "expires_at": expires_at,
-        "requests_per_day": requests_per_day
+        "requests_per_day": requests_per_day,
+        "priority": priority
     }
 
-@app.get("/api/admin/licenses")
-async def get_licenses(db: Session = Depends(get_db)):
-    """Получение списка всех лицензий"""
-    licenses = db.query(License).all()
-    
-    result = []
-    for license in licenses:
-        today_requests = db.query(RequestLog).filter(
-            RequestLog.license_id == license.id,
-            RequestLog.requested_at >= datetime.utcnow().date()
-        ).count()
-        
-        result.append({
-            "id": license.id,
-            "key": license.key,
-            "owner_name": license.owner_name,
-            "email": license.email,
-            "is_active": license.is_active,
-            "created_at": license.created_at,
-            "expires_at": license.expires_at,
-            "requests_per_day": license.requests_per_day,
-            "today_requests": today_requests,
-            "total_requests": license.total_requests
-        })
+@app.patch("/api/admin/licenses/{license_id}")
+async def update_license(
+    license_id: int,
+    is_active: Optional[bool] = Form(None),
+    requests_per_day: Optional[int] = Form(None),
+    priority: Optional[int] = Form(None),
+    extend_days: Optional[int] = Form(None),
+    owner_name: Optional[str] = Form(None),
+    email: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    """Изменение лицензии (только для админа)"""
+    license = db.query(License).filter(License.id == license_id).first()
+    if not license:
+        raise HTTPException(status_code=404, detail="Лицензия не найдена")
     
-    return result
+    if is_active is not None:
+        license.is_active = is_active
+    if requests_per_day is not None:
+        license.requests_per_day = requests_per_day
+    if priority is not None:
+        license.priority = priority
+    if extend_days is not None:
+        license.expires_at = max(license.expires_at, datetime.utcnow()) + timedelta(days=extend_days)
+    if owner_name is not None:
+        license.owner_name = owner_name
+    if email is not None:
+        license.email = email
+    
+    db.commit()
+    license_cache.invalidate(license.key)
+    
+    return {
+        "success": True,
+        "id": license.id,
+        "is_active": license.is_active,
+        "expires_at": license.expires_at,
+        "requests_per_day": license.requests_per_day,
+        "priority": license.priority
+    }
+
+@app.get("/api/admin/stats")
+async def get_stats():
+    """Состояние кэшей и пула парсеров"""
+    return {
+        "license_cache": license_cache.stats(),
+        "search_cache": search_cache.stats,
+        "details": detail_enricher.stats,
+        "parser_pool": parser_pool.status(),
+        "politeness": politeness.status(),
+        "organization_store": store_stats,
+        "maintenance": maintenance.last_report
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    if not registry.enabled:
+        raise HTTPException(status_code=404, detail="Метрики отключены")
+    pool = parser_pool.status()
+    PARSER_POOL.set(pool["size"], state="size")
+    PARSER_POOL.set(pool["alive"], state="alive")
+    PARSER_POOL.set(pool["idle"], state="idle")
+    PARSER_POOL.set(pool["busy"], state="busy")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/api/admin/maintenance")
+async def run_maintenance():
+    """Внеочередной запуск очистки и сжатия базы (только для админа)"""
+    report = await asyncio.get_running_loop().run_in_executor(None, maintenance.run)
+    if report is None:
+        raise HTTPException(status_code=409, detail="Обслуживание уже выполняется")
+    return report
+
+@app.get("/api/admin/licenses")
+async def get_licenses(
+    page: int = 1,
+    per_page: int = 50,
+    sort: str = "created_at",
+    order: str = "desc",
+    q: str = "",
+    db: Session = Depends(get_db)
+):
+    """Страница списка лицензий с использованием за сутки и за 30 дней
+
+    sort - одно из LICENSE_SORTS, order - asc или desc, q - подстрока
+    владельца, email или ключа.
+    """
+    if sort not in LICENSE_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort должен быть одним из: {', '.join(LICENSE_SORTS)}")
+    if order not in ("asc", "desc"):
+        raise HTTPException(status_code=400, detail="order должен быть asc или desc")
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), 200)
+    return licenses_page(db, page, per_page, sort, order, q)
+
+@app.get("/api/admin/usage")
+async def get_usage_history(
+    period: str = "day",
+    days: int = 30,
+    license_id: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """История использования по часам или суткам для графиков
+
+    Без license_id - сумма по всем лицензиям. Часовой ряд - не более
+    31 дня, суточный - не более 366.
+    """
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"period должен быть одним из: {', '.join(PERIODS)}")
+    days = min(max(days, 1), 31 if period == "hour" else 366)
+    until = bucket_start(datetime.utcnow(), period) + PERIODS[period]
+    since = until - timedelta(days=days)
+    return {
+        "period": period,
+        "license_id": license_id,
+        "series": usage_history(db, period, since, until, license_id)
+    }
 
 # Web interface
 @app.get("/")
 async def home(request: Request):
-    return templates.TemplateResponse("index.html", {"request": request})
+    return templates.TemplateResponse("index.html", {"request": request, "max_results": settings.MAX_RESULTS})
 
 @app.get("/admin")
 async def admin(request: Request):
@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -5,17 +6,102 @@ from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from sqlalchemy.orm import Session
 import secrets
+import threading
+import time
 
 from database import get_db, License
+from quota import get_usage
 from config import settings
+from metrics import LICENSE_VERIFY_SECONDS
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 def create_license_key():
     return f"YKP-{datetime.now().strftime('%Y%m')}-{secrets.token_hex(4).upper()}"
 
-def verify_license(db: Session, license_key: str):
-    license = db.query(License).filter(License.key == license_key).first()
+@dataclass(frozen=True)
+class LicenseInfo:
+    """Снимок полей лицензии, нужных для проверки запросов"""
+    id: int
+    key: str
+    is_active: bool
+    expires_at: datetime
+    requests_per_day: int
+    priority: int = 0
+
+class LicenseCache:
+    """Кэш проверенных лицензий с ограниченным временем жизни
+
+    Записи сбрасываются при изменении лицензий через админские
+    эндпоинты, а TTL ограничивает устаревание при правках в обход API.
+    """
+    
+    def __init__(self, ttl: int = None):
+        self.ttl = settings.LICENSE_CACHE_TTL if ttl is None else ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, license_key: str) -> Optional[LicenseInfo]:
+        with self._lock:
+            entry = self._entries.get(license_key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+            self._entries.pop(license_key, None)
+            self.misses += 1
+            return None
+    
+    def put(self, info: LicenseInfo):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[info.key] = (time.monotonic() + self.ttl, info)
+    
+    def invalidate(self, license_key: str = None):
+        """Сброс записи по ключу или всего кэша"""
+        with self._lock:
+            if license_key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(license_key, None)
+    
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0
+        }
+
+license_cache = LicenseCache()
+
+def load_license(db: Session, license_key: str) -> Optional[LicenseInfo]:
+    with LICENSE_VERIFY_SECONDS.time(source="cache"):
+        info = license_cache.get(license_key)
+    if info is not None:
+        return info
+    
+    with LICENSE_VERIFY_SECONDS.time(source="db"):
+        license = db.query(License).filter(License.key == license_key).first()
+    if not license:
+        return None
+    
+    info = LicenseInfo(
+        id=license.id,
+        key=license.key,
+        is_active=license.is_active,
+        expires_at=license.expires_at,
+        requests_per_day=license.requests_per_day,
+        priority=license.priority or 0
+    )
+    license_cache.put(info)
+    return info
+
+def verify_license(db: Session, license_key: str, check_quota: bool = True) -> LicenseInfo:
+    license = load_license(db, license_key)
     
     if not license:
         raise HTTPException(
@@ -35,12 +121,11 @@ def verify_license(db: Session, license_key: str):
             detail="Срок действия лицензии истек"
         )
     
+    if not check_quota:
+        return license
+    
     # Проверяем лимиты запросов за сегодня
-    today = datetime.utcnow().date()
-    today_requests = db.query(RequestLog).filter(
-        RequestLog.license_id == license.id,
-        RequestLog.requested_at >= today
-    ).count()
+    today_requests = get_usage(db, license.id)
     
     if today_requests >= license.requests_per_day:
         raise HTTPException(
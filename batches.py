@@ -0,0 +1,119 @@
+import json
+import uuid
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+
+from database import SearchBatch, SearchJob, RequestLog, RequestOrganization
+from jobs import job_scheduler
+from cache import search_cache, make_cache_key, normalize
+
+FINISHED = ("done", "failed")
+
+
+def unique_items(items: List[Tuple[str, str, int]]) -> List[Tuple[str, str, int]]:
+    """Элементы пакета без повторов с точностью до ключа кэша"""
+    seen = set()
+    result = []
+    for query, city, limit in items:
+        key = make_cache_key(query, city, limit)
+        if key not in seen:
+            seen.add(key)
+            result.append((query, city, limit))
+    return result
+
+
+def create_batch(db: Session, license_id: int, items: List[Tuple[str, str, int]],
+                 details_mode: str = "none", ip_address: str = None,
+                 user_agent: str = None, delta: bool = False) -> Tuple[SearchBatch, List[str]]:
+    """Создание пакета: по записи журнала и фоновой задаче на каждый элемент
+
+    Элементы, результат которых уже есть в кэше, завершаются сразу.
+    Возвращает пакет и идентификаторы задач, которые нужно поставить
+    в очередь после фиксации транзакции.
+    """
+    batch = SearchBatch(
+        id=str(uuid.uuid4()),
+        license_id=license_id,
+        details_mode=details_mode,
+        items_count=len(items),
+    )
+    db.add(batch)
+
+    pending = []
+    for query, city, limit in items:
+        request_log = RequestLog(
+            license_id=license_id,
+            query=query,
+            cache_key=make_cache_key(query, city, limit),
+            city=normalize(city),
+            batch_id=batch.id,
+            ip_address=ip_address,
+            user_agent=user_agent
+        )
+        db.add(request_log)
+        db.flush()
+
+        job = job_scheduler.create_job(db, license_id, request_log.id, query, city, limit, details_mode, delta)
+        cached = search_cache.lookup(db, request_log.cache_key) if details_mode == "none" else None
+        if cached is not None:
+            job_scheduler.complete_from_cache(db, job, request_log, cached)
+        else:
+            pending.append(job.id)
+    return batch, pending
+
+
+def batch_request_ids(batch_id: str):
+    return select(RequestLog.id).where(RequestLog.batch_id == batch_id)
+
+
+def batch_to_dict(db: Session, batch: SearchBatch) -> Dict:
+    """Состояние пакета по его задачам и число уникальных организаций"""
+    rows = db.query(SearchJob, RequestLog.diff).join(
+        RequestLog, RequestLog.id == SearchJob.request_id
+    ).filter(RequestLog.batch_id == batch.id).order_by(RequestLog.id).all()
+    jobs = [job for job, _ in rows]
+
+    statuses = [job.status for job in jobs]
+    if not statuses:
+        # Задач нет: либо пакет пуст, либо они удалены обслуживанием
+        # после завершения - тогда пакет считается выполненным
+        status = "done" if batch.items_count else "failed"
+    elif all(status == "failed" for status in statuses):
+        status = "failed"
+    elif all(status in FINISHED for status in statuses):
+        status = "done"
+    elif any(status != "pending" for status in statuses):
+        status = "running"
+    else:
+        status = "pending"
+
+    organizations = db.query(func.count(func.distinct(RequestOrganization.organization_pk))).filter(
+        RequestOrganization.request_id.in_(batch_request_ids(batch.id))
+    ).scalar()
+
+    return {
+        "batch_id": batch.id,
+        "status": status,
+        "items": len(jobs),
+        "done": statuses.count("done"),
+        "failed": statuses.count("failed"),
+        "progress": sum(job.progress or 0 for job in jobs),
+        "unique_organizations": organizations or 0,
+        "created_at": batch.created_at,
+        "jobs": [
+            {
+                "job_id": job.id,
+                "request_id": job.request_id,
+                "query": job.query,
+                "city": job.city,
+                "limit": job.result_limit,
+                "status": job.status,
+                "progress": job.progress,
+                "error": job.error,
+                "diff": json.loads(diff) if diff else None,
+            }
+            for job, diff in rows
+        ],
+    }
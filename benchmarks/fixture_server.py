@@ -0,0 +1,138 @@
+"""Локальный сервер, отдающий сохраненные страницы и ответы карт
+
+    /maps/             - страница поиска (fixtures/maps.html)
+    /maps/api/search   - ответ поиска постранично (fixtures/search.json)
+    /maps/org/<id>/    - карточка организации (fixtures/org.html)
+
+Записанная выдача размножается до нужного числа организаций с новыми
+идентификаторами, чтобы проверять прокрутку длинных списков.
+"""
+import copy
+import html
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlparse, parse_qs
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+FIRST_ID = 1000000001
+
+
+def load_organizations(total: int) -> List[Dict]:
+    """Организации записанной выдачи, размноженные до total"""
+    payload = json.loads((FIXTURES / "search.json").read_text(encoding="utf-8"))
+    base = [item for item in payload["data"]["items"] if item.get("type") == "business"]
+    organizations = []
+    for k in range(total):
+        item = copy.deepcopy(base[k % len(base)])
+        item["id"] = str(FIRST_ID + k)
+        if k >= len(base):
+            item["title"] = f"{item['title']} #{k // len(base) + 1}"
+        organizations.append(item)
+    return organizations
+
+
+class FixtureServer:
+    """HTTP-сервер фикстур в фоновом потоке
+
+    latency - задержка ответа поиска и карточки в секундах,
+    имитирующая сеть.
+    """
+
+    def __init__(self, total: int = 150, latency: float = 0.1, port: int = 0):
+        self.organizations = load_organizations(total)
+        self.by_id = {item["id"]: item for item in self.organizations}
+        self.latency = latency
+        self.requests = 0
+        self._maps = (FIXTURES / "maps.html").read_bytes()
+        self._org = (FIXTURES / "org.html").read_text(encoding="utf-8")
+        self._toponyms = [
+            item for item in json.loads((FIXTURES / "search.json").read_text(encoding="utf-8"))["data"]["items"]
+            if item.get("type") != "business"
+        ]
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/maps/"
+
+    def search_page(self, skip: int, results: int) -> Dict:
+        items = self.organizations[skip:skip + results]
+        if skip == 0:
+            # Как и в записанном ответе, топонимы приходят вместе с первой страницей
+            items = self._toponyms + items
+        return {"data": {"totalResultCount": len(self.organizations), "items": items}}
+
+    def org_page(self, item: Dict) -> str:
+        rating = item.get("ratingData") or {}
+        longitude, latitude = item["coordinates"]
+        values = {
+            "name": item["title"],
+            "rating": rating.get("ratingValue", ""),
+            "reviews_count": rating.get("reviewCount", 0),
+            "address": item["address"],
+            "phone": item["phones"][0]["number"] if item.get("phones") else "",
+            "website": item["urls"][0] if item.get("urls") else "",
+            "schedule": item.get("workingTimeText", ""),
+            "latitude": latitude,
+            "longitude": longitude,
+        }
+        return self._org.format(**{key: html.escape(str(value)) for key, value in values.items()})
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def send(self, status: int, content_type: str, body: bytes):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                server.requests += 1
+                url = urlparse(self.path)
+                parts = [part for part in url.path.split("/") if part]
+                if parts == ["maps"]:
+                    return self.send(200, "text/html; charset=utf-8", server._maps)
+                if parts == ["maps", "api", "search"]:
+                    params = parse_qs(url.query)
+                    skip = int(params.get("skip", ["0"])[0])
+                    results = int(params.get("results", ["20"])[0])
+                    time.sleep(server.latency)
+                    body = json.dumps(server.search_page(skip, results), ensure_ascii=False)
+                    return self.send(200, "application/json; charset=utf-8", body.encode("utf-8"))
+                if len(parts) == 3 and parts[:2] == ["maps", "org"] and parts[2] in server.by_id:
+                    time.sleep(server.latency)
+                    body = server.org_page(server.by_id[parts[2]])
+                    return self.send(200, "text/html; charset=utf-8", body.encode("utf-8"))
+                self.send(404, "text/plain", b"not found")
+
+        return Handler
+
+    def start(self) -> "FixtureServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    fixture_server = FixtureServer(port=8765).start()
+    print(f"Фикстуры доступны по адресу {fixture_server.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fixture_server.stop()
@@ -0,0 +1,116 @@
+"""Сравнение полного и облегченного профиля браузера
+
+Для каждого профиля запускается драйвер, открывается страница карт
+и измеряются время запуска, время до появления поля поиска, число
+и объем загруженных ресурсов и RSS процессов chromedriver и Chrome.
+
+    python benchmarks/profile_benchmark.py --runs 3 --output profile.json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser import YandexMapsParser, SEARCH_INPUT  # noqa: E402
+from config import settings  # noqa: E402
+
+RESOURCES_JS = """
+const entries = performance.getEntriesByType('resource');
+return [entries.length, entries.reduce((sum, e) => sum + (e.transferSize || 0), 0)];
+"""
+
+
+def process_tree_rss(pid: int) -> int:
+    """Суммарный RSS процесса и всех его потомков в байтах"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+
+    if psutil is not None:
+        root = psutil.Process(pid)
+        return sum(p.memory_info().rss for p in [root] + root.children(recursive=True))
+
+    # Без psutil дерево процессов читается из /proc (только Linux)
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            pass
+    return total
+
+
+def measure(light_profile: bool, url: str) -> dict:
+    started = time.monotonic()
+    parser = YandexMapsParser(light_profile=light_profile)
+    startup = time.monotonic() - started
+    try:
+        started = time.monotonic()
+        parser.open_page(url)
+        ready = parser.waiter.for_element(SEARCH_INPUT) is not None
+        page_ready = time.monotonic() - started
+        requests, transferred = parser.driver.execute_script(RESOURCES_JS)
+        rss = process_tree_rss(parser.driver.service.process.pid)
+    finally:
+        parser.close()
+    return {
+        "startup": round(startup, 3),
+        "page_ready": round(page_ready, 3),
+        "ready": ready,
+        "requests": requests,
+        "transferred_bytes": transferred,
+        "rss_bytes": rss,
+    }
+
+
+def summarize(runs: list) -> dict:
+    return {
+        key: round(statistics.median(run[key] for run in runs), 3)
+        for key in ("startup", "page_ready", "requests", "transferred_bytes", "rss_bytes")
+    }
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("--runs", type=int, default=3)
+    arguments.add_argument("--url", default=settings.YANDEX_MAPS_URL)
+    arguments.add_argument("--output", help="файл для сохранения результатов в JSON")
+    args = arguments.parse_args()
+
+    results = {}
+    for name, light_profile in (("full", False), ("light", True)):
+        runs = [measure(light_profile, args.url) for _ in range(args.runs)]
+        results[name] = {"runs": runs, "median": summarize(runs)}
+        median = results[name]["median"]
+        print(f"{name:>5}: запуск {median['startup']:.2f} с, страница {median['page_ready']:.2f} с, "
+              f"ресурсов {median['requests']:.0f} ({median['transferred_bytes'] / 1024:.0f} КБ), "
+              f"RSS {median['rss_bytes'] / 1024 / 1024:.0f} МБ")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
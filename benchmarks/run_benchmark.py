@@ -0,0 +1,219 @@
+"""Офлайн-бенчмарк и регрессионная проверка парсера
+
+Парсер запускается против локального сервера фикстур (fixture_server.py)
+в режимах извлечения api и dom. Для каждого сценария сохраняются время,
+число обращений к WebDriver, время ожиданий и полнота/точность полей
+относительно записанных данных. Результаты пишутся в benchmarks/results,
+а --compare сравнивает их с предыдущим прогоном.
+
+    python benchmarks/run_benchmark.py --repeat 3
+    python benchmarks/run_benchmark.py --compare benchmarks/results/<файл>.json
+"""
+import re
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config import settings  # noqa: E402
+from parser import YandexMapsParser  # noqa: E402
+from yandex_api import parse_item  # noqa: E402
+from fixture_server import FixtureServer  # noqa: E402
+from politeness import politeness  # noqa: E402
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+SEARCH_LIMITS = (20, 50, 120)
+DETAILS_COUNT = 5
+SEARCH_FIELDS = ("name", "categories", "rating", "reviews_count", "address", "phones",
+                 "website", "schedule", "latitude", "longitude")
+DETAIL_FIELDS = ("name", "rating", "reviews_count", "address", "phones",
+                 "website", "schedule", "latitude", "longitude")
+
+
+class RoundTripCounter:
+    """Подсчет команд, отправленных драйверу"""
+
+    def __init__(self, driver):
+        self.count = 0
+        executor = driver.command_executor
+        original = executor.execute
+
+        def execute(command, params):
+            self.count += 1
+            return original(command, params)
+
+        executor.execute = execute
+
+
+def normalize(field: str, value) -> str:
+    value = str(value or "").strip()
+    if field in ("reviews_count", "phones"):
+        return re.sub(r"\D", "", value)
+    if field in ("latitude", "longitude", "rating") and value:
+        try:
+            return f"{float(value):.4f}"
+        except ValueError:
+            return value
+    return value
+
+
+def score(records: List[Dict], expected: Dict[str, Dict], fields) -> Dict:
+    """Заполненность и совпадение полей с записанными данными"""
+    filled = {field: 0 for field in fields}
+    correct = {field: 0 for field in fields}
+    for record in records:
+        reference = expected.get(record.get("id"), {})
+        for field in fields:
+            value = normalize(field, record.get(field))
+            if value:
+                filled[field] += 1
+                if value == normalize(field, reference.get(field)):
+                    correct[field] += 1
+    checked = len(records) * len(fields)
+    return {
+        "fields_filled": filled,
+        "fields_correct": correct,
+        "accuracy": round(sum(correct.values()) / checked, 4) if checked else 0.0,
+    }
+
+
+def run_search(parser, counter, server, limit: int) -> Dict:
+    expected = {record["id"]: record for record in map(parse_item, server.organizations[:limit])}
+    counter.count = 0
+    started = time.monotonic()
+    records = parser.search_organizations("кафе", "Москва", limit)
+    latency = time.monotonic() - started
+    unique_ids = {record.get("id") for record in records}
+    return {
+        "latency": round(latency, 3),
+        "round_trips": counter.count,
+        "wait_time": round(parser.waiter.wait_time, 3),
+        "results": len(records),
+        "expected": len(expected),
+        "missing": len(set(expected) - unique_ids),
+        "stop_reason": parser.last_stop_reason,
+        "extract_mode": parser.last_extract_mode,
+        **score(records, expected, SEARCH_FIELDS),
+    }
+
+
+def run_details(parser, counter, server, count: int) -> Dict:
+    items = server.organizations[:count]
+    expected = {record["id"]: record for record in map(parse_item, items)}
+    counter.count = 0
+    latencies, waits, records = [], [], []
+    for item in items:
+        started = time.monotonic()
+        details = parser.get_organization_details(item["id"])
+        latencies.append(time.monotonic() - started)
+        waits.append(parser.waiter.wait_time)
+        if details:
+            records.append(details)
+    return {
+        "latency": round(statistics.mean(latencies), 3),
+        "round_trips": round(counter.count / len(items), 1),
+        "wait_time": round(statistics.mean(waits), 3),
+        "results": len(records),
+        "expected": len(items),
+        **score(records, expected, DETAIL_FIELDS),
+    }
+
+
+def run_once(server) -> Dict[str, Dict]:
+    results = {}
+    for mode in ("api", "dom"):
+        parser = YandexMapsParser(extract_mode=mode)
+        counter = RoundTripCounter(parser.driver)
+        try:
+            for limit in SEARCH_LIMITS:
+                results[f"search:{mode}:{limit}"] = run_search(parser, counter, server, limit)
+            if mode == "dom":
+                results["details"] = run_details(parser, counter, server, DETAILS_COUNT)
+        finally:
+            parser.close()
+    return results
+
+
+def merge_runs(runs: List[Dict[str, Dict]]) -> Dict[str, Dict]:
+    """Медианы числовых метрик по повторам, остальное - из первого прогона"""
+    merged = {}
+    for name, first in runs[0].items():
+        merged[name] = dict(first)
+        for key in ("latency", "round_trips", "wait_time"):
+            merged[name][key] = round(statistics.median(run[name][key] for run in runs), 3)
+    return merged
+
+
+def revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_results(scenarios: Dict[str, Dict], previous: Dict[str, Dict] = None):
+    for name, result in scenarios.items():
+        line = (f"{name:<16} {result['latency']:>7.2f} с  обращений {result['round_trips']:>6}  "
+                f"ожидание {result['wait_time']:>6.2f} с  найдено {result['results']}/{result['expected']}  "
+                f"точность {result['accuracy']:.1%}")
+        old = (previous or {}).get(name)
+        if old:
+            change = (result["latency"] - old["latency"]) / old["latency"] if old["latency"] else 0
+            line += (f"  | было {old['latency']:.2f} с ({change:+.0%}), обращений {old['round_trips']}, "
+                     f"точность {old['accuracy']:.1%}")
+        print(line)
+
+
+def main():
+    arguments = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arguments.add_argument("--repeat", type=int, default=1)
+    arguments.add_argument("--total", type=int, default=150, help="число организаций в выдаче")
+    arguments.add_argument("--latency", type=float, default=0.1, help="задержка ответов сервера, с")
+    arguments.add_argument("--compare", help="файл предыдущего прогона для сравнения")
+    arguments.add_argument("--output", help="файл результатов (по умолчанию в benchmarks/results)")
+    args = arguments.parse_args()
+
+    server = FixtureServer(total=args.total, latency=args.latency).start()
+    settings.YANDEX_MAPS_URL = server.url
+    settings.MAX_RESULTS = max(settings.MAX_RESULTS, *SEARCH_LIMITS)
+    # Локальный сервер не нужно беречь от частых переходов
+    politeness.delay = 0
+    try:
+        runs = [run_once(server) for _ in range(args.repeat)]
+    finally:
+        server.stop()
+
+    report = {
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "revision": revision(),
+        "total": args.total,
+        "server_latency": args.latency,
+        "repeat": args.repeat,
+        "scenarios": merge_runs(runs),
+    }
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["scenarios"]
+    print_results(report["scenarios"], previous)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{report['created_at'].replace(':', '')}_{report['revision']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в {output}")
+
+
+if __name__ == "__main__":
+    main()
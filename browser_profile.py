@@ -0,0 +1,61 @@
+from typing import Iterable, List
+
+from config import settings
+
+# Группы шаблонов URL для Network.setBlockedURLs, «*» - любая подстрока.
+# Ответы /maps/api/search и скрипты карт не блокируются
+BLOCK_LISTS = {
+    "images": ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.ico",
+               "*avatars.mds.yandex.net*"],
+    "fonts": ["*.woff", "*.woff2", "*.ttf", "*.otf"],
+    "tiles": ["*core-renderer-tiles.maps.yandex.net*", "*/vmap2/tiles*",
+              "*core-road-events-renderer*", "*core-jams-rdr*"],
+    "analytics": ["*mc.yandex.ru*", "*an.yandex.ru*", "*yandex.ru/clck/*", "*yandex.ru/ads/*",
+                  "*google-analytics.com*", "*googletagmanager.com*", "*doubleclick.net*"],
+}
+
+# Флаги Chrome, уменьшающие потребление памяти и фоновую активность
+MEMORY_FLAGS = [
+    "--disable-gpu",
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-background-timer-throttling",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate,MediaRouter,OptimizationHints,site-per-process",
+    "--mute-audio",
+    "--no-first-run",
+    "--renderer-process-limit=2",
+    "--window-size=1280,900",
+]
+
+
+def blocked_urls(groups: Iterable[str] = None, extra: Iterable[str] = None) -> List[str]:
+    """Шаблоны блокировки для выбранных групп и дополнительных шаблонов"""
+    groups = settings.PARSER_BLOCK_GROUPS if groups is None else groups
+    extra = settings.PARSER_BLOCKED_URLS if extra is None else extra
+    patterns = []
+    for group in groups:
+        patterns.extend(BLOCK_LISTS.get(group, []))
+    patterns.extend(extra)
+    return patterns
+
+
+def apply_light_options(options, groups: Iterable[str] = None):
+    """Флаги и настройки профиля, которые задаются до запуска браузера"""
+    groups = settings.PARSER_BLOCK_GROUPS if groups is None else groups
+    for flag in MEMORY_FLAGS:
+        options.add_argument(flag)
+    if "images" in groups:
+        options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+        })
+
+
+def block_resources(driver, patterns: List[str]):
+    """Блокировка запросов по шаблонам через CDP для уже запущенного браузера"""
+    if not patterns:
+        return
+    driver.execute_cdp_cmd("Network.enable", {})
+    driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
@@ -0,0 +1,140 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Tuple
+
+from sqlalchemy import exists
+from sqlalchemy.orm import Session
+
+from database import RequestLog, SearchJob
+from storage import load_request_organizations, organization_to_dict
+from config import settings
+
+
+def normalize(value: str) -> str:
+    return re.sub(r"\s+", " ", (value or "").strip().lower())
+
+
+def make_cache_key(query: str, city: str, limit: int) -> str:
+    """Ключ кэша: нормализованные запрос и город плюс лимит"""
+    return f"{normalize(query)}|{normalize(city)}|{limit}"
+
+
+def completed_request():
+    """Условие на RequestLog: запрос не относится к задаче, завершившейся ошибкой
+
+    Неудачная задача сохраняет частичную выдачу и results_count, но
+    не годится ни для кэша, ни как база сравнения в режиме delta.
+    Синхронные запросы с ошибкой удаляются из журнала сразу.
+    """
+    return ~exists().where(SearchJob.request_id == RequestLog.id, SearchJob.status == "failed")
+
+
+class SearchCache:
+    """Кэш результатов поиска по ключу (запрос, город, лимит)
+
+    Первый уровень - LRU в памяти процесса, второй - ранее сохраненные
+    организации последнего живого запроса с тем же ключом.
+    Одновременные запросы с одинаковым ключом ждут один общий парсинг.
+    """
+
+    def __init__(self, ttl: int = None, max_entries: int = None):
+        self.ttl = settings.SEARCH_CACHE_TTL if ttl is None else ttl
+        self.max_entries = max_entries or settings.SEARCH_CACHE_SIZE
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "db_hits": 0, "misses": 0, "collapsed": 0}
+
+    def _get_memory(self, key: str) -> Optional[List[Dict]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, organizations = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return [dict(org) for org in organizations]
+
+    def store(self, key: str, organizations: List[Dict]):
+        """Сохранение результата в памяти, пустые результаты не кэшируются"""
+        if not organizations or self.ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, [dict(org) for org in organizations])
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_persistent(self, db: Session, key: str) -> Optional[List[Dict]]:
+        since = datetime.utcnow() - timedelta(seconds=self.ttl)
+        request_id = db.query(RequestLog.id).filter(
+            RequestLog.cache_key == key,
+            RequestLog.from_cache == False,
+            RequestLog.results_count > 0,
+            RequestLog.requested_at >= since,
+            completed_request()
+        ).order_by(RequestLog.requested_at.desc()).limit(1).scalar()
+        if request_id is None:
+            return None
+
+        items = load_request_organizations(db, request_id)
+        return [organization_to_dict(item) for _, item in items] or None
+
+    def lookup(self, db: Session, key: str) -> Optional[List[Dict]]:
+        """Поиск результата сначала в памяти, затем в базе"""
+        if self.ttl <= 0:
+            return None
+
+        organizations = self._get_memory(key)
+        if organizations is not None:
+            self.stats["memory_hits"] += 1
+            return organizations
+
+        organizations = self._get_persistent(db, key)
+        if organizations is not None:
+            self.stats["db_hits"] += 1
+            self.store(key, organizations)
+            return organizations
+
+        self.stats["misses"] += 1
+        return None
+
+    def begin(self, key: str) -> Tuple[Future, bool]:
+        """Регистрация парсинга по ключу
+
+        Возвращает future с результатом и признак того, что вызывающий
+        должен выполнить парсинг сам. Остальные ждут этот же future.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["collapsed"] += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def complete(self, key: str, organizations: List[Dict] = None, error: Exception = None):
+        """Завершение парсинга и оповещение ожидающих"""
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if error is None:
+            self.store(key, organizations)
+        if future is not None:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(organizations)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+search_cache = SearchCache()
@@ -9,15 +9,74 @@ class Settings:
     ACCESS_TOKEN_EXPIRE_DAYS = 30
     
     # Database
-    DATABASE_URL = "sqlite:///./yandex_parser.db"
+    DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./yandex_parser.db")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))
+    SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
     
     # Parser settings
-    MAX_RESULTS = 100
-    REQUEST_DELAY = 2
-    TIMEOUT = 30
+    # Адрес карт; для офлайн-бенчмарка указывает на локальный сервер фикстур
+    YANDEX_MAPS_URL = os.getenv("YANDEX_MAPS_URL", "https://yandex.ru/maps/")
+    MAX_RESULTS = int(os.getenv("MAX_RESULTS", 100))
+    # Не чаще одного перехода на хост в REQUEST_DELAY секунд на все драйверы,
+    # с запасом REQUEST_BURST переходов подряд
+    REQUEST_DELAY = float(os.getenv("REQUEST_DELAY", 2))
+    REQUEST_BURST = int(os.getenv("REQUEST_BURST", 2))
+    # Пауза после капчи или страницы ошибки, удваивается при повторах
+    CAPTCHA_BACKOFF = float(os.getenv("CAPTCHA_BACKOFF", 30))
+    CAPTCHA_BACKOFF_MAX = float(os.getenv("CAPTCHA_BACKOFF_MAX", 600))
+    # Фора в очереди переходов на каждую единицу приоритета лицензии, с
+    PRIORITY_STEP = float(os.getenv("PRIORITY_STEP", 10))
+    TIMEOUT = int(os.getenv("PARSER_TIMEOUT", 120))
+    # Предельное время фоновой задачи, после него драйвер закрывается
+    JOB_TIMEOUT = int(os.getenv("JOB_TIMEOUT", 900))
+    # api - ответы поиска из сети с разбором DOM как запасным путем, dom - только DOM
+    PARSER_EXTRACT_MODE = os.getenv("PARSER_EXTRACT_MODE", "api")
+    # Облегченный профиль браузера: без картинок, шрифтов, тайлов карты и счетчиков
+    PARSER_LIGHT_PROFILE = os.getenv("PARSER_LIGHT_PROFILE", "true").lower() in ("1", "true", "yes")
+    PARSER_BLOCK_GROUPS = [g.strip() for g in os.getenv("PARSER_BLOCK_GROUPS", "images,fonts,tiles,analytics").split(",") if g.strip()]
+    PARSER_BLOCKED_URLS = [p.strip() for p in os.getenv("PARSER_BLOCKED_URLS", "").split(",") if p.strip()]
     
+    # Максимум запросов в одном пакетном поиске
+    BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 100))
+    
+    # Parser pool
+    PARSER_POOL_SIZE = int(os.getenv("PARSER_POOL_SIZE", min(os.cpu_count() or 1, 4)))
+    PARSER_MAX_PAGES = int(os.getenv("PARSER_MAX_PAGES", 200))
+    PARSER_CHECKOUT_TIMEOUT = int(os.getenv("PARSER_CHECKOUT_TIMEOUT", 60))
+    # Сколько драйверов запустить при старте приложения
+    PARSER_PREWARM = int(os.getenv("PARSER_PREWARM", 1))
+    # Локальный chromedriver для хостов без доступа в интернет
+    CHROMEDRIVER_PATH = os.getenv("CHROMEDRIVER_PATH", "")
+    
+    # Search cache
+    SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", 6 * 3600))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", 256))
+    
+    # Organization details
+    DETAILS_TTL = int(os.getenv("DETAILS_TTL", 7 * 24 * 3600))
+    DETAILS_WORKERS = int(os.getenv("DETAILS_WORKERS", PARSER_POOL_SIZE))
+    
+    # Метрики /metrics
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    
+    # Retention (дни, 0 - хранить бессрочно)
+    RETENTION_REQUEST_LOGS_DAYS = int(os.getenv("RETENTION_REQUEST_LOGS_DAYS", 365))
+    RETENTION_RESULTS_DAYS = int(os.getenv("RETENTION_RESULTS_DAYS", 90))
+    RETENTION_JOBS_DAYS = int(os.getenv("RETENTION_JOBS_DAYS", 30))
+    RETENTION_USAGE_HOURLY_DAYS = int(os.getenv("RETENTION_USAGE_HOURLY_DAYS", 90))
+    RETENTION_EXPORT_FILES_HOURS = int(os.getenv("RETENTION_EXPORT_FILES_HOURS", 24))
+
+    # Maintenance
+    MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", 24 * 3600))
+    MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", 1000))
+    MAINTENANCE_VACUUM_RATIO = float(os.getenv("MAINTENANCE_VACUUM_RATIO", 0.2))
+    ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+
     # License settings
     DEFAULT_REQUESTS_PER_DAY = 100
     LICENSE_DURATION_DAYS = 30
+    LICENSE_CACHE_TTL = int(os.getenv("LICENSE_CACHE_TTL", 60))
 
 settings = Settings()
@@ -1,12 +1,53 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey
+from sqlalchemy import create_engine, event, inspect, Column, Index, Integer, Float, String, DateTime, Date, Boolean, Text, ForeignKey
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from datetime import datetime, timedelta
+from pathlib import Path
 import json
 
 from config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+BASE_DIR = Path(__file__).resolve().parent
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Настройки SQLite для одновременной работы нескольких потоков"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+def create_db_engine(url: str):
+    if url.startswith("sqlite"):
+        # Размер пула - только для файловой базы: для :memory: SQLAlchemy
+        # выбирает SingletonThreadPool, который не принимает max_overflow
+        database = make_url(url).database
+        in_memory = not database or database == ":memory:" or "mode=memory" in url
+        pool_args = {} if in_memory else {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+        }
+        engine = create_engine(
+            url,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": settings.SQLITE_BUSY_TIMEOUT / 1000
+            },
+            **pool_args
+        )
+        event.listen(engine, "connect", set_sqlite_pragmas)
+        return engine
+    
+    return create_engine(
+        url,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_pre_ping=True
+    )
+
+engine = create_db_engine(settings.DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -22,6 +63,8 @@ class License(Base):
     expires_at = Column(DateTime)
     requests_per_day = Column(Integer, default=settings.DEFAULT_REQUESTS_PER_DAY)
     total_requests = Column(Integer, default=0)
+    # Тариф: чем выше, тем раньше запросы лицензии получают доступ к картам
+    priority = Column(Integer, default=0, server_default="0", nullable=False)
     
     requests = relationship("RequestLog", back_populates="license")
 
@@ -31,19 +74,96 @@ class RequestLog(Base):
     id = Column(Integer, primary_key=True, index=True)
     license_id = Column(Integer, ForeignKey("licenses.id"))
     query = Column(String(500))
+    cache_key = Column(String(800), index=True)
+    # Нормализованный город запроса, из него триггер заполняет фасет города
+    city = Column(String(200))
+    from_cache = Column(Boolean, default=False)
+    # live - выдача карт (в том числе из кэша), local - ответ из локального индекса
+    source = Column(String(10), default="live", server_default="live", nullable=False)
+    batch_id = Column(String(36), ForeignKey("search_batches.id", name="fk_request_logs_batch_id"), index=True)
     results_count = Column(Integer)
+    # Разница с предыдущим запросом в режиме delta (JSON)
+    diff = Column(Text)
     requested_at = Column(DateTime, default=datetime.utcnow)
     ip_address = Column(String(50))
     user_agent = Column(Text)
     
     license = relationship("License", back_populates="requests")
+    
+    __table_args__ = (
+        Index("ix_request_logs_license_requested", "license_id", "requested_at"),
+    )
+
+class DailyUsage(Base):
+    __tablename__ = "daily_usage"
+    
+    license_id = Column(Integer, ForeignKey("licenses.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+
+class UsageRollup(Base):
+    """Использование лицензии за час или сутки
+
+    Счетчики увеличиваются при каждом запросе (usage.py), поэтому
+    админка строит списки и графики без просмотра request_logs.
+    """
+    __tablename__ = "usage_rollups"
+    
+    license_id = Column(Integer, ForeignKey("licenses.id"), primary_key=True)
+    # hour или day; bucket - начало часа или суток UTC
+    period = Column(String(4), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+    requests = Column(Integer, default=0, nullable=False)
+    results = Column(Integer, default=0, nullable=False)
+    errors = Column(Integer, default=0, nullable=False)
+    
+    __table_args__ = (
+        Index("ix_usage_rollups_period_bucket", "period", "bucket"),
+    )
+
+class SearchJob(Base):
+    __tablename__ = "search_jobs"
+    
+    id = Column(String(36), primary_key=True, index=True)
+    license_id = Column(Integer, ForeignKey("licenses.id"))
+    request_id = Column(Integer, ForeignKey("request_logs.id"), index=True)
+    query = Column(String(500))
+    city = Column(String(200))
+    result_limit = Column(Integer)
+    details_mode = Column(String(20), default="none")
+    delta = Column(Boolean, default=False)
+    status = Column(String(20), default="pending", index=True)
+    progress = Column(Integer, default=0)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
+class SearchBatch(Base):
+    """Пакет поисков: несколько пар запрос - город под одним идентификатором
+
+    Каждый элемент пакета - отдельный RequestLog с batch_id и своей
+    фоновой задачей, состояние пакета собирается из этих задач.
+    """
+    __tablename__ = "search_batches"
+    
+    id = Column(String(36), primary_key=True)
+    license_id = Column(Integer, ForeignKey("licenses.id"), index=True)
+    details_mode = Column(String(20), default="none")
+    items_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 class ParsedData(Base):
+    """Копии организаций по запросам в прежнем формате
+
+    Новые результаты пишутся в organizations и request_organizations,
+    таблица сохранена для старых данных.
+    """
     __tablename__ = "parsed_data"
     
     id = Column(Integer, primary_key=True, index=True)
-    request_id = Column(Integer, ForeignKey("request_logs.id"))
-    organization_id = Column(String(100))
+    request_id = Column(Integer, ForeignKey("request_logs.id"), index=True)
+    organization_id = Column(String(100), index=True)
     name = Column(String(500))
     categories = Column(Text)
     address = Column(Text)
@@ -58,8 +178,77 @@ class ParsedData(Base):
     social_networks = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class Organization(Base):
+    __tablename__ = "organizations"
+    
+    id = Column(Integer, primary_key=True)
+    organization_id = Column(String(100), unique=True, index=True, nullable=False)
+    name = Column(String(500))
+    categories = Column(Text)
+    address = Column(Text)
+    phones = Column(Text)
+    website = Column(String(500))
+    rating = Column(String(50))
+    reviews_count = Column(Integer)
+    schedule = Column(Text)
+    latitude = Column(String(50))
+    longitude = Column(String(50))
+    attributes = Column(Text)
+    social_networks = Column(Text)
+    content_hash = Column(String(40))
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class OrganizationFacets(Base):
+    """Числовые и фасетные поля организаций для локального поиска
+
+    Заполняется триггерами миграции 0007 вместе с полнотекстовым
+    индексом organizations_fts. city - нормализованный город последнего
+    запроса, в выдаче которого встретилась организация.
+    """
+    __tablename__ = "organization_facets"
+    
+    organization_pk = Column(Integer, ForeignKey("organizations.id"), primary_key=True)
+    rating = Column(Float, index=True)
+    reviews_count = Column(Integer, index=True)
+    city = Column(String(100), index=True)
+
+class RequestOrganization(Base):
+    __tablename__ = "request_organizations"
+    
+    request_id = Column(Integer, ForeignKey("request_logs.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    organization_pk = Column(Integer, ForeignKey("organizations.id"), nullable=False, index=True)
+
+class OrganizationDetails(Base):
+    __tablename__ = "organization_details"
+    
+    organization_id = Column(String(100), primary_key=True)
+    phones = Column(Text)
+    website = Column(String(500))
+    schedule = Column(Text)
+    latitude = Column(String(50))
+    longitude = Column(String(50))
+    fetched_at = Column(DateTime, default=datetime.utcnow)
+
+def alembic_config():
+    from alembic.config import Config
+    
+    config = Config(str(BASE_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    config.attributes["configure_logger"] = False
+    return config
+
 def init_db():
-    Base.metadata.create_all(bind=engine)
+    """Применение миграций Alembic до последней версии"""
+    from alembic import command
+    
+    config = alembic_config()
+    tables = inspect(engine).get_table_names()
+    if "licenses" in tables and "alembic_version" not in tables:
+        # База создана через create_all до перехода на миграции
+        command.stamp(config, "0001")
+    command.upgrade(config, "head")
 
 def get_db():
     db = SessionLocal()
@@ -0,0 +1,101 @@
+import json
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from cache import completed_request
+from database import Organization, RequestLog, RequestOrganization
+from storage import CONTENT_FIELDS, normalize_organization, merge_rows, organization_key
+
+
+def previous_request_id(db: Session, request_log: RequestLog) -> Optional[int]:
+    """Последний успешный запрос той же лицензии с тем же ключом кэша
+
+    Ответы из локального индекса (fallback) не годятся в базу сравнения:
+    это совпадения по сохраненным организациям, а не прошлая выдача.
+    Частичная выдача неудачной задачи - тоже.
+    """
+    return db.query(RequestLog.id).filter(
+        RequestLog.license_id == request_log.license_id,
+        RequestLog.cache_key == request_log.cache_key,
+        RequestLog.id < request_log.id,
+        RequestLog.results_count > 0,
+        RequestLog.source == "live",
+        completed_request(),
+    ).order_by(RequestLog.id.desc()).limit(1).scalar()
+
+
+def request_organization_keys(db: Session, request_id: int) -> List[str]:
+    return list(db.execute(
+        select(Organization.organization_id)
+        .join(RequestOrganization, RequestOrganization.organization_pk == Organization.id)
+        .where(RequestOrganization.request_id == request_id)
+        .order_by(RequestOrganization.position)
+    ).scalars())
+
+
+class DeltaTracker:
+    """Сравнение свежей выдачи с последним известным состоянием организаций
+
+    observe() вызывается для каждой порции результатов до записи:
+    возвращает организации, новые для хранилища или с изменившимися
+    полями, а первичные ключи остальных собирает в known, чтобы
+    save_organizations только связал их с запросом. result() - разница
+    с предыдущим запросом той же лицензии с тем же ключом кэша.
+    """
+
+    def __init__(self, db: Session, request_log: RequestLog):
+        self.previous_id = previous_request_id(db, request_log)
+        self.previous = request_organization_keys(db, self.previous_id) if self.previous_id else []
+        self.current: Dict[str, None] = {}
+        self.new: List[str] = []
+        self.changed: Dict[str, Dict[str, list]] = {}
+        self.known: Dict[str, int] = {}
+        self.fresh: List[Dict] = []
+
+    def observe(self, db: Session, organizations: List[Dict]) -> List[Dict]:
+        keys = [organization_key(org) for org in organizations]
+        columns = [getattr(Organization, field) for field in CONTENT_FIELDS]
+        stored = {
+            item.organization_id: item._asdict()
+            for item in db.execute(
+                select(Organization.id, Organization.organization_id, *columns)
+                .where(Organization.organization_id.in_(set(keys)))
+            )
+        }
+
+        fresh = []
+        for key, org in zip(keys, organizations):
+            self.current[key] = None
+            old = stored.get(key)
+            if old is None:
+                self.new.append(key)
+                fresh.append(org)
+                continue
+            # Пустые поля карточки из списка не считаются изменением, как и при записи
+            merged = merge_rows(old, normalize_organization(org))
+            fields = {field: [old[field], merged[field]] for field in CONTENT_FIELDS if merged[field] != old[field]}
+            if fields:
+                self.changed[key] = fields
+                fresh.append(org)
+            else:
+                self.known[key] = old['id']
+        self.fresh.extend(fresh)
+        return fresh
+
+    def result(self) -> Dict:
+        previous = set(self.previous)
+        return {
+            "previous_request_id": self.previous_id,
+            "added": [key for key in self.current if key not in previous],
+            "removed": [key for key in self.previous if key not in self.current],
+            "changed": self.changed,
+            "new": len(self.new),
+            "unchanged": len(self.known),
+        }
+
+
+def load_diff(db: Session, request_id: int) -> Optional[Dict]:
+    value = db.query(RequestLog.diff).filter(RequestLog.id == request_id).scalar()
+    return json.loads(value) if value else None
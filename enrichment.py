@@ -0,0 +1,203 @@
+import time
+import queue
+import contextvars
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional
+
+from database import SessionLocal, OrganizationDetails
+from pool import parser_pool, PoolExhausted
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+DETAIL_MODES = ("none", "missing", "refresh")
+DETAIL_FIELDS = ("website", "schedule", "latitude", "longitude")
+
+
+class DetailEnricher:
+    """Дополнение результатов поиска данными карточек организаций
+
+    Детали хранятся в organization_details и считаются свежими в течение
+    DETAILS_TTL, поэтому каждая организация запрашивается не чаще раза
+    за период. Карточки загружаются параллельно несколькими парсерами:
+    вызывающий может передать собственный парсер, остальные берутся из
+    пула, только если там есть свободные.
+    """
+
+    def __init__(self, pool=parser_pool, workers: int = None, ttl: int = None):
+        self.pool = pool
+        self.workers = workers or settings.DETAILS_WORKERS
+        self.ttl = settings.DETAILS_TTL if ttl is None else ttl
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"fetched": 0, "reused": 0, "failed": 0}
+
+    def load(self, org_ids: List[str]) -> Dict[str, Dict]:
+        """Сохраненные детали по идентификаторам организаций"""
+        db = SessionLocal()
+        try:
+            rows = db.query(OrganizationDetails).filter(
+                OrganizationDetails.organization_id.in_(org_ids)
+            ).all()
+            return {
+                row.organization_id: {
+                    'id': row.organization_id,
+                    'phones': row.phones,
+                    'website': row.website,
+                    'schedule': row.schedule,
+                    'latitude': row.latitude,
+                    'longitude': row.longitude,
+                    'fetched_at': row.fetched_at,
+                }
+                for row in rows
+            }
+        finally:
+            db.close()
+
+    def save(self, details: Dict):
+        db = SessionLocal()
+        try:
+            row = db.get(OrganizationDetails, details['id'])
+            if row is None:
+                row = OrganizationDetails(organization_id=details['id'])
+                db.add(row)
+            row.phones = details.get('phones', '')
+            for field in DETAIL_FIELDS:
+                setattr(row, field, details.get(field, ''))
+            row.fetched_at = datetime.utcnow()
+            db.commit()
+        finally:
+            db.close()
+
+    @staticmethod
+    def merge(org: Dict, details: Dict) -> Dict:
+        """Перенос деталей в запись организации"""
+        for field in DETAIL_FIELDS:
+            if details.get(field):
+                org[field] = details[field]
+        if not org.get('phones') and details.get('phones'):
+            org['phones'] = details['phones']
+        return org
+
+    def enrich(self, organizations: List[Dict], mode: str = "missing",
+               parser=None, deadline: Optional[float] = None) -> List[Dict]:
+        """Дополнение organizations деталями в соответствии с режимом
+
+        mode: none - ничего не делать, missing - загружать только
+        отсутствующие или устаревшие детали, refresh - загружать заново.
+        deadline - момент time.monotonic(), после которого новые карточки
+        не запрашиваются.
+        """
+        if mode == "none" or not organizations:
+            return organizations
+
+        by_id = {}
+        for org in organizations:
+            if org.get('id'):
+                by_id.setdefault(org['id'], []).append(org)
+
+        to_fetch = list(by_id)
+        if mode == "missing":
+            fresh_since = datetime.utcnow() - timedelta(seconds=self.ttl)
+            stored = self.load(to_fetch)
+            to_fetch = []
+            for org_id, orgs in by_id.items():
+                row = stored.get(org_id)
+                if row is not None and row['fetched_at'] and row['fetched_at'] >= fresh_since:
+                    for org in orgs:
+                        self.merge(org, row)
+                    self.stats["reused"] += 1
+                else:
+                    to_fetch.append(org_id)
+
+        if to_fetch:
+            self._fetch_all(to_fetch, by_id, parser, deadline)
+        return organizations
+
+    def _fetch_all(self, org_ids: List[str], by_id: Dict[str, List[Dict]], parser, deadline):
+        tasks = queue.Queue()
+        for org_id in org_ids:
+            tasks.put(org_id)
+
+        def work(worker_parser):
+            while deadline is None or time.monotonic() < deadline:
+                try:
+                    org_id = tasks.get_nowait()
+                except queue.Empty:
+                    return
+                details = self._fetch_one(worker_parser, org_id)
+                if details:
+                    for org in by_id[org_id]:
+                        self.merge(org, details)
+
+        def leased_work(timeout):
+            try:
+                with self.pool.lease(timeout=timeout) as worker_parser:
+                    work(worker_parser)
+            except PoolExhausted:
+                pass
+
+        extra = min(self.workers, len(org_ids)) - (1 if parser is not None else 0)
+        threads = []
+        for i in range(max(extra, 0)):
+            # Без собственного парсера первый поток ждет драйвер из пула,
+            # остальные подключаются, только если свободные драйверы есть сразу
+            timeout = None if parser is None and i == 0 else 0
+            # Потоки наследуют приоритет и разбивку времени вызывающего
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(leased_work, timeout), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        if parser is not None:
+            work(parser)
+        for thread in threads:
+            thread.join()
+
+    @staticmethod
+    def _keep_driver(parser):
+        """Сбой одной карточки не повод пересоздавать браузер
+
+        get_organization_details сохраняет ошибку в last_error, а пул
+        пересоздает драйвер с ошибкой при возврате. Если браузер отвечает,
+        ошибка относилась к карточке и сбрасывается.
+        """
+        if parser.last_error is not None and parser.is_alive():
+            parser.last_error = None
+
+    def _fetch_one(self, parser, org_id: str) -> Optional[Dict]:
+        """Загрузка карточки с защитой от одновременного запроса одной организации"""
+        with self._lock:
+            event = self._inflight.get(org_id)
+            leader = event is None
+            if leader:
+                event = threading.Event()
+                self._inflight[org_id] = event
+
+        if not leader:
+            event.wait()
+            return self.load([org_id]).get(org_id)
+
+        try:
+            details = parser.get_organization_details(org_id)
+            if details:
+                self.save(details)
+                self.stats["fetched"] += 1
+            else:
+                self.stats["failed"] += 1
+                self._keep_driver(parser)
+            return details
+        except Exception as e:
+            logger.warning(f"Ошибка при загрузке деталей {org_id}: {e}")
+            self.stats["failed"] += 1
+            self._keep_driver(parser)
+            return None
+        finally:
+            with self._lock:
+                self._inflight.pop(org_id, None)
+            event.set()
+
+
+detail_enricher = DetailEnricher()
@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from pool import parser_pool
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class JobTimeout(Exception):
+    """Задача парсера не уложилась в отведенное время"""
+
+
+class ParserExecutor:
+    """Выполнение блокирующих задач Selenium вне event loop
+
+    Каждая задача получает парсер из пула и выполняется в отдельном
+    потоке. Число потоков совпадает с размером пула, чтобы задачи
+    не простаивали в ожидании свободного драйвера.
+    """
+
+    def __init__(self, pool=parser_pool, workers: int = None):
+        self.pool = pool
+        self.workers = workers or pool.size
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="parser"
+        )
+
+    def _run_with_parser(self, job: Callable, args, kwargs, state: dict):
+        with self.pool.lease() as parser:
+            if state.get("cancelled"):
+                return None
+            state["parser"] = parser
+            timer = None
+            if state.get("timeout"):
+                timer = threading.Timer(state["timeout"], self._expire, (state,))
+                timer.daemon = True
+                timer.start()
+            try:
+                result = job(parser, *args, **kwargs)
+            except Exception:
+                if state.get("expired"):
+                    raise JobTimeout(f"Превышено время выполнения ({state['timeout']} с)")
+                raise
+            finally:
+                if timer is not None:
+                    timer.cancel()
+                state.pop("parser", None)
+            if state.get("expired"):
+                raise JobTimeout(f"Превышено время выполнения ({state['timeout']} с)")
+            return result
+
+    def _expire(self, state: dict):
+        """Закрытие драйвера задачи, превысившей таймаут"""
+        state["cancelled"] = True
+        parser = state.get("parser")
+        if parser is None:
+            return
+        state["expired"] = True
+        logger.warning(f"Задача парсера превысила таймаут {state.get('timeout')} с, закрываем драйвер")
+        parser.last_error = JobTimeout()
+        try:
+            parser.close()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии драйвера: {e}")
+
+    def submit(self, job: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Запуск задачи job(parser, *args, **kwargs) в пуле потоков
+
+        Если задача не уложилась в timeout секунд с момента получения
+        парсера, драйвер закрывается, как в run, а future завершается
+        с JobTimeout.
+        """
+        return self._executor.submit(self._run_with_parser, job, args, kwargs, {"timeout": timeout})
+
+    async def run(self, job: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Асинхронное выполнение задачи с таймаутом
+
+        При превышении таймаута драйвер закрывается: поток с зависшими
+        вызовами WebDriver получает ошибку, а пул пересоздает парсер.
+        """
+        timeout = settings.TIMEOUT if timeout is None else timeout
+        state = {}
+        loop = asyncio.get_running_loop()
+        # Контекст передается в поток, чтобы замеры попали в разбивку запроса
+        context = contextvars.copy_context()
+        future = loop.run_in_executor(
+            self._executor, context.run, self._run_with_parser, job, args, kwargs, state
+        )
+        try:
+            return await asyncio.wait_for(future, timeout=timeout)
+        except asyncio.TimeoutError:
+            state["timeout"] = timeout
+            await loop.run_in_executor(None, self._expire, state)
+            raise JobTimeout(f"Превышено время ожидания ({timeout} с)")
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+parser_executor = ParserExecutor()
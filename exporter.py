@@ -0,0 +1,161 @@
+import io
+import csv
+import json
+import time
+import tempfile
+from typing import Iterator, List, Tuple
+
+from openpyxl import Workbook
+from sqlalchemy import select, func
+
+from database import SessionLocal, Organization, RequestOrganization
+from metrics import EXPORT_SECONDS, EXPORT_BYTES
+
+# Размер порции строк, читаемых из базы за раз
+BATCH_SIZE = 500
+# Размер блока при отдаче xlsx-файла
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS: List[Tuple[str, object]] = [
+    ('ID', Organization.organization_id),
+    ('Название', Organization.name),
+    ('Категории', Organization.categories),
+    ('Адрес', Organization.address),
+    ('Телефоны', Organization.phones),
+    ('Сайт', Organization.website),
+    ('Рейтинг', Organization.rating),
+    ('Отзывов', Organization.reviews_count),
+    ('График', Organization.schedule),
+    ('Широта', Organization.latitude),
+    ('Долгота', Organization.longitude),
+]
+HEADERS = [header for header, _ in EXPORT_COLUMNS]
+
+FORMATS = {
+    "json": ("application/json", "json"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "excel": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+
+def iter_rows(request_ids, unique: bool = False) -> Iterator[List[tuple]]:
+    """Порции строк результатов без загрузки ORM-объектов
+
+    request_ids - список идентификаторов запросов или подзапрос.
+    unique - каждая организация один раз, в порядке первого появления.
+    """
+    db = SessionLocal()
+    try:
+        columns = [column for _, column in EXPORT_COLUMNS]
+        if unique:
+            # Первая по (request_id, position) строка каждой организации
+            occurrences = select(
+                RequestOrganization.organization_pk,
+                RequestOrganization.request_id,
+                RequestOrganization.position,
+                func.row_number().over(
+                    partition_by=RequestOrganization.organization_pk,
+                    order_by=(RequestOrganization.request_id, RequestOrganization.position)
+                ).label("occurrence")
+            ).where(
+                RequestOrganization.request_id.in_(request_ids)
+            ).subquery()
+            stmt = select(*columns).join(
+                occurrences, occurrences.c.organization_pk == Organization.id
+            ).where(
+                occurrences.c.occurrence == 1
+            ).order_by(occurrences.c.request_id, occurrences.c.position)
+        else:
+            stmt = select(*columns).join(
+                RequestOrganization, RequestOrganization.organization_pk == Organization.id
+            ).where(
+                RequestOrganization.request_id.in_(request_ids)
+            ).order_by(RequestOrganization.request_id, RequestOrganization.position)
+        stmt = stmt.execution_options(yield_per=BATCH_SIZE)
+        for batch in db.execute(stmt).partitions(BATCH_SIZE):
+            yield batch
+    finally:
+        db.close()
+
+
+def stream_csv(request_ids, unique: bool = False) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADERS)
+    # BOM, чтобы Excel корректно открыл кириллицу
+    yield ('\ufeff' + buffer.getvalue()).encode('utf-8')
+    for batch in iter_rows(request_ids, unique):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def stream_ndjson(request_ids, unique: bool = False) -> Iterator[bytes]:
+    for batch in iter_rows(request_ids, unique):
+        yield ''.join(
+            json.dumps(dict(zip(HEADERS, row)), ensure_ascii=False) + '\n' for row in batch
+        ).encode('utf-8')
+
+
+def stream_json(request_ids, unique: bool = False) -> Iterator[bytes]:
+    yield b'['
+    first = True
+    for batch in iter_rows(request_ids, unique):
+        chunk = ','.join(json.dumps(dict(zip(HEADERS, row)), ensure_ascii=False) for row in batch)
+        if not first:
+            chunk = ',' + chunk
+        first = False
+        yield chunk.encode('utf-8')
+    yield b']'
+
+
+def stream_xlsx(request_ids, unique: bool = False) -> Iterator[bytes]:
+    """Книга в режиме write_only: строки сразу сбрасываются на диск openpyxl"""
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Результаты")
+    sheet.append(HEADERS)
+    for batch in iter_rows(request_ids, unique):
+        for row in batch:
+            sheet.append(list(row))
+
+    with tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE * 16) as output:
+        workbook.save(output)
+        output.seek(0)
+        while True:
+            chunk = output.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+STREAMERS = {
+    "json": stream_json,
+    "ndjson": stream_ndjson,
+    "csv": stream_csv,
+    "excel": stream_xlsx,
+}
+
+
+def measured(chunks: Iterator[bytes], format: str) -> Iterator[bytes]:
+    """Учет объема и полного времени формирования экспорта"""
+    started = time.perf_counter()
+    total = 0
+    try:
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+    finally:
+        EXPORT_SECONDS.observe(time.perf_counter() - started, format=format)
+        EXPORT_BYTES.inc(total, format=format)
+
+
+def export_stream(request_ids, format: str, unique: bool = False) -> Tuple[Iterator[bytes], str, str]:
+    """Генератор содержимого, media type и расширение файла для формата"""
+    if format == "xlsx":
+        format = "excel"
+    if format not in STREAMERS:
+        format = "json"
+    media_type, extension = FORMATS[format]
+    return measured(STREAMERS[format](request_ids, unique), format), media_type, extension
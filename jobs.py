@@ -0,0 +1,243 @@
+import json
+import uuid
+import logging
+import threading
+from datetime import datetime
+from typing import List, Dict
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal, SearchJob, RequestLog, RequestOrganization, License
+from executor import parser_executor
+from storage import save_organizations, upsert_organizations
+from cache import search_cache, make_cache_key
+from enrichment import detail_enricher
+from politeness import current_priority
+from delta import DeltaTracker
+from usage import record_usage
+from quota import release
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Частота сохранения частичных результатов
+FLUSH_EVERY = 10
+
+
+class JobScheduler:
+    """Фоновое выполнение поисковых задач
+
+    Задачи хранятся в таблице search_jobs, поэтому незавершенные задачи
+    перезапускаются после рестарта приложения. Результаты пишутся
+    в хранилище организаций порциями по мере разбора, а progress
+    отражает число уже сохраненных организаций.
+    """
+
+    def __init__(self, executor=parser_executor):
+        self.executor = executor
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def create_job(self, db: Session, license_id: int, request_id: int,
+                   query: str, city: str, limit: int, details_mode: str = "none",
+                   delta: bool = False) -> SearchJob:
+        job = SearchJob(
+            id=str(uuid.uuid4()),
+            license_id=license_id,
+            request_id=request_id,
+            query=query,
+            city=city,
+            result_limit=limit,
+            details_mode=details_mode,
+            delta=delta,
+            status="pending",
+            progress=0,
+        )
+        db.add(job)
+        return job
+
+    def complete_from_cache(self, db: Session, job: SearchJob, request_log: RequestLog,
+                            organizations: List[Dict]):
+        """Мгновенное завершение задачи результатом из кэша
+
+        Задача сразу получает статус done, поэтому вызывается только
+        для задач без загрузки деталей (details_mode none).
+        """
+        known = None
+        if job.delta:
+            tracker = DeltaTracker(db, request_log)
+            tracker.observe(db, organizations)
+            known = tracker.known
+            request_log.diff = json.dumps(tracker.result(), ensure_ascii=False)
+        save_organizations(db, job.request_id, organizations, known=known)
+        now = datetime.utcnow()
+        job.status = "done"
+        job.progress = len(organizations)
+        job.started_at = now
+        job.finished_at = now
+        request_log.from_cache = True
+        request_log.results_count = len(organizations)
+        record_usage(db, job.license_id, results=len(organizations))
+
+    def enqueue(self, job_id: str):
+        """Постановка задачи в очередь исполнителя"""
+        with self._lock:
+            if job_id in self._futures:
+                return
+            # Зависшая задача не держит поток и драйвер дольше JOB_TIMEOUT
+            future = self.executor.submit(self._run, job_id, timeout=settings.JOB_TIMEOUT)
+            self._futures[job_id] = future
+        future.add_done_callback(lambda f: self._done(job_id, f))
+
+    def _done(self, job_id: str, future):
+        with self._lock:
+            self._futures.pop(job_id, None)
+        error = future.exception()
+        if error is not None:
+            # Ошибка до запуска задачи, например пул парсеров недоступен,
+            # или таймаут задачи
+            self._finish(job_id, "failed", str(error))
+
+    def _release(self, db: Session, job: SearchJob):
+        """Возврат запроса неудачной задачи в лимит, как при ошибке синхронного поиска"""
+        request_log = db.get(RequestLog, job.request_id) if job.request_id else None
+        day = request_log.requested_at.date() if request_log and request_log.requested_at else None
+        release(db, job.license_id, day=day)
+
+    def _finish(self, job_id: str, status: str, error: str = None):
+        db = SessionLocal()
+        try:
+            job = db.query(SearchJob).filter(SearchJob.id == job_id).first()
+            if job and job.status not in ("done", "failed"):
+                job.status = status
+                job.error = error
+                job.finished_at = datetime.utcnow()
+                if status == "failed":
+                    self._release(db, job)
+                    record_usage(db, job.license_id, errors=1)
+                db.commit()
+        finally:
+            db.close()
+
+    def _run(self, parser, job_id: str):
+        db = SessionLocal()
+        token = None
+        try:
+            job = db.query(SearchJob).filter(SearchJob.id == job_id).first()
+            if not job or job.status in ("done", "failed"):
+                return
+            # Переходы задачи идут с приоритетом ее лицензии
+            license = db.get(License, job.license_id)
+            token = current_priority.set(license.priority if license else 0)
+            job.status = "running"
+            job.started_at = datetime.utcnow()
+            db.commit()
+
+            request_log = db.query(RequestLog).filter(RequestLog.id == job.request_id).first()
+            tracker = DeltaTracker(db, request_log) if job.delta and request_log else None
+            buffer: List[Dict] = []
+
+            def flush():
+                if not buffer:
+                    return
+                known = None
+                if tracker:
+                    tracker.observe(db, buffer)
+                    known = tracker.known
+                save_organizations(db, job.request_id, buffer, start_position=job.progress, known=known)
+                job.progress += len(buffer)
+                buffer.clear()
+                db.commit()
+
+            def on_result(org: Dict):
+                buffer.append(org)
+                if len(buffer) >= FLUSH_EVERY:
+                    flush()
+
+            key = make_cache_key(job.query, job.city, job.result_limit)
+            cached = search_cache.lookup(db, key)
+            if cached is not None:
+                organizations = cached
+                buffer.extend(cached)
+                flush()
+                search_error = None
+            else:
+                organizations = parser.search_organizations(
+                    job.query, job.city, job.result_limit, on_result=on_result
+                )
+                flush()
+                search_error = parser.last_error
+                if search_error is None:
+                    search_cache.store(key, organizations)
+
+            if search_error is None and job.details_mode not in (None, "none"):
+                # В режиме delta карточки загружаются только для новых и изменившихся
+                targets = tracker.fresh if tracker else organizations
+                detail_enricher.enrich(targets, job.details_mode, parser=parser)
+                upsert_organizations(db, targets)
+
+            if search_error is not None:
+                job.status = "failed"
+                job.error = str(search_error)
+                self._release(db, job)
+            else:
+                job.status = "done"
+            job.finished_at = datetime.utcnow()
+            if request_log:
+                request_log.results_count = job.progress
+                request_log.from_cache = cached is not None
+                if tracker:
+                    request_log.diff = json.dumps(tracker.result(), ensure_ascii=False)
+            record_usage(db, job.license_id, results=job.progress, errors=int(search_error is not None))
+            db.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при выполнении задачи {job_id}: {e}")
+            db.rollback()
+            self._finish(job_id, "failed", str(e))
+        finally:
+            if token is not None:
+                current_priority.reset(token)
+            db.close()
+
+    def resume_pending(self):
+        """Перезапуск задач, не завершенных до остановки приложения"""
+        db = SessionLocal()
+        try:
+            jobs = db.query(SearchJob).filter(SearchJob.status.in_(("pending", "running"))).all()
+            for job in jobs:
+                if job.status == "running":
+                    # Частичные результаты прерванного запуска собираются заново
+                    db.query(RequestOrganization).filter(
+                        RequestOrganization.request_id == job.request_id
+                    ).delete()
+                    job.status = "pending"
+                    job.progress = 0
+            db.commit()
+            job_ids = [job.id for job in jobs]
+        finally:
+            db.close()
+
+        for job_id in job_ids:
+            self.enqueue(job_id)
+        if job_ids:
+            logger.info(f"Возобновлено задач: {len(job_ids)}")
+
+
+def job_to_dict(job: SearchJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "request_id": job.request_id,
+        "query": job.query,
+        "city": job.city,
+        "limit": job.result_limit,
+        "status": job.status,
+        "progress": job.progress,
+        "error": job.error,
+        "delta": bool(job.delta),
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+
+
+job_scheduler = JobScheduler()
@@ -0,0 +1,252 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import select, delete, and_, or_
+
+from database import engine, RequestLog, RequestOrganization, ParsedData, SearchJob, SearchBatch, DailyUsage, UsageRollup
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Пауза между пакетами удаления, чтобы запись успевали делать запросы
+BATCH_PAUSE = 0.05
+# Задержка первого запуска после старта приложения
+STARTUP_DELAY = 300
+EXPORT_DIR = "static"
+EXPORT_PATTERN = "results_*"
+
+
+class Maintenance:
+    """Очистка устаревших данных и сжатие базы
+
+    Строки старше срока хранения сначала дописываются в архив
+    ARCHIVE_DIR/<таблица>_<время>.ndjson.gz, затем удаляются пакетами,
+    каждый в своей короткой транзакции. Результаты запроса и задачи
+    не переживают сам запрос. После удаления выполняется ANALYZE, а если
+    свободных страниц стало больше MAINTENANCE_VACUUM_RATIO - VACUUM.
+    """
+
+    def __init__(self, batch_size: int = None, archive_dir: str = None, interval: int = None):
+        self.batch_size = batch_size or settings.MAINTENANCE_BATCH_SIZE
+        self.archive_dir = Path(archive_dir or settings.ARCHIVE_DIR)
+        self.interval = settings.MAINTENANCE_INTERVAL if interval is None else interval
+        self.last_report: Optional[Dict] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def cutoff(now: datetime, days: int, limit: int = 0) -> Optional[datetime]:
+        """Граница хранения; limit - срок хранения родительских строк"""
+        if limit and (not days or days > limit):
+            days = limit
+        return now - timedelta(days=days) if days else None
+
+    def plan(self, now: datetime) -> List[tuple]:
+        """Правила очистки в порядке выполнения: (таблица, условие, ключ пакета)"""
+        logs_days = settings.RETENTION_REQUEST_LOGS_DAYS
+        results_before = self.cutoff(now, settings.RETENTION_RESULTS_DAYS, logs_days)
+        jobs_before = self.cutoff(now, settings.RETENTION_JOBS_DAYS, logs_days)
+        logs_before = self.cutoff(now, logs_days)
+        # Суточные агрегаты живут столько же, сколько журнал запросов, часовые - не дольше
+        hourly_before = self.cutoff(now, settings.RETENTION_USAGE_HOURLY_DAYS, logs_days)
+
+        rules = []
+        if results_before:
+            old_requests = select(RequestLog.id).where(RequestLog.requested_at < results_before)
+            rules.append((RequestOrganization.__table__,
+                          RequestOrganization.request_id.in_(old_requests), RequestOrganization.request_id))
+            rules.append((ParsedData.__table__,
+                          ParsedData.created_at < results_before, ParsedData.id))
+        if jobs_before:
+            old_requests = select(RequestLog.id).where(RequestLog.requested_at < jobs_before)
+            rules.append((SearchJob.__table__,
+                          or_(and_(SearchJob.status.in_(("done", "failed")),
+                                   SearchJob.created_at < jobs_before),
+                              SearchJob.request_id.in_(old_requests)), SearchJob.id))
+        if logs_before:
+            rules.append((RequestLog.__table__, RequestLog.requested_at < logs_before, RequestLog.id))
+            rules.append((SearchBatch.__table__,
+                          and_(SearchBatch.created_at < logs_before,
+                               ~SearchBatch.id.in_(select(RequestLog.batch_id).where(RequestLog.batch_id.isnot(None)))),
+                          SearchBatch.id))
+            rules.append((DailyUsage.__table__, DailyUsage.day < logs_before.date(), DailyUsage.day))
+            rules.append((UsageRollup.__table__,
+                          and_(UsageRollup.period == "day", UsageRollup.bucket < logs_before),
+                          UsageRollup.bucket))
+        if hourly_before:
+            rules.append((UsageRollup.__table__,
+                          and_(UsageRollup.period == "hour", UsageRollup.bucket < hourly_before),
+                          UsageRollup.bucket))
+        return rules
+
+    def archive_path(self, name: str, stamp: str) -> Path:
+        self.archive_dir.mkdir(parents=True, exist_ok=True)
+        return self.archive_dir / f"{name}_{stamp}.ndjson.gz"
+
+    @staticmethod
+    def write_part(path: Path, rows) -> Path:
+        """Запись пакета во временный файл рядом с архивом, до удаления строк"""
+        part = path.with_name(path.name + ".part")
+        with gzip.open(part, "wt", encoding="utf-8") as archive:
+            archive.writelines(
+                json.dumps(dict(row), ensure_ascii=False, default=str) + "\n" for row in rows
+            )
+        with open(part, "rb") as f:
+            os.fsync(f.fileno())
+        return part
+
+    @staticmethod
+    def finalize_part(part: Path, path: Path):
+        """Дописывание пакета в архив; gzip допускает склейку нескольких потоков"""
+        with open(path, "ab") as archive, open(part, "rb") as f:
+            archive.write(f.read())
+            archive.flush()
+            os.fsync(archive.fileno())
+        part.unlink()
+
+    def purge(self, table, condition, key, stamp: str, archives: List[str]) -> int:
+        """Архивирование и пакетное удаление строк table, подходящих под condition
+
+        Пакет сначала пишется во временный файл и попадает в архив только
+        после фиксации удаления: если удаление не прошло, при повторе
+        строки не задваиваются, а если процесс упал после фиксации,
+        данные остаются во временном файле.
+        """
+        total = 0
+        path = None
+        while True:
+            part = None
+            try:
+                with engine.begin() as conn:
+                    keys = conn.execute(
+                        select(key).where(condition).distinct().order_by(key).limit(self.batch_size)
+                    ).scalars().all()
+                    if not keys:
+                        break
+                    batch = and_(condition, key.in_(keys))
+                    rows = conn.execute(select(table).where(batch)).mappings().all()
+                    if path is None:
+                        path = self.archive_path(table.name, stamp)
+                        archives.append(str(path))
+                    part = self.write_part(path, rows)
+                    conn.execute(delete(table).where(batch))
+            except BaseException:
+                if part is not None:
+                    part.unlink(missing_ok=True)
+                raise
+            self.finalize_part(part, path)
+            total += len(rows)
+            time.sleep(BATCH_PAUSE)
+        return total
+
+    def clean_exports(self, now: datetime) -> Dict:
+        """Удаление старых файлов экспорта из static"""
+        removed, freed = 0, 0
+        hours = settings.RETENTION_EXPORT_FILES_HOURS
+        if hours and os.path.isdir(EXPORT_DIR):
+            before = (now - timedelta(hours=hours)).timestamp()
+            for path in Path(EXPORT_DIR).glob(EXPORT_PATTERN):
+                stat = path.stat()
+                if path.is_file() and stat.st_mtime < before:
+                    path.unlink()
+                    removed += 1
+                    freed += stat.st_size
+        return {"removed": removed, "bytes": freed}
+
+    @staticmethod
+    def database_size() -> Optional[int]:
+        """Размер файлов SQLite вместе с WAL"""
+        path = engine.url.database
+        if engine.dialect.name != "sqlite" or not path or path == ":memory:":
+            return None
+        return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+    @staticmethod
+    def checkpoint():
+        """Перенос WAL в основной файл с обрезкой WAL до нуля"""
+        if engine.dialect.name != "sqlite":
+            return
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def compact(self) -> bool:
+        """ANALYZE и, при большом числе свободных страниц, VACUUM
+
+        Возвращает признак выполненного VACUUM.
+        """
+        vacuum = False
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if engine.dialect.name == "sqlite":
+                pages = conn.exec_driver_sql("PRAGMA page_count").scalar()
+                free = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+                vacuum = bool(pages) and free / pages >= settings.MAINTENANCE_VACUUM_RATIO
+                if vacuum:
+                    conn.exec_driver_sql("VACUUM")
+                conn.exec_driver_sql("ANALYZE")
+                conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            else:
+                conn.exec_driver_sql("ANALYZE")
+        return vacuum
+
+    def run(self) -> Optional[Dict]:
+        """Полный цикл обслуживания; None, если он уже выполняется"""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            started = time.monotonic()
+            now = datetime.utcnow()
+            stamp = now.strftime("%Y%m%d_%H%M%S")
+            # Размер до очистки без WAL: иначе его обрезка в compact
+            # считалась бы освобожденным местом
+            self.checkpoint()
+            size_before = self.database_size()
+
+            deleted, archives = {}, []
+            for table, condition, key in self.plan(now):
+                count = self.purge(table, condition, key, stamp, archives)
+                deleted[table.name] = deleted.get(table.name, 0) + count
+
+            exports = self.clean_exports(now)
+            vacuum = self.compact()
+            size_after = self.database_size()
+
+            reclaimed = exports["bytes"]
+            if size_before is not None:
+                reclaimed += max(size_before - size_after, 0)
+            self.last_report = {
+                "started_at": now,
+                "duration": round(time.monotonic() - started, 3),
+                "deleted": deleted,
+                "archives": archives,
+                "export_files": exports,
+                "vacuum": vacuum,
+                "db_bytes_before": size_before,
+                "db_bytes_after": size_after,
+                "reclaimed_bytes": reclaimed,
+            }
+            logger.info(f"Обслуживание базы: удалено {deleted}, освобождено байт: {reclaimed}")
+            return self.last_report
+        finally:
+            self._lock.release()
+
+    async def run_periodically(self):
+        """Фоновый запуск обслуживания раз в MAINTENANCE_INTERVAL секунд"""
+        if self.interval <= 0:
+            return
+        await asyncio.sleep(STARTUP_DELAY)
+        while True:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self.run)
+            except Exception as e:
+                logger.error(f"Ошибка обслуживания базы: {e}")
+            await asyncio.sleep(self.interval)
+
+
+maintenance = Maintenance()
@@ -0,0 +1,236 @@
+import time
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from config import settings
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Разбивка времени текущего запроса, если ее запросил клиент
+current_trace: ContextVar[Optional["Trace"]] = ContextVar("current_trace", default=None)
+
+
+class Trace:
+    """Суммарное время и число вызовов по шагам одного запроса"""
+
+    def __init__(self):
+        self.steps: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, step: str, seconds: float):
+        with self._lock:
+            entry = self.steps.setdefault(step, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += 1
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {
+            step: {"seconds": round(seconds, 4), "count": count}
+            for step, (seconds, count) in sorted(self.steps.items(), key=lambda item: -item[1][0])
+        }
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, registry: "Registry", name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        registry.metrics.append(self)
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(label, "")) for label in self.labels)
+
+    def _label_text(self, key: Tuple, extra: str = "") -> str:
+        pairs = [f'{label}="{value}"' for label, value in zip(self.labels, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: Tuple, value) -> List[str]:
+        return [f"{self.name}{self._label_text(key)} {value}"]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class Histogram(Metric):
+    """Гистограмма длительностей; наблюдения попадают и в текущую разбивку"""
+    type = "histogram"
+
+    def __init__(self, registry, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        item = current_trace.get()
+        if item is not None:
+            step = self.name + (":" + "/".join(self._key(labels)) if self.labels else "")
+            item.add(step, value)
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def time(self, **labels):
+        """Контекстный менеджер, измеряющий время блока"""
+        if not self.registry.enabled and current_trace.get() is None:
+            return NULL_TIMER
+        return _Timer(self, labels)
+
+    def _render_value(self, key: Tuple, value) -> List[str]:
+        counts, total, count = value
+        lines, cumulative = [], 0
+        for bound, bucket in zip(self.buckets, counts):
+            cumulative += bucket
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+        le = 'le="+Inf"'
+        lines.append(f"{self.name}_bucket{self._label_text(key, le)} {count}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {total}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Набор метрик в текстовом формате Prometheus
+
+    При enabled=False счетчики и гистограммы сразу возвращаются,
+    а таймеры не создаются, если не собирается разбивка запроса.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics: List[Metric] = []
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return Counter(self, name, help, labels)
+
+    def gauge(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Gauge:
+        return Gauge(self, name, help, labels)
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets=DEFAULT_BUCKETS) -> Histogram:
+        return Histogram(self, name, help, labels, buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry(enabled=settings.METRICS_ENABLED)
+
+# Парсер
+PARSER_OPERATION_SECONDS = registry.histogram(
+    "parser_operation_seconds", "Длительность поиска и загрузки карточки", ("operation",))
+PARSER_NAVIGATION_SECONDS = registry.histogram(
+    "parser_navigation_seconds", "Время загрузки страниц")
+PARSER_WAIT_SECONDS = registry.histogram(
+    "parser_wait_seconds", "Время ожидания состояний страницы", ("kind",))
+PARSER_EXTRACT_SECONDS = registry.histogram(
+    "parser_extract_seconds", "Время извлечения порции карточек", ("mode",))
+PARSER_ELEMENT_PARSE_SECONDS = registry.histogram(
+    "parser_element_parse_seconds", "Время поэлементного разбора одной карточки")
+PARSER_RECORDS = registry.counter(
+    "parser_records_total", "Извлечено записей организаций", ("mode",))
+PARSER_SCROLLS = registry.counter(
+    "parser_scrolls_total", "Прокруток списка результатов")
+PARSER_STOPS = registry.counter(
+    "parser_search_stops_total", "Причины остановки подгрузки выдачи", ("reason",))
+PARSER_FAILURES = registry.counter(
+    "parser_failures_total", "Ошибки парсера", ("operation",))
+WEBDRIVER_COMMAND_SECONDS = registry.histogram(
+    "webdriver_command_seconds", "Время обращений к WebDriver", ("command",))
+WEBDRIVER_ERRORS = registry.counter(
+    "webdriver_errors_total", "Ошибки обращений к WebDriver", ("command",))
+POLITENESS_WAIT_SECONDS = registry.histogram(
+    "politeness_wait_seconds", "Ожидание разрешения на переход")
+POLITENESS_BACKOFFS = registry.counter(
+    "politeness_backoffs_total", "Блокировки хоста после капчи или ошибки", ("reason",))
+
+# Приложение
+API_STAGE_SECONDS = registry.histogram(
+    "api_search_stage_seconds", "Этапы обработки /api/search", ("stage",))
+LICENSE_VERIFY_SECONDS = registry.histogram(
+    "license_verify_seconds", "Проверка лицензии", ("source",))
+STORAGE_WRITE_SECONDS = registry.histogram(
+    "storage_write_seconds", "Запись результатов в базу", ("operation",))
+STORAGE_ROWS = registry.counter(
+    "storage_rows_total", "Записано строк организаций и связей", ("operation",))
+LOCAL_SEARCH_SECONDS = registry.histogram(
+    "local_search_seconds", "Поиск по локальному индексу организаций")
+EXPORT_SECONDS = registry.histogram(
+    "export_seconds", "Формирование файла экспорта", ("format",))
+EXPORT_BYTES = registry.counter(
+    "export_bytes_total", "Отдано байт экспорта", ("format",))
+PARSER_POOL = registry.gauge(
+    "parser_pool", "Состояние пула парсеров", ("state",))
@@ -0,0 +1,71 @@
+"""Исходная схема: лицензии, журнал запросов, результаты
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "licenses",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("key", sa.String(100)),
+        sa.Column("owner_name", sa.String(200)),
+        sa.Column("email", sa.String(200)),
+        sa.Column("is_active", sa.Boolean()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("expires_at", sa.DateTime()),
+        sa.Column("requests_per_day", sa.Integer()),
+        sa.Column("total_requests", sa.Integer()),
+    )
+    op.create_index("ix_licenses_id", "licenses", ["id"])
+    op.create_index("ix_licenses_key", "licenses", ["key"], unique=True)
+
+    op.create_table(
+        "request_logs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("license_id", sa.Integer(), sa.ForeignKey("licenses.id")),
+        sa.Column("query", sa.String(500)),
+        sa.Column("results_count", sa.Integer()),
+        sa.Column("requested_at", sa.DateTime()),
+        sa.Column("ip_address", sa.String(50)),
+        sa.Column("user_agent", sa.Text()),
+    )
+    op.create_index("ix_request_logs_id", "request_logs", ["id"])
+
+    op.create_table(
+        "parsed_data",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("request_id", sa.Integer(), sa.ForeignKey("request_logs.id")),
+        sa.Column("organization_id", sa.String(100)),
+        sa.Column("name", sa.String(500)),
+        sa.Column("categories", sa.Text()),
+        sa.Column("address", sa.Text()),
+        sa.Column("phones", sa.Text()),
+        sa.Column("website", sa.String(500)),
+        sa.Column("rating", sa.String(50)),
+        sa.Column("reviews_count", sa.Integer()),
+        sa.Column("schedule", sa.Text()),
+        sa.Column("latitude", sa.String(50)),
+        sa.Column("longitude", sa.String(50)),
+        sa.Column("attributes", sa.Text()),
+        sa.Column("social_networks", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_parsed_data_id", "parsed_data", ["id"])
+
+
+def downgrade():
+    op.drop_table("parsed_data")
+    op.drop_table("request_logs")
+    op.drop_table("licenses")
@@ -0,0 +1,69 @@
+"""Фоновые задачи, кэш поиска, дневные счетчики и детали организаций
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.add_column(sa.Column("cache_key", sa.String(800)))
+        batch_op.add_column(sa.Column("from_cache", sa.Boolean(), server_default=sa.false()))
+        batch_op.create_index("ix_request_logs_cache_key", ["cache_key"])
+
+    op.create_table(
+        "daily_usage",
+        sa.Column("license_id", sa.Integer(), sa.ForeignKey("licenses.id"), primary_key=True),
+        sa.Column("day", sa.Date(), primary_key=True),
+        sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.create_table(
+        "search_jobs",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("license_id", sa.Integer(), sa.ForeignKey("licenses.id")),
+        sa.Column("request_id", sa.Integer(), sa.ForeignKey("request_logs.id")),
+        sa.Column("query", sa.String(500)),
+        sa.Column("city", sa.String(200)),
+        sa.Column("result_limit", sa.Integer()),
+        sa.Column("details_mode", sa.String(20)),
+        sa.Column("status", sa.String(20)),
+        sa.Column("progress", sa.Integer()),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime()),
+        sa.Column("started_at", sa.DateTime()),
+        sa.Column("finished_at", sa.DateTime()),
+    )
+    op.create_index("ix_search_jobs_id", "search_jobs", ["id"])
+    op.create_index("ix_search_jobs_status", "search_jobs", ["status"])
+
+    op.create_table(
+        "organization_details",
+        sa.Column("organization_id", sa.String(100), primary_key=True),
+        sa.Column("phones", sa.Text()),
+        sa.Column("website", sa.String(500)),
+        sa.Column("schedule", sa.Text()),
+        sa.Column("latitude", sa.String(50)),
+        sa.Column("longitude", sa.String(50)),
+        sa.Column("fetched_at", sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table("organization_details")
+    op.drop_table("search_jobs")
+    op.drop_table("daily_usage")
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.drop_index("ix_request_logs_cache_key")
+        batch_op.drop_column("from_cache")
+        batch_op.drop_column("cache_key")
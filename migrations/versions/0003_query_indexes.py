@@ -0,0 +1,26 @@
+"""Индексы для квот и выборки результатов
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_request_logs_license_requested", "request_logs", ["license_id", "requested_at"])
+    op.create_index("ix_parsed_data_request_id", "parsed_data", ["request_id"])
+    op.create_index("ix_parsed_data_organization_id", "parsed_data", ["organization_id"])
+
+
+def downgrade():
+    op.drop_index("ix_parsed_data_organization_id", table_name="parsed_data")
+    op.drop_index("ix_parsed_data_request_id", table_name="parsed_data")
+    op.drop_index("ix_request_logs_license_requested", table_name="request_logs")
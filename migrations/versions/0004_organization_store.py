@@ -0,0 +1,79 @@
+"""Общее хранилище организаций и связи запрос - организация
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "organizations",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("organization_id", sa.String(100), nullable=False),
+        sa.Column("name", sa.String(500)),
+        sa.Column("categories", sa.Text()),
+        sa.Column("address", sa.Text()),
+        sa.Column("phones", sa.Text()),
+        sa.Column("website", sa.String(500)),
+        sa.Column("rating", sa.String(50)),
+        sa.Column("reviews_count", sa.Integer()),
+        sa.Column("schedule", sa.Text()),
+        sa.Column("latitude", sa.String(50)),
+        sa.Column("longitude", sa.String(50)),
+        sa.Column("attributes", sa.Text()),
+        sa.Column("social_networks", sa.Text()),
+        sa.Column("content_hash", sa.String(40)),
+        sa.Column("first_seen_at", sa.DateTime()),
+        sa.Column("updated_at", sa.DateTime()),
+    )
+    op.create_index("ix_organizations_organization_id", "organizations", ["organization_id"], unique=True)
+
+    op.create_table(
+        "request_organizations",
+        sa.Column("request_id", sa.Integer(), sa.ForeignKey("request_logs.id"), primary_key=True),
+        sa.Column("position", sa.Integer(), primary_key=True),
+        sa.Column("organization_pk", sa.Integer(), sa.ForeignKey("organizations.id"), nullable=False),
+    )
+    op.create_index("ix_request_organizations_organization_pk", "request_organizations", ["organization_pk"])
+
+    # Перенос накопленных данных: последняя версия каждой организации
+    # и связи для всех старых запросов. Строки без идентификатора
+    # получают собственный ключ, хэш пересчитается при следующей записи.
+    op.execute("""
+        INSERT INTO organizations (
+            organization_id, name, categories, address, phones, website, rating,
+            reviews_count, schedule, latitude, longitude, attributes, social_networks,
+            first_seen_at, updated_at
+        )
+        SELECT
+            COALESCE(p.organization_id, 'legacy:' || p.id), p.name, p.categories, p.address,
+            p.phones, p.website, p.rating, p.reviews_count, p.schedule, p.latitude,
+            p.longitude, p.attributes, p.social_networks, p.created_at, p.created_at
+        FROM parsed_data p
+        WHERE p.id IN (
+            SELECT MAX(id) FROM parsed_data
+            GROUP BY COALESCE(organization_id, 'legacy:' || id)
+        )
+    """)
+    op.execute("""
+        INSERT INTO request_organizations (request_id, position, organization_pk)
+        SELECT p.request_id, p.id, o.id
+        FROM parsed_data p
+        JOIN organizations o ON o.organization_id = COALESCE(p.organization_id, 'legacy:' || p.id)
+        WHERE p.request_id IS NOT NULL
+    """)
+
+
+def downgrade():
+    op.drop_table("request_organizations")
+    op.drop_table("organizations")
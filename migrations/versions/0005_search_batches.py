@@ -0,0 +1,40 @@
+"""Пакетные поиски
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "search_batches",
+        sa.Column("id", sa.String(36), primary_key=True),
+        sa.Column("license_id", sa.Integer(), sa.ForeignKey("licenses.id")),
+        sa.Column("details_mode", sa.String(20)),
+        sa.Column("items_count", sa.Integer()),
+        sa.Column("created_at", sa.DateTime()),
+    )
+    op.create_index("ix_search_batches_license_id", "search_batches", ["license_id"])
+
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.add_column(sa.Column("batch_id", sa.String(36), sa.ForeignKey("search_batches.id", name="fk_request_logs_batch_id")))
+        batch_op.create_index("ix_request_logs_batch_id", ["batch_id"])
+
+
+def downgrade():
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.drop_index("ix_request_logs_batch_id")
+        batch_op.drop_column("batch_id")
+
+    op.drop_index("ix_search_batches_license_id", table_name="search_batches")
+    op.drop_table("search_batches")
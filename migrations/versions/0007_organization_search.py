@@ -0,0 +1,118 @@
+"""Полнотекстовый индекс и фасеты организаций
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+organizations_fts (FTS5, внешнее содержимое) и organization_facets
+поддерживаются триггерами на organizations и request_organizations.
+Пересоздание этих таблиц через batch_alter_table удаляет триггеры,
+такие миграции должны создавать их заново.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+# Рейтинг вида «4,8» или «4.8»; пустые и нечисловые значения - NULL
+RATING = """CASE WHEN REPLACE(TRIM({0}), ',', '.') GLOB '[0-9]*'
+    THEN CAST(REPLACE(TRIM({0}), ',', '.') AS REAL) END"""
+
+# Город из ключа кэша запроса «запрос|город|лимит»
+CITY = "substr(substr({0}, instr({0}, '|') + 1), 1, instr(substr({0}, instr({0}, '|') + 1), '|') - 1)"
+
+TRIGGERS = {
+    "organizations_search_ai": f"""
+        CREATE TRIGGER organizations_search_ai AFTER INSERT ON organizations BEGIN
+            INSERT INTO organizations_fts(rowid, name, categories, address)
+            VALUES (new.id, new.name, new.categories, new.address);
+            INSERT INTO organization_facets(organization_pk, rating, reviews_count)
+            VALUES (new.id, {RATING.format('new.rating')}, new.reviews_count);
+        END
+    """,
+    "organizations_search_au": f"""
+        CREATE TRIGGER organizations_search_au AFTER UPDATE OF name, categories, address, rating, reviews_count
+        ON organizations BEGIN
+            INSERT INTO organizations_fts(organizations_fts, rowid, name, categories, address)
+            VALUES ('delete', old.id, old.name, old.categories, old.address);
+            INSERT INTO organizations_fts(rowid, name, categories, address)
+            VALUES (new.id, new.name, new.categories, new.address);
+            UPDATE organization_facets
+            SET rating = {RATING.format('new.rating')}, reviews_count = new.reviews_count
+            WHERE organization_pk = new.id;
+        END
+    """,
+    "organizations_search_ad": """
+        CREATE TRIGGER organizations_search_ad AFTER DELETE ON organizations BEGIN
+            INSERT INTO organizations_fts(organizations_fts, rowid, name, categories, address)
+            VALUES ('delete', old.id, old.name, old.categories, old.address);
+            DELETE FROM organization_facets WHERE organization_pk = old.id;
+        END
+    """,
+    "request_organizations_city_ai": f"""
+        CREATE TRIGGER request_organizations_city_ai AFTER INSERT ON request_organizations BEGIN
+            UPDATE organization_facets
+            SET city = (SELECT {CITY.format('cache_key')} FROM request_logs WHERE id = new.request_id)
+            WHERE organization_pk = new.organization_pk
+              AND (SELECT {CITY.format('cache_key')} FROM request_logs WHERE id = new.request_id) != '';
+        END
+    """,
+}
+
+
+def upgrade():
+    op.create_table(
+        "organization_facets",
+        sa.Column("organization_pk", sa.Integer(), sa.ForeignKey("organizations.id"), primary_key=True),
+        sa.Column("rating", sa.Float()),
+        sa.Column("reviews_count", sa.Integer()),
+        sa.Column("city", sa.String(100)),
+    )
+    op.create_index("ix_organization_facets_rating", "organization_facets", ["rating"])
+    op.create_index("ix_organization_facets_reviews_count", "organization_facets", ["reviews_count"])
+    op.create_index("ix_organization_facets_city", "organization_facets", ["city"])
+
+    if op.get_bind().dialect.name != "sqlite":
+        # Локальный поиск работает только на SQLite с FTS5
+        return
+
+    op.execute("""
+        CREATE VIRTUAL TABLE organizations_fts USING fts5(
+            name, categories, address,
+            content='organizations', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    for sql in TRIGGERS.values():
+        op.execute(sql)
+
+    # Индексация накопленных организаций
+    op.execute("INSERT INTO organizations_fts(organizations_fts) VALUES ('rebuild')")
+    op.execute(f"""
+        INSERT INTO organization_facets (organization_pk, rating, reviews_count, city)
+        SELECT o.id, {RATING.format('o.rating')}, o.reviews_count, (
+            SELECT {CITY.format('r.cache_key')}
+            FROM request_organizations ro
+            JOIN request_logs r ON r.id = ro.request_id
+            WHERE ro.organization_pk = o.id AND {CITY.format('r.cache_key')} != ''
+            ORDER BY r.id DESC
+            LIMIT 1
+        )
+        FROM organizations o
+    """)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "sqlite":
+        for name in TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+        op.execute("DROP TABLE IF EXISTS organizations_fts")
+
+    op.drop_index("ix_organization_facets_city", table_name="organization_facets")
+    op.drop_index("ix_organization_facets_reviews_count", table_name="organization_facets")
+    op.drop_index("ix_organization_facets_rating", table_name="organization_facets")
+    op.drop_table("organization_facets")
@@ -0,0 +1,45 @@
+"""Поиск в режиме delta
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Только add_column: batch-режим не пересоздает таблицы, триггеры 0007 сохраняются
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.add_column(sa.Column("diff", sa.Text()))
+
+    with op.batch_alter_table("search_jobs") as batch_op:
+        batch_op.add_column(sa.Column("delta", sa.Boolean(), server_default=sa.false()))
+
+
+def downgrade():
+    # drop_column пересоздает request_logs, а SQLite не переименовывает таблицу,
+    # пока на нее ссылается триггер из 0007: триггеры снимаются на время операции
+    triggers = []
+    if op.get_bind().dialect.name == "sqlite":
+        triggers = op.get_bind().execute(sa.text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%request_logs%'"
+        )).all()
+    for name, _ in triggers:
+        op.execute(f"DROP TRIGGER {name}")
+
+    with op.batch_alter_table("search_jobs") as batch_op:
+        batch_op.drop_column("delta")
+
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.drop_column("diff")
+
+    for _, sql in triggers:
+        op.execute(sql)
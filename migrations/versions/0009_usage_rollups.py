@@ -0,0 +1,64 @@
+"""Агрегаты использования лицензий
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+# Начало часа и суток в формате, в котором SQLAlchemy хранит DateTime в SQLite
+BUCKETS = {
+    "hour": "strftime('%Y-%m-%d %H:00:00.000000', {0})",
+    "day": "strftime('%Y-%m-%d 00:00:00.000000', {0})",
+}
+
+
+def upgrade():
+    op.create_table(
+        "usage_rollups",
+        sa.Column("license_id", sa.Integer(), sa.ForeignKey("licenses.id"), primary_key=True),
+        sa.Column("period", sa.String(4), primary_key=True),
+        sa.Column("bucket", sa.DateTime(), primary_key=True),
+        sa.Column("requests", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("results", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("errors", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.create_index("ix_usage_rollups_period_bucket", "usage_rollups", ["period", "bucket"])
+
+    if op.get_bind().dialect.name != "sqlite":
+        return
+
+    # Однократный перенос истории: запросы и результаты из журнала,
+    # ошибки - по задачам, завершившимся со статусом failed, в час или сутки
+    # их запроса: строки агрегатов есть только для часов и суток журнала
+    for period, bucket in BUCKETS.items():
+        op.execute(f"""
+            INSERT INTO usage_rollups (license_id, period, bucket, requests, results, errors)
+            SELECT license_id, '{period}', {bucket.format('requested_at')},
+                   COUNT(*), COALESCE(SUM(results_count), 0), 0
+            FROM request_logs
+            WHERE license_id IS NOT NULL AND requested_at IS NOT NULL
+            GROUP BY license_id, {bucket.format('requested_at')}
+        """)
+        op.execute(f"""
+            UPDATE usage_rollups SET errors = (
+                SELECT COUNT(*) FROM search_jobs j
+                JOIN request_logs r ON r.id = j.request_id
+                WHERE r.license_id = usage_rollups.license_id AND j.status = 'failed'
+                  AND {bucket.format('r.requested_at')} = usage_rollups.bucket
+            )
+            WHERE period = '{period}'
+        """)
+
+
+def downgrade():
+    op.drop_index("ix_usage_rollups_period_bucket", table_name="usage_rollups")
+    op.drop_table("usage_rollups")
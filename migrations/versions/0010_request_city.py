@@ -0,0 +1,95 @@
+"""Город запроса в отдельном столбце
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+
+Фасет города заполнялся разбором cache_key по «|», а запрос может
+сам содержать «|». Теперь триггер берет город из request_logs.city.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+TRIGGER = """
+    CREATE TRIGGER request_organizations_city_ai AFTER INSERT ON request_organizations BEGIN
+        UPDATE organization_facets
+        SET city = (SELECT city FROM request_logs WHERE id = new.request_id)
+        WHERE organization_pk = new.organization_pk
+          AND (SELECT city FROM request_logs WHERE id = new.request_id) != '';
+    END
+"""
+
+# Триггер из 0007 для отката
+CITY = "substr(substr({0}, instr({0}, '|') + 1), 1, instr(substr({0}, instr({0}, '|') + 1), '|') - 1)"
+OLD_TRIGGER = f"""
+    CREATE TRIGGER request_organizations_city_ai AFTER INSERT ON request_organizations BEGIN
+        UPDATE organization_facets
+        SET city = (SELECT {CITY.format('cache_key')} FROM request_logs WHERE id = new.request_id)
+        WHERE organization_pk = new.organization_pk
+          AND (SELECT {CITY.format('cache_key')} FROM request_logs WHERE id = new.request_id) != '';
+    END
+"""
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    # Только add_column: таблица не пересоздается, триггеры 0007 сохраняются
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.add_column(sa.Column("city", sa.String(200)))
+
+    # Ключ «запрос|город|лимит»: лимит без «|», поэтому город - предпоследняя
+    # часть при разборе справа, даже если «|» есть в запросе
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, cache_key FROM request_logs WHERE cache_key IS NOT NULL")).all()
+    update = sa.text("UPDATE request_logs SET city = :city WHERE id = :id")
+    for start in range(0, len(rows), BATCH_SIZE):
+        params = []
+        for request_id, cache_key in rows[start:start + BATCH_SIZE]:
+            parts = cache_key.rsplit("|", 2)
+            params.append({"id": request_id, "city": parts[1] if len(parts) == 3 else ""})
+        bind.execute(update, params)
+
+    if bind.dialect.name != "sqlite":
+        return
+
+    op.execute("DROP TRIGGER IF EXISTS request_organizations_city_ai")
+    op.execute(TRIGGER)
+    # Пересчет фасета, заполненного по старому разбору
+    op.execute("""
+        UPDATE organization_facets SET city = (
+            SELECT r.city
+            FROM request_organizations ro
+            JOIN request_logs r ON r.id = ro.request_id
+            WHERE ro.organization_pk = organization_facets.organization_pk AND r.city != ''
+            ORDER BY r.id DESC
+            LIMIT 1
+        )
+    """)
+
+
+def downgrade():
+    triggers = []
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute("DROP TRIGGER IF EXISTS request_organizations_city_ai")
+        # drop_column пересоздает request_logs, а SQLite не переименовывает таблицу,
+        # пока на нее ссылается триггер: остальные такие триггеры снимаются на время операции
+        triggers = op.get_bind().execute(sa.text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%request_logs%'"
+        )).all()
+    for name, _ in triggers:
+        op.execute(f"DROP TRIGGER {name}")
+
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.drop_column("city")
+
+    for _, sql in triggers:
+        op.execute(sql)
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(OLD_TRIGGER)
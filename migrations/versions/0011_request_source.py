@@ -0,0 +1,38 @@
+"""Источник ответа на запрос
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Только add_column: таблица не пересоздается, триггеры на request_logs сохраняются
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.add_column(sa.Column("source", sa.String(10), nullable=False, server_default="live"))
+
+
+def downgrade():
+    # drop_column пересоздает request_logs: ссылающиеся на нее триггеры снимаются на время операции
+    triggers = []
+    if op.get_bind().dialect.name == "sqlite":
+        triggers = op.get_bind().execute(sa.text(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND sql LIKE '%request_logs%'"
+        )).all()
+    for name, _ in triggers:
+        op.execute(f"DROP TRIGGER {name}")
+
+    with op.batch_alter_table("request_logs") as batch_op:
+        batch_op.drop_column("source")
+
+    for _, sql in triggers:
+        op.execute(sql)
@@ -0,0 +1,24 @@
+"""Индекс задач по запросу
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-17
+
+Кэш и режим delta отбрасывают запросы неудачных задач через
+NOT EXISTS по search_jobs.request_id.
+"""
+from alembic import op
+
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_search_jobs_request_id", "search_jobs", ["request_id"])
+
+
+def downgrade():
+    op.drop_index("ix_search_jobs_request_id", table_name="search_jobs")
@@ -0,0 +1,125 @@
+from typing import Callable, Dict, Iterator, List, Optional
+
+from metrics import PARSER_SCROLLS
+
+# Атрибут, которым помечаются уже разобранные карточки
+SEEN_ATTR = "data-ymp-seen"
+# Блок «Добавить организацию», который Яндекс показывает в конце выдачи
+END_OF_LIST = "[class*='add-business-view']"
+
+# Сколько ждать подгрузки новых карточек после прокрутки
+SCROLL_TIMEOUT = 3
+# Сколько прокруток подряд без новых карточек считается остановкой выдачи
+STALL_ROUNDS = 2
+
+# Прокрутка ближайшего прокручиваемого предка карточек: у панели
+# результатов своя полоса прокрутки, прокрутка window ее не двигает
+SCROLL_LIST_JS = """
+const [selector, endSelector, nudge] = arguments;
+let box = window.__ympListBox;
+if (!box || !box.isConnected) {
+    const first = document.querySelector(selector);
+    box = first ? first.parentElement : null;
+    while (box && box !== document.body) {
+        const style = getComputedStyle(box);
+        if (/(auto|scroll)/.test(style.overflowY) && box.scrollHeight > box.clientHeight) break;
+        box = box.parentElement;
+    }
+    if (!box || box === document.body) box = document.scrollingElement || document.documentElement;
+    window.__ympListBox = box;
+}
+if (nudge) {
+    box.scrollTop = Math.max(box.scrollTop - box.clientHeight, 0);
+} else {
+    box.scrollTop = box.scrollHeight;
+}
+box.dispatchEvent(new Event('scroll'));
+return {height: box.scrollHeight, end: !!document.querySelector(endSelector)};
+"""
+
+# Появились ли неразобранные карточки или выросла высота списка
+LIST_PROGRESS_JS = """
+const [selector, height] = arguments;
+const box = window.__ympListBox || document.scrollingElement;
+return document.querySelector(selector) !== null || (box && box.scrollHeight > height);
+"""
+
+
+def unseen(selector: str) -> str:
+    """Селектор карточек, которые еще не разбирались"""
+    return f"{selector}:not([{SEEN_ATTR}])"
+
+
+class ScrollPaginator:
+    """Пошаговая подгрузка выдачи прокруткой списка результатов
+
+    extract возвращает записи карточек, появившихся с прошлого вызова
+    (разобранные карточки помечаются атрибутом SEEN_ATTR, поэтому
+    повторно не просматриваются). Прокручивается сам контейнер списка,
+    после прокрутки ожидаются новые карточки или рост высоты списка.
+    Если прогресса нет, список сдвигается вверх и снова вниз, а после
+    STALL_ROUNDS неудачных попыток подгрузка прекращается. Причина
+    остановки сохраняется в stop_reason: end_of_list или stalled.
+    """
+
+    def __init__(self, driver, waiter, selector: str, extract: Callable[[], List[Dict]],
+                 scroll_timeout: float = SCROLL_TIMEOUT, stall_rounds: int = STALL_ROUNDS):
+        self.driver = driver
+        self.waiter = waiter
+        self.selector = selector
+        self.extract = extract
+        self.scroll_timeout = scroll_timeout
+        self.stall_rounds = stall_rounds
+        self.stop_reason: Optional[str] = None
+        self.scrolls = 0
+
+    def scroll(self, nudge: bool = False) -> Dict:
+        self.scrolls += 1
+        PARSER_SCROLLS.inc()
+        return self.driver.execute_script(SCROLL_LIST_JS, self.selector, END_OF_LIST, nudge)
+
+    def advance(self, nudge: bool = False) -> Optional[bool]:
+        """Прокрутка и ожидание новых карточек
+
+        Возвращает True при появлении новых карточек, False, если их нет,
+        и None, если достигнут конец выдачи.
+        """
+        if nudge:
+            self.scroll(nudge=True)
+            self.waiter.pause(0.2)
+        state = self.scroll()
+        progressed = self.waiter.until(
+            lambda driver: driver.execute_script(LIST_PROGRESS_JS, unseen(self.selector), state["height"]),
+            timeout=self.scroll_timeout,
+            kind="scroll"
+        )
+        if progressed:
+            return True
+        if state["end"]:
+            return None
+        return False
+
+    def batches(self) -> Iterator[List[Dict]]:
+        """Порции записей новых карточек до конца или остановки выдачи"""
+        self.stop_reason = None
+        stalls = 0
+        while True:
+            records = self.extract()
+            if records:
+                yield records
+            progress = self.advance(nudge=stalls > 0)
+            if progress:
+                stalls = 0
+                continue
+            if progress is None:
+                self.stop_reason = "end_of_list"
+            else:
+                stalls += 1
+                if stalls < self.stall_rounds:
+                    continue
+                self.stop_reason = "stalled"
+            # Записи, которые extract мог получить позже самих карточек
+            records = self.extract()
+            if records:
+                yield records
+            return
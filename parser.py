@@ -1,21 +1,137 @@
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.chrome.options import Options
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 import time
 import json
 import re
-from typing import List, Dict
+import threading
+from typing import List, Dict, Callable, Optional, Tuple
 import logging
 
+from waits import AdaptiveWaiter
+from pagination import ScrollPaginator, SEEN_ATTR, unseen
+from yandex_api import SearchResponseCapture
+from browser_profile import apply_light_options, blocked_urls, block_resources
+from politeness import politeness, CaptchaDetected
+from config import settings
+from metrics import (
+    PARSER_OPERATION_SECONDS, PARSER_NAVIGATION_SECONDS, PARSER_EXTRACT_SECONDS,
+    PARSER_ELEMENT_PARSE_SECONDS, PARSER_RECORDS, PARSER_STOPS, PARSER_FAILURES,
+    WEBDRIVER_COMMAND_SECONDS, WEBDRIVER_ERRORS, registry,
+)
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+SEARCH_INPUT = (By.CSS_SELECTOR, "input[placeholder*='поиск']")
+SEARCH_BUTTON = (By.CSS_SELECTOR, "button[type='submit']")
+SEARCH_LIST = (By.CSS_SELECTOR, "[class*='search-list-view']")
+SNIPPET = (By.CSS_SELECTOR, "[class*='search-snippet-view']")
+
+# Извлечение полей новых карточек за один вызов, те же селекторы,
+# что и в parse_organization_element. Разобранные карточки помечаются
+EXTRACT_SNIPPETS_JS = """
+const [selector, seenAttr] = arguments;
+const nodes = document.querySelectorAll(selector);
+const text = (el, selector) => {
+    const node = el.querySelector(selector);
+    return node ? node.innerText.trim() : "";
+};
+const items = [];
+for (const el of nodes) {
+    el.setAttribute(seenAttr, "1");
+    const link = el.querySelector("a");
+    const match = link && link.href ? link.href.match(/org\\/(\\d+)/) : null;
+    items.push({
+        id: match ? match[1] : null,
+        name: text(el, "[class*='orgpage-header-title']") || text(el, "h1, h2, h3"),
+        categories: text(el, "[class*='business-categories']"),
+        rating: text(el, "[class*='business-rating-badge']"),
+        reviews_count: text(el, "[class*='business-review-count']") || "0",
+        address: text(el, "[class*='business-address']"),
+        phones: text(el, "[class*='business-phone']")
+    });
+}
+return items;
+"""
+
+MARK_SEEN_JS = """
+for (const el of arguments[0]) el.setAttribute(arguments[1], "1");
+"""
+
+MARK_ALL_SEEN_JS = """
+for (const el of document.querySelectorAll(arguments[0])) el.setAttribute(arguments[1], "1");
+"""
+
+# Сколько ждать первого ответа поиска перед переходом на разбор DOM
+API_CAPTURE_TIMEOUT = 2
+
+# Признаки капчи и страниц ошибок, проверяются, только если страница не загрузилась
+BLOCK_CHECK_JS = """
+return [
+    location.href,
+    document.title,
+    !!document.querySelector("form[action*='checkcaptcha'], [class*='CheckboxCaptcha'], [class*='AdvancedCaptcha']")
+];
+"""
+# Заголовок целиком - код или причина ошибки: на странице организации
+# заголовок - ее название, и «Автосервис 505» не должен блокировать хост
+ERROR_TITLE = re.compile(
+    r'^\s*(?:(?:HTTP\s+)?(?:error|ошибка)\s+)?(?:429|5\d\d)\s*$'
+    r'|^\s*(?:(?:429|5\d\d)\s*[-:.]?\s*)?'
+    r'(?:Too Many Requests|Internal Server Error|Bad Gateway|Service (?:Temporarily )?Unavailable|Gateway Time-?out)\s*$',
+    re.IGNORECASE
+)
+
+# Путь к chromedriver определяется один раз на процесс
+driver_stats = {"path": None, "resolve_seconds": None}
+_driver_lock = threading.Lock()
+
+def chromedriver_path() -> str:
+    """Путь к chromedriver: из CHROMEDRIVER_PATH или через webdriver-manager
+
+    ChromeDriverManager().install() каждый раз сверяет версии и файлы,
+    поэтому результат кэшируется для всех последующих драйверов.
+    """
+    with _driver_lock:
+        if driver_stats["path"] is None:
+            started = time.monotonic()
+            driver_stats["path"] = settings.CHROMEDRIVER_PATH or ChromeDriverManager().install()
+            driver_stats["resolve_seconds"] = round(time.monotonic() - started, 3)
+        return driver_stats["path"]
+
+def instrument_driver(driver):
+    """Учет времени и ошибок каждой команды, отправленной драйверу"""
+    if not registry.enabled:
+        return
+    executor = driver.command_executor
+    original = executor.execute
+
+    def execute(command, params):
+        with WEBDRIVER_COMMAND_SECONDS.time(command=command):
+            try:
+                return original(command, params)
+            except Exception:
+                WEBDRIVER_ERRORS.inc(command=command)
+                raise
+
+    executor.execute = execute
+
 class YandexMapsParser:
-    def __init__(self, headless: bool = True):
+    def __init__(self, headless: bool = True, bulk_extract: bool = True, extract_mode: str = None,
+                 light_profile: bool = None):
+        self.driver = None
+        self.bulk_extract = bulk_extract
+        self.extract_mode = extract_mode or settings.PARSER_EXTRACT_MODE
+        self.light_profile = settings.PARSER_LIGHT_PROFILE if light_profile is None else light_profile
+        self.pages_loaded = 0
+        self.last_error = None
+        self.last_stop_reason = None
+        self.last_extract_mode = None
+        self.parked = False
+        self.timings = {}
         self.setup_driver(headless)
         
     def setup_driver(self, headless: bool = True):
@@ -28,71 +144,226 @@ class YandexMapsParser:
         chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
         chrome_options.add_experimental_option('useAutomationExtension', False)
         chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36")
+        if self.extract_mode == "api":
+            # Performance-лог нужен для перехвата ответов поиска
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        if self.light_profile:
+            apply_light_options(chrome_options)
         
-        service = Service(ChromeDriverManager().install())
+        started = time.monotonic()
+        service = Service(chromedriver_path())
         self.driver = webdriver.Chrome(service=service, options=chrome_options)
+        instrument_driver(self.driver)
         self.driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        if self.light_profile:
+            block_resources(self.driver, blocked_urls())
+        self.waiter = AdaptiveWaiter(self.driver)
+        self.capture = SearchResponseCapture(self.driver)
+        self.timings["launch"] = round(time.monotonic() - started, 3)
         
-    def search_organizations(self, query: str, city: str = "", limit: int = 50) -> List[Dict]:
-        """Поиск организаций по запросу"""
-        try:
-            url = f"https://yandex.ru/maps/"
+    def park(self) -> bool:
+        """Заблаговременное открытие карт, чтобы поиск начался без загрузки страницы"""
+        started = time.monotonic()
+        self.open_page(settings.YANDEX_MAPS_URL)
+        self.parked = self.waiter.for_element(SEARCH_INPUT) is not None
+        self.timings["park"] = round(time.monotonic() - started, 3)
+        return self.parked
+        
+    def open_page(self, url: str):
+        """Переход на страницу с учетом общего лимита частоты и счетчика загрузок"""
+        politeness.acquire(url)
+        with PARSER_NAVIGATION_SECONDS.time():
             self.driver.get(url)
-            time.sleep(2)
+        self.pages_loaded += 1
+        
+    def check_blocked(self):
+        """Проверка страницы на капчу или ошибку хоста
+
+        При блокировке хост приостанавливается для всех драйверов,
+        а поднимается CaptchaDetected.
+        """
+        try:
+            url, title, captcha = self.driver.execute_script(BLOCK_CHECK_JS)
+        except Exception:
+            return
+        if captcha or "showcaptcha" in url:
+            politeness.penalize(url, "captcha")
+            raise CaptchaDetected(f"Капча на {url}")
+        if ERROR_TITLE.search(title or ""):
+            politeness.penalize(url, "error")
+            raise CaptchaDetected(f"Страница ошибки на {url}: {title}")
+        
+    def is_alive(self) -> bool:
+        """Проверка, что сессия браузера еще отвечает"""
+        if not self.driver:
+            return False
+        try:
+            self.driver.current_url
+            return True
+        except Exception:
+            return False
+        
+    def search_organizations(self, query: str, city: str = "", limit: int = 50,
+                             on_result: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
+        """Поиск организаций по запросу
+
+        on_result вызывается для каждой новой организации сразу после
+        ее разбора, что позволяет сохранять частичные результаты.
+        Выдача подгружается, пока не набрано limit уникальных организаций
+        (не более settings.MAX_RESULTS); причина остановки сохраняется
+        в last_stop_reason: limit, end_of_list, stalled или error.
+        В режиме api организации берутся из JSON-ответов поиска, а если
+        перехват не удался - из DOM; фактический путь в last_extract_mode.
+        """
+        self.last_error = None
+        self.last_stop_reason = None
+        self.waiter.reset()
+        started = time.monotonic()
+        try:
+            # Заранее открытая страница карт используется без перезагрузки
+            search_box = self.waiter.for_element(SEARCH_INPUT, timeout=1) if self.parked else None
+            self.parked = False
+            if search_box is None:
+                self.open_page(settings.YANDEX_MAPS_URL)
+                search_box = self.waiter.for_element(SEARCH_INPUT)
             
             # Ввод поискового запроса
-            search_box = WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "input[placeholder*='поиск']"))
-            )
+            if search_box is None:
+                self.check_blocked()
+                raise TimeoutError("Поле поиска не найдено")
             search_query = f"{query} {city}".strip()
             search_box.clear()
             search_box.send_keys(search_query)
             
-            # Нажатие кнопки поиска
-            search_button = self.driver.find_element(By.CSS_SELECTOR, "button[type='submit']")
+            mode = self.extract_mode
+            if mode == "api":
+                try:
+                    self.capture.reset()
+                except Exception as e:
+                    logger.warning(f"Перехват ответов поиска недоступен: {e}")
+                    mode = "dom"
+            
+            # Нажатие кнопки поиска; запрос выдачи ограничивается как переход
+            search_button = self.driver.find_element(*SEARCH_BUTTON)
+            politeness.acquire(settings.YANDEX_MAPS_URL)
             search_button.click()
-            time.sleep(3)
             
             # Ожидание загрузки результатов
-            WebDriverWait(self.driver, 10).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, "[class*='search-list-view']"))
-            )
+            if self.waiter.for_element(SEARCH_LIST) is None:
+                self.check_blocked()
+                raise TimeoutError("Список результатов не загрузился")
+            politeness.success(settings.YANDEX_MAPS_URL)
+            self.waiter.for_element(SNIPPET, timeout=5)
             
             organizations = []
             processed_ids = set()
+            limit = min(limit, settings.MAX_RESULTS)
+            state = {"bulk": self.bulk_extract, "mode": mode}
+            
+            def extract() -> List[Dict]:
+                # Новые карточки, появившиеся после прошлой прокрутки
+                if state["mode"] == "api":
+                    with PARSER_EXTRACT_SECONDS.time(mode="api"):
+                        records = self.extract_captured()
+                    if records is not None:
+                        PARSER_RECORDS.inc(len(records), mode="api")
+                        return records
+                    logger.warning("Ответы поиска не перехвачены, переходим на разбор DOM")
+                    state["mode"] = "dom"
+                if state["bulk"]:
+                    try:
+                        with PARSER_EXTRACT_SECONDS.time(mode="bulk"):
+                            records = self.extract_snippets()
+                        PARSER_RECORDS.inc(len(records), mode="bulk")
+                        return records
+                    except Exception as e:
+                        logger.warning(f"Пакетное извлечение недоступно, переходим на поэлементный разбор: {e}")
+                        state["bulk"] = False
+                with PARSER_EXTRACT_SECONDS.time(mode="elements"):
+                    records = self.parse_snippet_elements()
+                PARSER_RECORDS.inc(len(records), mode="elements")
+                return records
+            
+            paginator = ScrollPaginator(self.driver, self.waiter, SNIPPET[1], extract)
             
             # Парсинг результатов
-            for i in range(min(limit, 100)):
-                try:
-                    # Прокрутка для загрузки новых элементов
-                    if i % 10 == 0:
-                        self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                        time.sleep(1)
-                    
-                    # Поиск элементов организаций
-                    org_elements = self.driver.find_elements(By.CSS_SELECTOR, "[class*='search-snippet-view']")
-                    
-                    if i >= len(org_elements):
-                        break
-                    
-                    org_element = org_elements[i]
-                    org_data = self.parse_organization_element(org_element)
-                    
+            for records in paginator.batches():
+                for org_data in records:
                     if org_data and org_data['id'] not in processed_ids:
                         organizations.append(org_data)
                         processed_ids.add(org_data['id'])
-                        
-                    time.sleep(0.5)
-                    
-                except Exception as e:
-                    logger.warning(f"Ошибка при парсинге элемента {i}: {e}")
-                    continue
-                    
+                        if on_result:
+                            on_result(org_data)
+                        if len(organizations) >= limit:
+                            break
+                if len(organizations) >= limit:
+                    break
+            
+            self.last_stop_reason = "limit" if len(organizations) >= limit else paginator.stop_reason
+            self.last_extract_mode = state["mode"]
+            logger.info(f"Выдача: {len(organizations)} организаций, прокруток {paginator.scrolls}, "
+                        f"источник: {self.last_extract_mode}, остановка: {self.last_stop_reason}")
             return organizations
             
         except Exception as e:
             logger.error(f"Ошибка при поиске организаций: {e}")
+            self.last_error = e
+            self.last_stop_reason = "error"
+            PARSER_FAILURES.inc(operation="search")
             return []
+        finally:
+            PARSER_OPERATION_SECONDS.observe(time.monotonic() - started, operation="search")
+            # None - поиск прерван не через Exception, причины остановки нет
+            if self.last_stop_reason is not None:
+                PARSER_STOPS.inc(reason=self.last_stop_reason)
+            self.log_timing(f"Поиск '{query} {city}'".strip(), started)
+    
+    def log_timing(self, label: str, started: float):
+        """Логирование соотношения времени ожидания и разбора"""
+        total = time.monotonic() - started
+        waited = self.waiter.wait_time
+        logger.info(f"{label}: всего {total:.2f} с, ожидание {waited:.2f} с, разбор {total - waited:.2f} с")
+    
+    def extract_captured(self) -> Optional[List[Dict]]:
+        """Организации из перехваченных ответов поиска
+
+        Карточки на странице помечаются разобранными, чтобы прокрутка
+        видела прогресс. Возвращает None, если перехват не работает:
+        ни одного ответа так и не пришло или лог недоступен.
+        """
+        try:
+            records = self.capture.collect()
+            if not self.capture.responses:
+                # Первый ответ мог еще не дойти до лога
+                def condition(driver):
+                    records.extend(self.capture.collect())
+                    return self.capture.responses
+                self.waiter.until(condition, timeout=API_CAPTURE_TIMEOUT, kind="api_capture")
+        except Exception as e:
+            logger.warning(f"Ошибка перехвата ответов поиска: {e}")
+            return None
+        if not self.capture.responses:
+            return None
+        self.driver.execute_script(MARK_ALL_SEEN_JS, unseen(SNIPPET[1]), SEEN_ATTR)
+        return records
+    
+    def extract_snippets(self) -> List[Dict]:
+        """Извлечение еще не разобранных карточек одним вызовом execute_script"""
+        return self.driver.execute_script(EXTRACT_SNIPPETS_JS, unseen(SNIPPET[1]), SEEN_ATTR)
+    
+    def parse_snippet_elements(self) -> List[Dict]:
+        """Поэлементный разбор карточек через WebDriver (резервный путь)"""
+        org_elements = self.driver.find_elements(By.CSS_SELECTOR, unseen(SNIPPET[1]))
+        records = []
+        for i, element in enumerate(org_elements):
+            try:
+                with PARSER_ELEMENT_PARSE_SECONDS.time():
+                    records.append(self.parse_organization_element(element))
+            except Exception as e:
+                logger.warning(f"Ошибка при парсинге элемента {i}: {e}")
+        if org_elements:
+            self.driver.execute_script(MARK_SEEN_JS, org_elements, SEEN_ATTR)
+        return records
     
     def parse_organization_element(self, element) -> Dict:
         """Парсинг данных организации из элемента"""
@@ -162,21 +433,25 @@ class YandexMapsParser:
     
     def get_organization_details(self, org_id: str) -> Dict:
         """Получение детальной информации об организации"""
+        self.last_error = None
+        self.waiter.reset()
+        started = time.monotonic()
         try:
-            url = f"https://yandex.ru/maps/org/{org_id}/"
-            self.driver.get(url)
-            time.sleep(3)
+            self.parked = False
+            url = f"{settings.YANDEX_MAPS_URL}org/{org_id}/"
+            self.open_page(url)
             
             details = {'id': org_id}
             
             # Название
-            try:
-                name_element = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "h1"))
-                )
-                details['name'] = name_element.text
-            except:
-                details['name'] = ""
+            name_element = self.waiter.for_element((By.CSS_SELECTOR, "h1"))
+            if name_element is None:
+                self.check_blocked()
+            else:
+                politeness.success(url)
+            details['name'] = name_element.text if name_element else ""
+            # Карточка дорисовывается после заголовка
+            self.waiter.for_network_idle(timeout=3)
             
             # Рейтинг и отзывы
             try:
@@ -219,13 +494,36 @@ class YandexMapsParser:
             except:
                 details['schedule'] = ""
             
+            # Координаты
+            details['latitude'], details['longitude'] = self.extract_coordinates()
+            
             return details
             
         except Exception as e:
             logger.error(f"Ошибка при получении деталей организации {org_id}: {e}")
+            self.last_error = e
+            PARSER_FAILURES.inc(operation="details")
             return None
+        finally:
+            PARSER_OPERATION_SECONDS.observe(time.monotonic() - started, operation="details")
+            self.log_timing(f"Организация {org_id}", started)
+    
+    def extract_coordinates(self) -> Tuple[str, str]:
+        """Координаты организации из параметра ll адреса страницы или из карточки"""
+        match = re.search(r'[?&]ll=([\d.]+)(?:%2C|,)([\d.]+)', self.driver.current_url)
+        if match:
+            return match.group(2), match.group(1)
+        try:
+            coords_element = self.driver.find_element(By.CSS_SELECTOR, "[class*='coords-badge']")
+            match = re.search(r'([\d.]+),\s*([\d.]+)', coords_element.text)
+            if match:
+                return match.group(1), match.group(2)
+        except:
+            pass
+        return "", ""
     
     def close(self):
         """Закрытие драйвера"""
         if self.driver:
             self.driver.quit()
+            self.driver = None
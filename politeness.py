@@ -0,0 +1,169 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+from urllib.parse import urlparse
+
+from config import settings
+from metrics import POLITENESS_WAIT_SECONDS, POLITENESS_BACKOFFS
+
+logger = logging.getLogger(__name__)
+
+# Приоритет лицензии, от имени которой работает текущий запрос или задача
+current_priority: ContextVar[int] = ContextVar("current_priority", default=0)
+
+
+class CaptchaDetected(Exception):
+    """Хост ответил капчей или страницей ошибки"""
+
+
+class PolitenessTimeout(TimeoutError):
+    """Разрешение на переход не получено за отведенное время"""
+
+
+class HostBucket:
+    """Token bucket одного хоста и очередь ожидающих переходов"""
+
+    def __init__(self, burst: int):
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.strikes = 0
+        self.waiters = []
+
+
+class PolitenessScheduler:
+    """Общий для всех драйверов ограничитель частоты переходов по хостам
+
+    На каждый хост не более одного перехода в delay секунд с запасом
+    burst. Ожидающие обслуживаются по очереди, причем переход лицензии
+    с приоритетом p встает в очередь так, будто пришел на
+    p * priority_step секунд раньше: старшие тарифы идут первыми, но
+    младшие не ждут бесконечно. После капчи или страницы ошибки хост
+    блокируется на backoff секунд, при повторах пауза удваивается
+    до backoff_max, а успешная загрузка снимает штраф.
+    """
+
+    def __init__(self, delay: float = None, burst: int = None, backoff: float = None,
+                 backoff_max: float = None, priority_step: float = None):
+        self.delay = settings.REQUEST_DELAY if delay is None else delay
+        self.burst = settings.REQUEST_BURST if burst is None else burst
+        self.backoff = settings.CAPTCHA_BACKOFF if backoff is None else backoff
+        self.backoff_max = settings.CAPTCHA_BACKOFF_MAX if backoff_max is None else backoff_max
+        self.priority_step = settings.PRIORITY_STEP if priority_step is None else priority_step
+        self._hosts: Dict[str, HostBucket] = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.stats = {"acquired": 0, "waited": 0, "wait_seconds": 0.0, "captcha": 0, "error": 0}
+
+    @staticmethod
+    def host(url: str) -> str:
+        return urlparse(url).hostname or ""
+
+    def _bucket(self, host: str) -> HostBucket:
+        bucket = self._hosts.get(host)
+        if bucket is None:
+            bucket = self._hosts[host] = HostBucket(self.burst)
+        return bucket
+
+    def _refill(self, bucket: HostBucket, now: float):
+        # Во время блокировки токены не копятся, чтобы после нее не было всплеска
+        since = max(bucket.updated, bucket.blocked_until)
+        if self.delay > 0 and now > since:
+            bucket.tokens = min(self.burst, bucket.tokens + (now - since) / self.delay)
+        bucket.updated = now
+
+    def acquire(self, url: str, timeout: Optional[float] = None) -> float:
+        """Ожидание разрешения на переход по url
+
+        Возвращает время ожидания в секундах. Если разрешение не получено
+        за timeout (по умолчанию PARSER_TIMEOUT), поднимает PolitenessTimeout.
+        """
+        if self.delay <= 0:
+            return 0.0
+        timeout = settings.TIMEOUT if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        entry = (started - current_priority.get() * self.priority_step, next(self._seq))
+
+        with self._cond:
+            bucket = self._bucket(self.host(url))
+            heapq.heappush(bucket.waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(bucket, now)
+                    if bucket.waiters[0] == entry:
+                        if bucket.tokens >= 1 and now >= bucket.blocked_until:
+                            heapq.heappop(bucket.waiters)
+                            bucket.tokens -= 1
+                            break
+                        wait = max(bucket.blocked_until - now, (1 - bucket.tokens) * self.delay)
+                    else:
+                        wait = deadline - now
+                    if now + 1e-3 >= deadline:
+                        raise PolitenessTimeout(f"Нет разрешения на переход за {timeout} с")
+                    self._cond.wait(min(wait, deadline - now))
+            except BaseException:
+                if entry in bucket.waiters:
+                    bucket.waiters.remove(entry)
+                    heapq.heapify(bucket.waiters)
+                raise
+            finally:
+                # Следующий в очереди пересчитывает свое ожидание
+                self._cond.notify_all()
+
+            waited = time.monotonic() - started
+            self.stats["acquired"] += 1
+            if waited > 0.001:
+                self.stats["waited"] += 1
+                self.stats["wait_seconds"] += waited
+        POLITENESS_WAIT_SECONDS.observe(waited)
+        return waited
+
+    def penalize(self, url: str, reason: str = "captcha") -> float:
+        """Блокировка хоста после капчи или страницы ошибки, возвращает паузу"""
+        with self._cond:
+            bucket = self._bucket(self.host(url))
+            bucket.strikes += 1
+            pause = min(self.backoff * 2 ** (bucket.strikes - 1), self.backoff_max)
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + pause)
+            bucket.tokens = 0.0
+            self.stats[reason] = self.stats.get(reason, 0) + 1
+            self._cond.notify_all()
+        POLITENESS_BACKOFFS.inc(reason=reason)
+        logger.warning(f"{self.host(url)}: {reason}, переходы приостановлены на {pause:g} с")
+        return pause
+
+    def success(self, url: str):
+        """Сброс штрафа хоста после нормальной загрузки страницы"""
+        with self._cond:
+            bucket = self._hosts.get(self.host(url))
+            if bucket is not None and bucket.strikes:
+                bucket.strikes = 0
+
+    def status(self) -> Dict:
+        now = time.monotonic()
+        with self._cond:
+            hosts = {}
+            for host, bucket in self._hosts.items():
+                self._refill(bucket, now)
+                hosts[host] = {
+                    "tokens": round(bucket.tokens, 2),
+                    "waiting": len(bucket.waiters),
+                    "blocked_for": round(max(bucket.blocked_until - now, 0.0), 1),
+                    "strikes": bucket.strikes,
+                }
+            return {
+                "delay": self.delay,
+                "burst": self.burst,
+                **self.stats,
+                "wait_seconds": round(self.stats["wait_seconds"], 3),
+                "hosts": hosts,
+            }
+
+
+politeness = PolitenessScheduler()
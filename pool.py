@@ -0,0 +1,261 @@
+import time
+import threading
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional
+
+from parser import YandexMapsParser, driver_stats
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class PoolExhausted(Exception):
+    """Нет свободных парсеров в течение времени ожидания"""
+
+
+class ParserPool:
+    """Ограниченный пул браузеров YandexMapsParser
+
+    Каждый парсер в один момент времени выдается только одному запросу.
+    Драйверы создаются лениво, проверяются при возврате в пул и
+    в фоне пересоздаются после max_pages загрузок страниц или после сбоя.
+    """
+
+    def __init__(self, size: int = None, max_pages: int = None, headless: bool = True):
+        self.size = size or settings.PARSER_POOL_SIZE
+        self.max_pages = max_pages or settings.PARSER_MAX_PAGES
+        self.headless = headless
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        # Выданные и еще не возвращенные парсеры
+        self._busy = 0
+        self._closed = False
+        self.stats = {"created": 0, "recycled": 0, "checkouts": 0}
+        self._recycler = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="recycle")
+        self.startup = {}
+
+    def _create(self, park: bool = True) -> YandexMapsParser:
+        """Запуск драйвера, по умолчанию с уже открытой страницей карт
+
+        Так стартуют драйверы прогрева и замены пересозданных, поэтому
+        поиск на них начинается без загрузки страницы.
+        """
+        parser = YandexMapsParser(headless=self.headless)
+        self.stats["created"] += 1
+        if park:
+            try:
+                parser.park()
+            except Exception as e:
+                logger.warning(f"Не удалось открыть карты на новом драйвере: {e}")
+        return parser
+
+    def _launch(self) -> YandexMapsParser:
+        """Запуск драйвера для запроса на уже зарезервированное место
+
+        Без открытия карт: поиск сам загрузит страницу, а карточке
+        организации она не нужна. При неудаче место освобождается.
+        """
+        try:
+            return self._create(park=False)
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def _destroy(self, parser: YandexMapsParser):
+        try:
+            parser.close()
+        except Exception as e:
+            logger.warning(f"Ошибка при закрытии драйвера: {e}")
+
+    def _replace(self, parser: YandexMapsParser):
+        """Пересоздание драйвера в фоне, вне пути запроса
+
+        Место в пуле остается занятым до появления замены; если запуск
+        не удался, место освобождается и следующий checkout создаст драйвер сам.
+        """
+        self._destroy(parser)
+        replacement = None
+        if not self._closed:
+            try:
+                replacement = self._create()
+            except Exception as e:
+                logger.error(f"Не удалось пересоздать драйвер: {e}")
+        if replacement is not None and self._closed:
+            self._destroy(replacement)
+            replacement = None
+        if replacement is None:
+            with self._lock:
+                self._created -= 1
+            return
+        self._idle.put(replacement)
+
+    def checkout(self, timeout: Optional[float] = None) -> YandexMapsParser:
+        """Получение парсера из пула"""
+        if self._closed:
+            raise PoolExhausted("Пул парсеров закрыт")
+
+        wait = settings.PARSER_CHECKOUT_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + wait
+        while True:
+            try:
+                parser = self._idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            with self._lock:
+                create = self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                parser = self._launch()
+                break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise PoolExhausted("Все парсеры заняты, попробуйте позже")
+            # Ждем короткими отрезками: место может освободиться после неудачной замены
+            try:
+                parser = self._idle.get(timeout=min(remaining, 1.0))
+                break
+            except queue.Empty:
+                continue
+
+        if not parser.is_alive():
+            logger.info("Драйвер не отвечает, пересоздаем")
+            self._destroy(parser)
+            self.stats["recycled"] += 1
+            parser = self._launch()
+
+        self.stats["checkouts"] += 1
+        with self._lock:
+            self._busy += 1
+        return parser
+
+    def checkin(self, parser: YandexMapsParser, failed: bool = False):
+        """Возврат парсера в пул
+
+        Пересоздание уходит в фоновый поток: закрытие и запуск браузера
+        не задерживают ответ на запрос, вернувший драйвер.
+        """
+        with self._lock:
+            self._busy -= 1
+        recycle = (
+            failed
+            or self._closed
+            or parser.last_error is not None
+            or parser.pages_loaded >= self.max_pages
+            or not parser.is_alive()
+        )
+
+        if not recycle:
+            self._idle.put(parser)
+        elif self._closed:
+            self._destroy(parser)
+            with self._lock:
+                self._created -= 1
+        else:
+            self.stats["recycled"] += 1
+            try:
+                self._recycler.submit(self._replace, parser)
+            except RuntimeError:
+                # Пул закрылся между проверкой и отправкой в фон
+                self._destroy(parser)
+                with self._lock:
+                    self._created -= 1
+
+    def prewarm(self, count: int = None) -> dict:
+        """Параллельный запуск count драйверов с уже открытой страницей карт
+
+        Места в пуле резервируются сразу, поэтому запросы, пришедшие во
+        время прогрева, ждут готовые драйверы, а не запускают новые.
+        """
+        count = settings.PARSER_PREWARM if count is None else count
+        with self._lock:
+            count = max(min(count, self.size - self._created), 0)
+            self._created += count
+        if not count:
+            return self.startup
+
+        started = time.monotonic()
+        timings = []
+
+        def warm(_):
+            try:
+                parser = self._create()
+            except Exception as e:
+                logger.error(f"Не удалось запустить драйвер при прогреве: {e}")
+                with self._lock:
+                    self._created -= 1
+                return
+            timings.append(parser.timings)
+            if self._closed:
+                self._destroy(parser)
+                with self._lock:
+                    self._created -= 1
+                return
+            self._idle.put(parser)
+
+        with ThreadPoolExecutor(max_workers=count, thread_name_prefix="prewarm") as executor:
+            list(executor.map(warm, range(count)))
+
+        def average(key):
+            values = [t[key] for t in timings if key in t]
+            return round(sum(values) / len(values), 3) if values else None
+
+        self.startup = {
+            "prewarmed": len(timings),
+            "failed": count - len(timings),
+            "seconds": round(time.monotonic() - started, 3),
+            "launch_avg": average("launch"),
+            "park_avg": average("park"),
+            "driver_resolve_seconds": driver_stats["resolve_seconds"],
+        }
+        logger.info(f"Прогрев пула парсеров: {self.startup}")
+        return self.startup
+
+    @contextmanager
+    def lease(self, timeout: Optional[float] = None):
+        """Контекстный менеджер: checkout + checkin с учетом ошибок"""
+        parser = self.checkout(timeout)
+        failed = False
+        try:
+            yield parser
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.checkin(parser, failed=failed)
+
+    def status(self) -> dict:
+        return {
+            "size": self.size,
+            # Живые драйверы; created из stats - сколько запущено всего
+            "alive": self._created,
+            "idle": self._idle.qsize(),
+            "busy": self._busy,
+            **self.stats,
+            "startup": self.startup,
+        }
+
+    def close(self):
+        """Закрытие всех драйверов
+
+        Замены, запущенные в фоне, закрываются сами после запуска.
+        """
+        self._closed = True
+        self._recycler.shutdown(wait=False)
+        while True:
+            try:
+                parser = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._destroy(parser)
+            with self._lock:
+                self._created -= 1
+
+
+parser_pool = ParserPool()
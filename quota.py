@@ -0,0 +1,91 @@
+from datetime import datetime, date
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import DailyUsage, License
+from usage import record_usage
+
+
+def utc_today() -> date:
+    return datetime.utcnow().date()
+
+
+def get_usage(db: Session, license_id: int) -> int:
+    """Число запросов лицензии за текущие сутки UTC"""
+    count = db.query(DailyUsage.count).filter(
+        DailyUsage.license_id == license_id,
+        DailyUsage.day == utc_today()
+    ).scalar()
+    return count or 0
+
+
+def admit(db: Session, license, amount: int = 1, day: date = None) -> int:
+    """Атомарное списание запросов из дневного лимита
+
+    Счетчик увеличивается одним UPDATE с условием на остаток лимита,
+    поэтому одновременные запросы не могут превысить лимит. Изменение
+    фиксируется вместе с транзакцией вызывающего. Возвращает число
+    использованных за сутки запросов. day - сутки списания, по
+    умолчанию текущие.
+    """
+    today = day or utc_today()
+    limit = license.requests_per_day
+
+    for attempt in range(2):
+        updated = db.query(DailyUsage).filter(
+            DailyUsage.license_id == license.id,
+            DailyUsage.day == today,
+            DailyUsage.count + amount <= limit
+        ).update({DailyUsage.count: DailyUsage.count + amount}, synchronize_session=False)
+        if updated:
+            return db.query(DailyUsage.count).filter(
+                DailyUsage.license_id == license.id,
+                DailyUsage.day == today
+            ).scalar()
+
+        exists = db.query(DailyUsage.license_id).filter(
+            DailyUsage.license_id == license.id,
+            DailyUsage.day == today
+        ).first()
+        if exists or amount > limit:
+            break
+
+        # Первый запрос за сутки
+        try:
+            with db.begin_nested():
+                db.add(DailyUsage(license_id=license.id, day=today, count=amount))
+            return amount
+        except IntegrityError:
+            # Строку успел создать параллельный запрос, повторяем UPDATE
+            continue
+
+    raise HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Превышен дневной лимит запросов"
+    )
+
+
+def release(db: Session, license_id: int, amount: int = 1, day: date = None):
+    """Возврат запросов в лимит, например после ошибки парсинга
+
+    day - сутки, за которые запросы были списаны; запрос, начатый
+    до полуночи, возвращается в лимит прошедших суток.
+    """
+    db.query(DailyUsage).filter(
+        DailyUsage.license_id == license_id,
+        DailyUsage.day == (day or utc_today()),
+        DailyUsage.count >= amount
+    ).update({DailyUsage.count: DailyUsage.count - amount}, synchronize_session=False)
+
+
+def record_request(db: Session, license_id: int, amount: int = 1, results: int = 0, errors: int = 0):
+    """Увеличение общего счетчика запросов лицензии и агрегатов использования
+
+    errors - ошибки живого поиска в запросах, на которые все же дан ответ.
+    """
+    db.query(License).filter(License.id == license_id).update(
+        {License.total_requests: License.total_requests + amount}, synchronize_session=False
+    )
+    record_usage(db, license_id, requests=amount, results=results, errors=errors)
@@ -0,0 +1,158 @@
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from cache import normalize
+from metrics import LOCAL_SEARCH_SECONDS
+
+SORTS = ("relevance", "rating", "reviews")
+
+# Веса столбцов name, categories, address в ранжировании bm25
+BM25 = "bm25(organizations_fts, 10.0, 5.0, 1.0)"
+
+ORDER = {
+    "relevance": f"{BM25}, f.rating DESC",
+    "rating": "f.rating IS NULL, f.rating DESC, f.reviews_count DESC",
+    "reviews": "f.reviews_count DESC, f.rating DESC",
+}
+
+RATING_BUCKETS = (
+    ("4.5+", "f.rating >= 4.5"),
+    ("4-4.5", "f.rating >= 4 AND f.rating < 4.5"),
+    ("3-4", "f.rating >= 3 AND f.rating < 4"),
+    ("<3", "f.rating < 3"),
+    ("none", "f.rating IS NULL"),
+)
+
+COLUMNS = """o.organization_id, o.name, o.categories, o.rating, o.reviews_count, o.address,
+    o.phones, o.website, o.schedule, o.latitude, o.longitude, f.city"""
+
+WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def match_expression(query: str) -> str:
+    """Запрос FTS5: все слова как префиксы, чтобы «стоматолог» находил «стоматология»"""
+    return " ".join(f'"{word}"*' for word in WORD.findall(query.lower()))
+
+
+class SearchIndex:
+    """Поиск по сохраненным организациям без обращения к картам
+
+    Название, категории и адрес ищутся через FTS5-индекс organizations_fts,
+    рейтинг, число отзывов и город берутся из organization_facets.
+    Оба индекса обновляются триггерами при каждой записи в хранилище.
+    """
+
+    def filters(self, query: str, city: str, min_rating: Optional[float],
+                min_reviews: Optional[int]) -> Dict[str, Tuple[str, Dict]]:
+        """Условия WHERE с параметрами, по имени фильтра"""
+        conditions = {}
+        match = match_expression(query or "")
+        if match:
+            conditions["query"] = ("organizations_fts MATCH :match", {"match": match})
+        if city:
+            conditions["city"] = ("f.city = :city", {"city": normalize(city)})
+        if min_rating is not None:
+            conditions["rating"] = ("f.rating >= :min_rating", {"min_rating": min_rating})
+        if min_reviews is not None:
+            conditions["reviews"] = ("f.reviews_count >= :min_reviews", {"min_reviews": min_reviews})
+        return conditions
+
+    @staticmethod
+    def source(conditions: Dict) -> str:
+        if "query" in conditions:
+            # CROSS JOIN закрепляет порядок: сначала совпадения из FTS5,
+            # иначе SQLite может перебирать фасеты и искать по индексу для каждой строки
+            return ("FROM organizations_fts CROSS JOIN organizations o ON o.id = organizations_fts.rowid "
+                    "CROSS JOIN organization_facets f ON f.organization_pk = o.id")
+        return "FROM organizations o JOIN organization_facets f ON f.organization_pk = o.id"
+
+    @staticmethod
+    def where(conditions: Dict, exclude: str = None) -> Tuple[str, Dict]:
+        clauses, params = [], {}
+        for name, (clause, values) in conditions.items():
+            if name != exclude:
+                clauses.append(clause)
+                params.update(values)
+        return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def search(self, db: Session, query: str = "", city: str = "", min_rating: float = None,
+               min_reviews: int = None, sort: str = None, page: int = 1, per_page: int = 50,
+               facets: bool = True) -> Dict:
+        """Ранжированная страница организаций, общее число и фасеты
+
+        Фасет по городу считается без фильтра по городу, а по рейтингу -
+        без фильтра по рейтингу, чтобы показывать доступные варианты.
+        """
+        started = time.perf_counter()
+        conditions = self.filters(query, city, min_rating, min_reviews)
+        if sort not in SORTS or (sort == "relevance" and "query" not in conditions):
+            sort = "relevance" if "query" in conditions else "rating"
+        source = self.source(conditions)
+        where, params = self.where(conditions)
+
+        with LOCAL_SEARCH_SECONDS.time():
+            rows = db.execute(text(
+                f"SELECT {COLUMNS} {source} {where} ORDER BY {ORDER[sort]} LIMIT :limit OFFSET :offset"
+            ), {**params, "limit": per_page, "offset": (page - 1) * per_page}).mappings().all()
+            total = db.execute(text(f"SELECT COUNT(*) {source} {where}"), params).scalar()
+            result = {
+                "total": total,
+                "page": page,
+                "per_page": per_page,
+                "sort": sort,
+                "data": [self.row_to_dict(row) for row in rows],
+            }
+            if facets:
+                result["facets"] = self.facets(db, conditions)
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+    def facets(self, db: Session, conditions: Dict, cities: int = 20) -> Dict:
+        source = self.source(conditions)
+        where, params = self.where(conditions, exclude="city")
+        city_rows = db.execute(text(
+            f"SELECT f.city, COUNT(*) AS count {source} {where} "
+            f"{'AND' if where else 'WHERE'} f.city IS NOT NULL "
+            f"GROUP BY f.city ORDER BY count DESC LIMIT :cities"
+        ), {**params, "cities": cities}).all()
+
+        where, params = self.where(conditions, exclude="rating")
+        buckets = ", ".join(
+            f"SUM(CASE WHEN {condition} THEN 1 ELSE 0 END)" for _, condition in RATING_BUCKETS
+        )
+        counts = db.execute(text(f"SELECT {buckets} {source} {where}"), params).one()
+        return {
+            "city": {city: count for city, count in city_rows},
+            "rating": {name: count or 0 for (name, _), count in zip(RATING_BUCKETS, counts)},
+        }
+
+    def lookup(self, db: Session, query: str, city: str = "", limit: int = 50) -> List[Dict]:
+        """Лучшие совпадения в формате ответа парсера, для ответа без парсинга"""
+        if not match_expression(query):
+            return []
+        result = self.search(db, query, city, per_page=limit, facets=False)
+        return [{key: value for key, value in org.items() if key != "city"} for org in result["data"]]
+
+    @staticmethod
+    def row_to_dict(row) -> Dict:
+        return {
+            'id': row['organization_id'],
+            'name': row['name'],
+            'categories': row['categories'],
+            'rating': row['rating'],
+            'reviews_count': str(row['reviews_count'] or 0),
+            'address': row['address'],
+            'phones': row['phones'],
+            'website': row['website'],
+            'schedule': row['schedule'],
+            'latitude': row['latitude'],
+            'longitude': row['longitude'],
+            'city': row['city'],
+        }
+
+
+search_index = SearchIndex()
@@ -0,0 +1,214 @@
+import re
+import json
+import hashlib
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+
+from sqlalchemy import insert, update, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import Organization, RequestOrganization
+from metrics import STORAGE_WRITE_SECONDS, STORAGE_ROWS
+
+# Размер пакета при вставке результатов
+BATCH_SIZE = 500
+
+NON_DIGITS = re.compile(r'\D')
+EMPTY_JSON = '{}'
+
+# Поля организации, по которым считается хэш содержимого
+CONTENT_FIELDS = (
+    'name', 'categories', 'address', 'phones', 'website', 'rating',
+    'reviews_count', 'schedule', 'latitude', 'longitude',
+    'attributes', 'social_networks',
+)
+
+# Счетчики записи в хранилище организаций
+store_stats = {"inserted": 0, "updated": 0, "unchanged": 0, "links": 0}
+
+
+def parse_reviews_count(value) -> int:
+    """Число отзывов из текста вида «1 234 отзыва»"""
+    if isinstance(value, int):
+        return value
+    digits = NON_DIGITS.sub('', value or '')
+    return int(digits) if digits else 0
+
+
+def dump_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False) if value else EMPTY_JSON
+
+
+def organization_key(org: Dict) -> str:
+    """Идентификатор Яндекса или, если его нет, хэш названия и адреса"""
+    if org.get('id'):
+        return str(org['id'])
+    digest = hashlib.sha1(f"{org.get('name', '')}|{org.get('address', '')}".encode('utf-8'))
+    return f"h:{digest.hexdigest()[:16]}"
+
+
+def normalize_organization(org: Dict) -> Dict:
+    """Строка organizations из словаря, полученного от парсера"""
+    return {
+        'organization_id': organization_key(org),
+        'name': org.get('name', ''),
+        'categories': org.get('categories', ''),
+        'address': org.get('address', ''),
+        'phones': org.get('phones', ''),
+        'website': org.get('website', ''),
+        'rating': org.get('rating', ''),
+        'reviews_count': parse_reviews_count(org.get('reviews_count')),
+        'schedule': org.get('schedule', ''),
+        'latitude': org.get('latitude', ''),
+        'longitude': org.get('longitude', ''),
+        'attributes': dump_json(org.get('attributes')),
+        'social_networks': dump_json(org.get('social_networks')),
+    }
+
+
+def content_hash(row: Dict) -> str:
+    payload = json.dumps([row.get(field) for field in CONTENT_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def merge_rows(old: Dict, new: Dict) -> Dict:
+    """Новые значения поверх сохраненных, пустые поля не затирают данные
+
+    Карточка из списка не содержит сайта и графика, поэтому повторная
+    встреча организации в поиске не должна стирать загруженные детали.
+    """
+    merged = {'organization_id': new['organization_id']}
+    for field in CONTENT_FIELDS:
+        value = new.get(field)
+        merged[field] = value if value not in (None, '', 0, EMPTY_JSON) else old.get(field)
+    return merged
+
+
+def _upsert_batch(db: Session, organizations: List[Dict]) -> List[int]:
+    keys = []
+    rows = {}
+    for org in organizations:
+        row = normalize_organization(org)
+        key = row['organization_id']
+        keys.append(key)
+        rows[key] = merge_rows(rows[key], row) if key in rows else row
+
+    columns = [getattr(Organization, field) for field in CONTENT_FIELDS]
+    for attempt in range(2):
+        existing = {
+            item.organization_id: item._asdict()
+            for item in db.execute(
+                select(Organization.id, Organization.organization_id, Organization.content_hash, *columns)
+                .where(Organization.organization_id.in_(list(rows)))
+            )
+        }
+        now = datetime.utcnow()
+        inserts, updates = [], []
+        for key, row in rows.items():
+            old = existing.get(key)
+            if old is None:
+                inserts.append({**row, 'content_hash': content_hash(row), 'first_seen_at': now, 'updated_at': now})
+                continue
+            merged = merge_rows(old, row)
+            digest = content_hash(merged)
+            if digest != old['content_hash']:
+                updates.append({**merged, 'id': old['id'], 'content_hash': digest, 'updated_at': now})
+        try:
+            with db.begin_nested():
+                if inserts:
+                    db.execute(insert(Organization), inserts)
+            break
+        except IntegrityError:
+            # Организацию успел вставить параллельный запрос, перечитываем
+            if attempt:
+                raise
+
+    if updates:
+        db.execute(update(Organization), updates)
+
+    ids = {key: row['id'] for key, row in existing.items()}
+    if inserts:
+        ids.update(db.execute(
+            select(Organization.organization_id, Organization.id)
+            .where(Organization.organization_id.in_([row['organization_id'] for row in inserts]))
+        ).all())
+
+    store_stats["inserted"] += len(inserts)
+    store_stats["updated"] += len(updates)
+    store_stats["unchanged"] += len(rows) - len(inserts) - len(updates)
+    return [ids[key] for key in keys]
+
+
+def upsert_organizations(db: Session, organizations: List[Dict],
+                         batch_size: int = BATCH_SIZE) -> List[int]:
+    """Запись организаций в общее хранилище
+
+    Новые организации вставляются пакетно, измененные обновляются,
+    а записи с тем же хэшем содержимого не переписываются. Возвращает
+    первичные ключи organizations в порядке входного списка.
+    """
+    pks = []
+    with STORAGE_WRITE_SECONDS.time(operation="upsert"):
+        for start in range(0, len(organizations), batch_size):
+            pks.extend(_upsert_batch(db, organizations[start:start + batch_size]))
+    STORAGE_ROWS.inc(len(pks), operation="upsert")
+    return pks
+
+
+def save_organizations(db: Session, request_id: int, organizations: List[Dict],
+                       start_position: int = 0, batch_size: int = BATCH_SIZE,
+                       known: Optional[Dict[str, int]] = None) -> List[int]:
+    """Сохранение результатов запроса: организации плюс связи с запросом
+
+    start_position позволяет дописывать результаты порциями, как это
+    делают фоновые задачи. known - первичные ключи заведомо неизменных
+    организаций (режим delta), они только связываются с запросом.
+    """
+    if known:
+        keys = [organization_key(org) for org in organizations]
+        written = iter(upsert_organizations(
+            db, [org for key, org in zip(keys, organizations) if key not in known], batch_size
+        ))
+        pks = [known[key] if key in known else next(written) for key in keys]
+        store_stats["unchanged"] += sum(1 for key in keys if key in known)
+    else:
+        pks = upsert_organizations(db, organizations, batch_size)
+    links = [
+        {'request_id': request_id, 'position': start_position + i, 'organization_pk': pk}
+        for i, pk in enumerate(pks)
+    ]
+    with STORAGE_WRITE_SECONDS.time(operation="links"):
+        for start in range(0, len(links), batch_size):
+            db.execute(insert(RequestOrganization), links[start:start + batch_size])
+    STORAGE_ROWS.inc(len(links), operation="links")
+    store_stats["links"] += len(links)
+    return pks
+
+
+def load_request_organizations(db: Session, request_id: int, offset: int = 0,
+                               after_position: Optional[int] = None) -> List[Tuple[int, Organization]]:
+    """Организации запроса в порядке выдачи вместе с их позициями"""
+    query = db.query(RequestOrganization.position, Organization).join(
+        Organization, Organization.id == RequestOrganization.organization_pk
+    ).filter(RequestOrganization.request_id == request_id)
+    if after_position is not None:
+        query = query.filter(RequestOrganization.position > after_position)
+    return query.order_by(RequestOrganization.position).offset(offset).all()
+
+
+def organization_to_dict(item: Organization) -> Dict:
+    """Представление сохраненной организации в формате ответа парсера"""
+    return {
+        'id': item.organization_id,
+        'name': item.name,
+        'categories': item.categories,
+        'rating': item.rating,
+        'reviews_count': str(item.reviews_count or 0),
+        'address': item.address,
+        'phones': item.phones,
+        'website': item.website,
+        'schedule': item.schedule,
+        'latitude': item.latitude,
+        'longitude': item.longitude,
+    }
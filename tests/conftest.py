@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# Отдельная база и без пауз между переходами; до импорта модулей приложения
+TMP_DIR = tempfile.mkdtemp(prefix="yandex_parser_tests_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{TMP_DIR}/test.db")
+os.environ.setdefault("REQUEST_DELAY", "0")
+os.environ.setdefault("PARSER_PREWARM", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,39 @@
+import uuid
+
+import pytest
+
+from batches import batch_to_dict, create_batch
+from database import SessionLocal, SearchBatch, SearchJob, init_db
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def test_batch_status_follows_jobs(db):
+    batch, pending = create_batch(db, None, [("пекарня", "псков", 10), ("кофейня", "псков", 10)])
+    db.commit()
+    assert batch_to_dict(db, batch)["status"] == "pending"
+
+    jobs = db.query(SearchJob).filter(SearchJob.id.in_(pending)).all()
+    jobs[0].status = "done"
+    assert batch_to_dict(db, batch)["status"] == "running"
+    jobs[1].status = "failed"
+    assert batch_to_dict(db, batch)["status"] == "done"
+    jobs[0].status = "failed"
+    assert batch_to_dict(db, batch)["status"] == "failed"
+    db.rollback()
+
+
+def test_batch_without_jobs(db):
+    empty = SearchBatch(id=str(uuid.uuid4()), items_count=0)
+    # Задачи завершенного пакета удалены обслуживанием
+    purged = SearchBatch(id=str(uuid.uuid4()), items_count=3)
+    db.add_all([empty, purged])
+    db.commit()
+    assert batch_to_dict(db, empty)["status"] == "failed"
+    assert batch_to_dict(db, purged)["status"] == "done"
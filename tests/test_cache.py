@@ -0,0 +1,94 @@
+import uuid
+
+import pytest
+
+from cache import SearchCache, make_cache_key
+from database import SessionLocal, RequestLog, SearchJob, init_db
+from storage import save_organizations
+
+
+def org(org_id):
+    return {"id": org_id, "name": f"Аптека {org_id}", "categories": "Аптека", "rating": "4.0",
+            "reviews_count": "3", "address": f"пр. Мира, {org_id}", "phones": ""}
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def save_request(db, key, organizations, from_cache=False, job_status=None):
+    request_log = RequestLog(query="аптека", cache_key=key, from_cache=from_cache)
+    db.add(request_log)
+    db.flush()
+    save_organizations(db, request_log.id, organizations)
+    request_log.results_count = len(organizations)
+    if job_status:
+        db.add(SearchJob(id=str(uuid.uuid4()), request_id=request_log.id, status=job_status,
+                         progress=len(organizations)))
+    db.commit()
+    return request_log
+
+
+def ids(organizations):
+    return [item["id"] for item in organizations]
+
+
+def test_persistent_tier_reads_last_live_request(db):
+    key = make_cache_key("аптека", "омск", 50)
+    save_request(db, key, [org("c1"), org("c2")])
+    save_request(db, key, [org("c9")], from_cache=True)
+
+    cache = SearchCache(ttl=3600)
+    assert ids(cache.lookup(db, key)) == ["c1", "c2"]
+    assert cache.stats["db_hits"] == 1
+    # Повтор берется из памяти
+    assert ids(cache.lookup(db, key)) == ["c1", "c2"]
+    assert cache.stats["memory_hits"] == 1
+
+
+def test_failed_job_does_not_feed_cache(db):
+    key = make_cache_key("аптека", "тверь", 50)
+    save_request(db, key, [org("c3"), org("c4"), org("c5")], job_status="done")
+    # Задача прервана капчей после части выдачи
+    save_request(db, key, [org("c6")], job_status="failed")
+
+    assert ids(SearchCache(ttl=3600).lookup(db, key)) == ["c3", "c4", "c5"]
+
+    key = make_cache_key("аптека", "орел", 50)
+    save_request(db, key, [org("c7")], job_status="failed")
+    cache = SearchCache(ttl=3600)
+    assert cache.lookup(db, key) is None
+    assert cache.stats["misses"] == 1
+
+
+def test_disabled_cache(db):
+    key = make_cache_key("аптека", "омск", 50)
+    assert SearchCache(ttl=0).lookup(db, key) is None
+
+
+def test_collapse_shares_one_result():
+    cache = SearchCache(ttl=3600)
+    future, leader = cache.begin("k")
+    same, follower = cache.begin("k")
+    assert leader and not follower and same is future
+    assert cache.stats["collapsed"] == 1
+
+    cache.complete("k", [org("c8")])
+    assert ids(future.result(timeout=1)) == ["c8"]
+    assert ids(cache._get_memory("k")) == ["c8"]
+    # Следующий парсинг по ключу начинается заново
+    assert cache.begin("k")[1]
+
+
+def test_collapse_propagates_error():
+    cache = SearchCache(ttl=3600)
+    future, _ = cache.begin("k")
+    cache.complete("k", error=RuntimeError("captcha"))
+    with pytest.raises(RuntimeError):
+        future.result(timeout=1)
+    assert cache._get_memory("k") is None
+    assert cache.begin("k")[1]
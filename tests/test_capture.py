@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import parser as parser_module
+from parser import YandexMapsParser
+from waits import AdaptiveWaiter
+from yandex_api import SearchResponseCapture
+
+
+class FakeDriver:
+    """Драйвер с performance-логом, в который тест подкладывает ответы поиска"""
+
+    def __init__(self):
+        self.log = []
+        self.bodies = {}
+        self.scripts = []
+
+    def add_response(self, request_id: str, items):
+        url = "https://yandex.ru/maps/api/search?text=q"
+        for method, params in (
+            ("Network.responseReceived", {"requestId": request_id, "response": {"url": url}}),
+            ("Network.loadingFinished", {"requestId": request_id}),
+        ):
+            self.log.append({"message": json.dumps({"message": {"method": method, "params": params}})})
+        self.bodies[request_id] = json.dumps({"data": {"items": items}})
+
+    def get_log(self, kind):
+        entries, self.log = self.log, []
+        return entries
+
+    def execute_cdp_cmd(self, command, params):
+        return {"body": self.bodies[params["requestId"]], "base64Encoded": False}
+
+    def execute_script(self, script, *args):
+        self.scripts.append(script)
+
+
+def business(org_id):
+    return {"type": "business", "id": org_id, "title": f"org {org_id}"}
+
+
+@pytest.fixture
+def parser(monkeypatch):
+    monkeypatch.setattr(parser_module, "API_CAPTURE_TIMEOUT", 0.1)
+    driver = FakeDriver()
+    item = YandexMapsParser.__new__(YandexMapsParser)
+    item.driver = driver
+    item.waiter = AdaptiveWaiter(driver, poll=0.01)
+    item.capture = SearchResponseCapture(driver)
+    return item
+
+
+def test_second_search_uses_capture(parser):
+    parser.capture.reset()
+    parser.driver.add_response("1", [business("1"), business("2")])
+    assert [org["id"] for org in parser.extract_captured()] == ["1", "2"]
+
+    # Тот же драйвер из пула, новый поиск
+    parser.capture.reset()
+    assert parser.capture.responses == 0
+    parser.driver.add_response("2", [business("3")])
+    assert [org["id"] for org in parser.extract_captured()] == ["3"]
+
+
+def test_second_search_falls_back_to_dom(parser):
+    parser.capture.reset()
+    parser.driver.add_response("1", [business("1")])
+    assert parser.extract_captured()
+
+    # Ответы второго поиска не перехвачены: нужен разбор DOM, а не пустая выдача
+    parser.capture.reset()
+    parser.driver.scripts.clear()
+    assert parser.extract_captured() is None
+    assert parser_module.MARK_ALL_SEEN_JS not in parser.driver.scripts
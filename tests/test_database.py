@@ -0,0 +1,20 @@
+from sqlalchemy.pool import QueuePool, SingletonThreadPool
+
+from config import settings
+from database import create_db_engine
+
+
+def test_memory_database_engine():
+    for url in ("sqlite://", "sqlite:///:memory:"):
+        engine = create_db_engine(url)
+        assert isinstance(engine.pool, SingletonThreadPool)
+        with engine.connect() as conn:
+            assert conn.exec_driver_sql("SELECT 1").scalar() == 1
+
+
+def test_file_database_pool_size(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path}/pool.db")
+    assert isinstance(engine.pool, QueuePool)
+    assert engine.pool.size() == settings.DB_POOL_SIZE
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
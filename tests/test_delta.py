@@ -0,0 +1,90 @@
+import uuid
+
+import pytest
+
+from cache import make_cache_key
+from database import SessionLocal, License, Organization, RequestLog, SearchJob, init_db
+from delta import DeltaTracker, request_organization_keys
+from storage import save_organizations, store_stats
+
+KEY = make_cache_key("шиномонтаж", "тула", 50)
+
+
+def org(org_id, rating="4.5", phones="+7"):
+    return {"id": org_id, "name": f"Шиномонтаж {org_id}", "categories": "Шиномонтаж",
+            "rating": rating, "reviews_count": "10", "address": f"ул. Мира, {org_id}", "phones": phones}
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    license = License(key="delta-test", owner_name="delta", email="delta@example.com")
+    session.add(license)
+    session.commit()
+    session.info["license_id"] = license.id
+    yield session
+    session.close()
+
+
+def run(db, organizations, source="live", job_status=None):
+    """Запрос в режиме delta, как в /api/search: сравнение, запись, diff"""
+    request_log = RequestLog(license_id=db.info["license_id"], query="шиномонтаж", cache_key=KEY)
+    db.add(request_log)
+    db.flush()
+    tracker = DeltaTracker(db, request_log)
+    fresh = tracker.observe(db, organizations)
+    save_organizations(db, request_log.id, organizations, known=tracker.known)
+    request_log.results_count = len(organizations)
+    request_log.source = source
+    if job_status:
+        db.add(SearchJob(id=str(uuid.uuid4()), license_id=db.info["license_id"],
+                         request_id=request_log.id, status=job_status))
+    db.commit()
+    return request_log, tracker, fresh
+
+
+def test_delta_between_runs(db):
+    first, tracker, fresh = run(db, [org("d1"), org("d2"), org("d3")])
+    assert tracker.previous_id is None
+    assert tracker.result()["added"] == ["d1", "d2", "d3"]
+    assert len(fresh) == 3 and not tracker.known
+
+    unchanged_before = store_stats["unchanged"]
+    # d1 без изменений, у d2 новый рейтинг, d3 пропала, d4 новая;
+    # пустой телефон из списка не считается изменением
+    second, tracker, fresh = run(db, [org("d1", phones=""), org("d2", rating="4.9"), org("d4")])
+    result = tracker.result()
+    assert result["previous_request_id"] == first.id
+    assert result["added"] == ["d4"]
+    assert result["removed"] == ["d3"]
+    assert result["changed"] == {"d2": {"rating": ["4.5", "4.9"]}}
+    assert (result["new"], result["unchanged"]) == (1, 1)
+    assert [item["id"] for item in fresh] == ["d2", "d4"]
+
+    # known: неизменная организация только связывается с запросом
+    assert store_stats["unchanged"] - unchanged_before == 1
+    assert request_organization_keys(db, second.id) == ["d1", "d2", "d4"]
+    stored = db.query(Organization).filter(Organization.organization_id == "d1").one()
+    assert stored.phones == "+7"
+
+
+def test_local_fallback_is_not_a_base(db):
+    live, _, _ = run(db, [org("d1"), org("d2", rating="4.9"), org("d4")])
+    run(db, [org("d1")], source="local")
+
+    _, tracker, _ = run(db, [org("d1"), org("d2", rating="4.9"), org("d4")])
+    result = tracker.result()
+    assert result["previous_request_id"] == live.id
+    assert result["added"] == [] and result["removed"] == []
+
+
+def test_failed_job_is_not_a_base(db):
+    live, _, _ = run(db, [org("d1"), org("d2", rating="4.9"), org("d4")])
+    # Задача остановилась на капче после первой организации
+    run(db, [org("d1")], job_status="failed")
+
+    _, tracker, _ = run(db, [org("d1"), org("d2", rating="4.9"), org("d4")])
+    result = tracker.result()
+    assert result["previous_request_id"] == live.id
+    assert result["added"] == [] and result["removed"] == []
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from executor import JobTimeout, ParserExecutor
+from metrics import Trace, current_trace
+
+
+class StubParser:
+    def __init__(self):
+        self.last_error = None
+        self.closed = threading.Event()
+
+    def close(self):
+        self.closed.set()
+
+
+class StubPool:
+    """Пул из одного парсера, запоминающий исходы аренды"""
+
+    size = 2
+
+    def __init__(self):
+        self.parser = StubParser()
+        self.failed = []
+
+    @contextmanager
+    def lease(self, timeout=None):
+        failed = False
+        try:
+            yield self.parser
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.failed.append(failed)
+
+
+@pytest.fixture
+def pool():
+    return StubPool()
+
+
+@pytest.fixture
+def executor(pool):
+    executor = ParserExecutor(pool)
+    yield executor
+    executor.shutdown()
+
+
+def test_job_runs_off_event_loop(executor):
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        job = executor.run(lambda parser: time.sleep(0.3) or "ok", timeout=2)
+        return await asyncio.gather(job, ticker())
+
+    started = time.monotonic()
+    result, _ = asyncio.run(main())
+    assert result == "ok"
+    # Пока поток исполнителя занят, цикл событий продолжает работать
+    assert len(ticks) == 5 and ticks[-1] - started < 0.3
+
+
+def test_trace_reaches_worker_thread(executor):
+    async def main():
+        request_trace = Trace()
+        current_trace.set(request_trace)
+        await executor.run(lambda parser: current_trace.get().add("search", 0.5))
+        return request_trace
+
+    assert asyncio.run(main()).to_dict() == {"search": {"seconds": 0.5, "count": 1}}
+
+
+def test_run_timeout_closes_driver(executor, pool):
+    def hang(parser):
+        parser.closed.wait(5)
+        raise RuntimeError("invalid session id")
+
+    with pytest.raises(JobTimeout):
+        asyncio.run(executor.run(hang, timeout=0.2))
+    assert pool.parser.closed.is_set()
+    assert isinstance(pool.parser.last_error, JobTimeout)
+    deadline = time.monotonic() + 2
+    while not pool.failed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # Парсер возвращается в пул как сбойный и будет пересоздан
+    assert pool.failed == [True]
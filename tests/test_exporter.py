@@ -0,0 +1,80 @@
+import csv
+import io
+import json
+
+import pytest
+from openpyxl import load_workbook
+
+import exporter
+from database import SessionLocal, RequestLog, init_db
+from exporter import HEADERS, export_stream
+from storage import save_organizations
+
+
+def org(org_id):
+    return {"id": org_id, "name": f"Кафе «{org_id}»", "categories": "Кафе", "rating": "4.2",
+            "reviews_count": "7", "address": f"ул. Мира, {org_id}", "phones": "+7 900"}
+
+
+@pytest.fixture(scope="module")
+def requests():
+    init_db()
+    db = SessionLocal()
+    ids = []
+    for organizations in ([org("e1"), org("e2"), org("e3")], [org("e3"), org("e4"), org("e1")]):
+        request_log = RequestLog(query="кафе")
+        db.add(request_log)
+        db.flush()
+        save_organizations(db, request_log.id, organizations)
+        ids.append(request_log.id)
+    db.commit()
+    db.close()
+    return ids
+
+
+@pytest.fixture(autouse=True)
+def small_batches(monkeypatch):
+    # Несколько порций на экспорт: проверяются стыки между ними
+    monkeypatch.setattr(exporter, "BATCH_SIZE", 2)
+
+
+def export(request_ids, format, unique=False):
+    content, media_type, extension = export_stream(request_ids, format, unique)
+    return b"".join(content), media_type, extension
+
+
+def test_json_and_ndjson(requests):
+    body, media_type, extension = export(requests, "json")
+    assert (media_type, extension) == ("application/json", "json")
+    rows = json.loads(body)
+    assert [row["ID"] for row in rows] == ["e1", "e2", "e3", "e3", "e4", "e1"]
+    assert rows[0]["Название"] == "Кафе «e1»"
+
+    body, _, _ = export(requests[:1], "ndjson")
+    assert [json.loads(line)["ID"] for line in body.decode("utf-8").splitlines()] == ["e1", "e2", "e3"]
+
+
+def test_csv_with_bom(requests):
+    body, _, extension = export(requests[:1], "csv")
+    assert extension == "csv" and body.startswith("\ufeff".encode("utf-8"))
+    rows = list(csv.reader(io.StringIO(body.decode("utf-8-sig"))))
+    assert rows[0] == HEADERS
+    assert [row[0] for row in rows[1:]] == ["e1", "e2", "e3"]
+
+
+def test_xlsx(requests):
+    body, _, extension = export(requests, "xlsx")
+    assert extension == "xlsx"
+    sheet = load_workbook(io.BytesIO(body), read_only=True).active
+    rows = list(sheet.values)
+    assert list(rows[0]) == HEADERS and len(rows) == 7
+
+
+def test_unique_keeps_first_occurrence(requests):
+    body, _, _ = export(requests, "json", unique=True)
+    assert [row["ID"] for row in json.loads(body)] == ["e1", "e2", "e3", "e4"]
+
+
+def test_empty_and_unknown_format():
+    body, media_type, _ = export([-1], "yaml")
+    assert media_type == "application/json" and json.loads(body) == []
@@ -0,0 +1,75 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+import maintenance as maintenance_module
+from config import settings
+from database import SessionLocal, RequestLog, RequestOrganization, init_db
+from maintenance import Maintenance
+from storage import save_organizations
+
+
+def org(org_id):
+    return {"id": org_id, "name": f"Склад {org_id}", "categories": "Склад", "rating": "4.1",
+            "reviews_count": "2", "address": f"ул. Ленина, {org_id}", "phones": ""}
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(maintenance_module, "BATCH_PAUSE", 0)
+    monkeypatch.setattr(settings, "RETENTION_EXPORT_FILES_HOURS", 0)
+    return Maintenance(batch_size=2, archive_dir=str(tmp_path), interval=0)
+
+
+def save_request(db, requested_at, organizations):
+    request_log = RequestLog(query="склад", requested_at=requested_at)
+    db.add(request_log)
+    db.flush()
+    save_organizations(db, request_log.id, organizations)
+    db.commit()
+    return request_log.id
+
+
+def archived(path):
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        return [json.loads(line) for line in archive]
+
+
+def test_purge_archives_then_deletes(db, service, tmp_path):
+    now = datetime.utcnow()
+    old = [save_request(db, now - timedelta(days=400), [org(f"m{i}"), org(f"n{i}")]) for i in range(3)]
+    fresh = save_request(db, now, [org("m9")])
+
+    report = service.run()
+    assert report["deleted"]["request_organizations"] == 6
+    assert report["deleted"]["request_logs"] == 3
+
+    db.expire_all()
+    assert db.query(RequestLog.id).filter(RequestLog.id.in_(old)).count() == 0
+    assert db.query(RequestOrganization).filter(RequestOrganization.request_id == fresh).count() == 1
+
+    # Пакеты дописываются в один архив таблицы, временных файлов не остается
+    archives = {Path(path).name.rsplit("_", 2)[0]: path for path in report["archives"]}
+    assert sorted(row["id"] for row in archived(archives["request_logs"])) == sorted(old)
+    assert len(archived(archives["request_organizations"])) == 6
+    assert not list(tmp_path.glob("*.part"))
+
+
+def test_wal_is_not_reported_as_reclaimed(db, service, monkeypatch):
+    monkeypatch.setattr(settings, "MAINTENANCE_VACUUM_RATIO", 2)
+    save_request(db, datetime.utcnow(), [org(f"w{i}") for i in range(50)])
+
+    report = service.run()
+    assert not any(report["deleted"].values())
+    assert report["reclaimed_bytes"] == 0
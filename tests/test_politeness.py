@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from parser import ERROR_TITLE
+from politeness import PolitenessScheduler, PolitenessTimeout, current_priority
+
+URL = "https://yandex.ru/maps/"
+
+
+@pytest.mark.parametrize("title", [
+    "429 Too Many Requests", "503 Service Temporarily Unavailable", "502 Bad Gateway",
+    "504 Gateway Time-out", "Internal Server Error", "Ошибка 500", "500",
+])
+def test_error_titles(title):
+    assert ERROR_TITLE.search(title)
+
+
+@pytest.mark.parametrize("title", [
+    "Автосервис 505", "Кафе 500 — Яндекс Карты", "Пекарня №429", "Яндекс Карты", "",
+])
+def test_organization_titles_are_not_errors(title):
+    assert not ERROR_TITLE.search(title)
+
+
+def test_priority_goes_first():
+    scheduler = PolitenessScheduler(delay=0.2, burst=1, priority_step=10)
+    scheduler.acquire(URL)
+    order = []
+
+    def worker(name, priority):
+        current_priority.set(priority)
+        scheduler.acquire(URL, timeout=5)
+        order.append(name)
+
+    low = threading.Thread(target=worker, args=("low", 0))
+    low.start()
+    time.sleep(0.05)
+    high = threading.Thread(target=worker, args=("high", 1))
+    high.start()
+    low.join()
+    high.join()
+    assert order == ["high", "low"]
+
+
+def test_backoff_doubles_up_to_max_and_resets_on_success():
+    scheduler = PolitenessScheduler(delay=0.01, burst=1, backoff=1, backoff_max=3)
+    assert [scheduler.penalize(URL) for _ in range(3)] == [1, 2, 3]
+    scheduler.success(URL)
+    assert scheduler.penalize(URL, "error") == 1
+    assert scheduler.status()["error"] == 1
+
+
+def test_blocked_host_waits_for_backoff():
+    scheduler = PolitenessScheduler(delay=0.01, burst=1, backoff=0.2, backoff_max=1)
+    scheduler.penalize(URL)
+    assert scheduler.acquire(URL, timeout=2) >= 0.15
+    # Другие хосты блокировка не затрагивает
+    assert scheduler.acquire("https://example.com/", timeout=2) < 0.05
+
+
+def test_acquire_times_out_while_blocked():
+    scheduler = PolitenessScheduler(delay=0.01, burst=1, backoff=5, backoff_max=5)
+    scheduler.penalize(URL)
+    with pytest.raises(PolitenessTimeout):
+        scheduler.acquire(URL, timeout=0.1)
+    assert scheduler.status()["hosts"]["yandex.ru"]["waiting"] == 0
@@ -0,0 +1,162 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import pool as pool_module
+from executor import JobTimeout, ParserExecutor
+from pool import ParserPool, PoolExhausted
+
+
+class FakeParser:
+    """Парсер без браузера: запуск занимает launch_delay секунд"""
+
+    launch_delay = 0.0
+    fail = False
+
+    def __init__(self, headless=True):
+        fail = self.fail
+        time.sleep(self.launch_delay)
+        if fail:
+            raise RuntimeError("chrome не запустился")
+        self.last_error = None
+        self.pages_loaded = 0
+        self.parked = False
+        self.closed = threading.Event()
+        self.timings = {}
+
+    def park(self):
+        self.parked = True
+        return True
+
+    def is_alive(self):
+        return not self.closed.is_set()
+
+    def close(self):
+        self.closed.set()
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    class Parser(FakeParser):
+        pass
+
+    monkeypatch.setattr(pool_module, "YandexMapsParser", Parser)
+    return Parser
+
+
+def wait_idle(pool, count=1, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while pool._idle.qsize() < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return pool._idle.qsize() >= count
+
+
+def test_lease_reuses_driver(fake):
+    pool = ParserPool(size=1, max_pages=10)
+    with pool.lease() as first:
+        assert pool.status()["busy"] == 1
+        # Созданный в пути запроса драйвер не открывает карты заранее
+        assert not first.parked
+    with pool.lease() as second:
+        assert second is first
+    status = pool.status()
+    assert (status["alive"], status["idle"], status["busy"]) == (1, 1, 0)
+    assert (status["created"], status["checkouts"]) == (1, 2)
+    pool.close()
+
+
+def test_recycle_does_not_block_lease(fake):
+    pool = ParserPool(size=1, max_pages=10)
+    with pool.lease() as parser:
+        parser.last_error = RuntimeError("captcha")
+        fake.launch_delay = 0.5
+        started = time.monotonic()
+    assert time.monotonic() - started < 0.2
+    assert parser.closed.wait(1)
+
+    # Следующий запрос дожидается фоновой замены, уже с открытыми картами
+    with pool.lease(timeout=2) as replacement:
+        assert replacement is not parser and replacement.parked
+    status = pool.status()
+    assert (status["alive"], status["recycled"], status["created"]) == (1, 1, 2)
+    pool.close()
+
+
+def test_recycle_after_max_pages(fake):
+    pool = ParserPool(size=1, max_pages=2)
+    with pool.lease() as parser:
+        parser.pages_loaded = 2
+    assert wait_idle(pool)
+    with pool.lease() as replacement:
+        assert replacement is not parser
+    pool.close()
+
+
+def test_failed_launch_releases_slot(fake):
+    pool = ParserPool(size=1, max_pages=10)
+    fake.fail = True
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+    assert pool.status()["alive"] == 0
+
+    fake.fail = False
+    parser = pool.checkout()
+    # Драйвер умер в простое: замена при checkout тоже не теряет место
+    pool.checkin(parser)
+    parser.close()
+    fake.fail = True
+    with pytest.raises(RuntimeError):
+        pool.checkout()
+    assert pool.status()["alive"] == 0
+    pool.close()
+
+
+def test_failed_replacement_frees_slot_for_waiter(fake):
+    pool = ParserPool(size=1, max_pages=10)
+    parser = pool.checkout()
+    fake.launch_delay, fake.fail = 0.2, True
+    pool.checkin(parser, failed=True)
+    time.sleep(0.05)
+
+    # Ожидающий запрос получает место после неудачной замены
+    fake.launch_delay, fake.fail = 0.0, False
+    with pool.lease(timeout=3) as replacement:
+        assert replacement is not parser
+    assert pool.status()["alive"] == 1
+    pool.close()
+
+
+def test_pool_exhausted(fake):
+    pool = ParserPool(size=1, max_pages=10)
+    with pool.lease():
+        with pytest.raises(PoolExhausted):
+            pool.checkout(timeout=0.1)
+    pool.close()
+
+
+def test_executor_timeout_closes_driver(fake):
+    pool = ParserPool(size=1, max_pages=10)
+    executor = ParserExecutor(pool)
+
+    def hang(parser):
+        parser.closed.wait(5)
+        raise RuntimeError("invalid session id")
+
+    future = executor.submit(hang, timeout=0.2)
+    with pytest.raises(JobTimeout):
+        future.result(timeout=3)
+    assert pool.status()["recycled"] == 1
+
+    # Долгое пересоздание драйвера не превращает успешную задачу в JobTimeout
+    fake.launch_delay = 0.5
+    assert wait_idle(pool)
+
+    def failing_search(parser):
+        parser.last_error = RuntimeError("captcha")
+        return []
+
+    assert asyncio.run(executor.run(failing_search, timeout=0.3)) == []
+    executor.shutdown()
+    pool.close()
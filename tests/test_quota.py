@@ -0,0 +1,120 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+import app
+import pool as pool_module
+from database import SessionLocal, License, SearchJob, UsageRollup, init_db
+from politeness import CaptchaDetected
+from quota import admit, get_usage, release
+
+
+class CaptchaParser:
+    """Парсер, которому на поиске показывают капчу"""
+
+    def __init__(self, headless=True):
+        self.driver = object()
+        self.last_error = None
+        self.pages_loaded = 0
+        self.timings = {}
+
+    def park(self):
+        return True
+
+    def is_alive(self):
+        return True
+
+    def close(self):
+        pass
+
+    def search_organizations(self, query, city="", limit=50, on_result=None):
+        # Как настоящий парсер: ошибка сохраняется, выдача пустая
+        self.last_error = CaptchaDetected("Показана капча")
+        return []
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def make_license(db, key, requests_per_day=2):
+    license = License(key=key, owner_name=key, email=f"{key}@example.com", requests_per_day=requests_per_day,
+                      expires_at=datetime.utcnow() + timedelta(days=30))
+    db.add(license)
+    db.commit()
+    return license
+
+
+def errors(db, license_id):
+    return db.query(UsageRollup.errors).filter(
+        UsageRollup.license_id == license_id, UsageRollup.period == "day"
+    ).scalar() or 0
+
+
+def test_admit_limit_and_release_by_day(db):
+    license = make_license(db, "quota-admit")
+    assert admit(db, license) == 1
+    assert admit(db, license) == 2
+    with pytest.raises(HTTPException) as error:
+        admit(db, license)
+    assert error.value.status_code == 429
+
+    # Возврат за прошедшие сутки не трогает сегодняшний лимит
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    release(db, license.id, day=yesterday)
+    assert get_usage(db, license.id) == 2
+    release(db, license.id)
+    assert admit(db, license) == 2
+    db.commit()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(pool_module, "YandexMapsParser", CaptchaParser)
+    # Без with: события startup/shutdown не закрывают общий пул парсеров
+    return TestClient(app.app)
+
+
+def test_sync_failure_releases_quota(db, client):
+    license = make_license(db, "quota-sync")
+    response = client.post("/api/search", data={"query": "кафе", "city": "Тула"},
+                           headers={"X-License-Key": license.key})
+    assert response.status_code == 500
+    assert get_usage(db, license.id) == 0
+    assert errors(db, license.id) == 1
+
+
+def test_failed_job_releases_quota(db, client):
+    license = make_license(db, "quota-job")
+    response = client.post("/api/search", data={"query": "бар", "city": "Тула", "async_job": "true"},
+                           headers={"X-License-Key": license.key})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        db.expire_all()
+        job = db.get(SearchJob, job_id)
+        if job.status == "failed":
+            break
+        time.sleep(0.05)
+    assert job.status == "failed"
+    assert get_usage(db, license.id) == 0
+    assert errors(db, license.id) == 1
+
+
+def test_fallback_after_failure_counts_error(db, client):
+    license = make_license(db, "quota-fallback")
+    response = client.post("/api/search", data={"query": "кафе", "city": "Тула", "fallback": "true"},
+                           headers={"X-License-Key": license.key})
+    assert response.status_code == 200 and response.json()["source"] == "local"
+    # Ответ дан, запрос списан, но сбой живого поиска учтен
+    assert get_usage(db, license.id) == 1
+    assert errors(db, license.id) == 1
@@ -0,0 +1,83 @@
+import pytest
+
+from cache import make_cache_key, normalize
+from database import SessionLocal, RequestLog, init_db
+from search_index import search_index
+from storage import save_organizations, upsert_organizations
+
+
+def org(org_id, name, rating="4.5", reviews="10", categories="Кафе", address="ул. Ленина, 1"):
+    return {"id": org_id, "name": name, "categories": categories, "rating": rating,
+            "reviews_count": reviews, "address": address, "phones": "+7"}
+
+
+def save_request(db, query, city, organizations):
+    request_log = RequestLog(query=query, cache_key=make_cache_key(query, city, 50), city=normalize(city))
+    db.add(request_log)
+    db.flush()
+    save_organizations(db, request_log.id, organizations)
+    db.commit()
+    return request_log
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    # «|» в запросе не должен сбивать город фасета
+    save_request(session, "кофе | завтраки", "Москва", [
+        org("si-1", "Кофейня Зерно", rating="4,8", reviews="120"),
+        org("si-2", "Кофемания", rating="4.2", reviews="300"),
+        org("si-3", "Стоматология Улыбка", rating="", reviews="5", categories="Стоматология"),
+    ])
+    save_request(session, "кофе", "Казань", [org("si-4", "Кофе Хауз", rating="3.9", reviews="40")])
+    yield session
+    session.close()
+
+
+def ids(result):
+    return [item["id"] for item in result["data"]]
+
+
+def test_search_by_prefix_and_city(db):
+    result = search_index.search(db, "коф")
+    assert set(ids(result)) == {"si-1", "si-2", "si-4"}
+    assert result["sort"] == "relevance"
+    assert result["facets"]["city"] == {"москва": 2, "казань": 1}
+
+    result = search_index.search(db, "коф", city="Москва")
+    assert set(ids(result)) == {"si-1", "si-2"}
+    assert all(item["city"] == "москва" for item in result["data"])
+
+
+def test_filters_sort_and_pages(db):
+    result = search_index.search(db, "", city="москва", sort="rating")
+    assert ids(result) == ["si-1", "si-2", "si-3"]
+    assert result["facets"]["rating"]["none"] == 1
+
+    result = search_index.search(db, "коф", min_rating=4, sort="reviews", per_page=1, page=2)
+    assert result["total"] == 2
+    assert ids(result) == ["si-1"]
+
+    # Без запроса по умолчанию сортировка по рейтингу
+    assert ids(search_index.search(db, "", min_reviews=100)) == ["si-1", "si-2"]
+    assert ids(search_index.search(db, "", min_reviews=100, sort="reviews")) == ["si-2", "si-1"]
+
+
+def test_lookup_returns_parser_format(db):
+    found = search_index.lookup(db, "стоматология", "москва")
+    assert [item["id"] for item in found] == ["si-3"]
+    assert "city" not in found[0]
+    assert found[0]["reviews_count"] == "5"
+    assert search_index.lookup(db, "   ") == []
+
+
+def test_update_keeps_index_in_sync(db):
+    upsert_organizations(db, [org("si-4", "Чайная Пиала", rating="4.9", reviews="41")])
+    db.commit()
+
+    assert "si-4" not in ids(search_index.search(db, "кофе"))
+    result = search_index.search(db, "чайная")
+    assert ids(result) == ["si-4"]
+    assert result["data"][0]["rating"] == "4.9"
+    assert "si-4" in ids(search_index.search(db, "", min_rating=4.9))
@@ -0,0 +1,76 @@
+import pytest
+
+from database import SessionLocal, Organization, RequestLog, RequestOrganization, init_db
+from storage import (
+    load_request_organizations, organization_key, parse_reviews_count, save_organizations,
+    store_stats, upsert_organizations,
+)
+
+
+def org(org_id, **fields):
+    item = {"id": org_id, "name": f"Автосервис {org_id}", "categories": "Автосервис", "rating": "4.0",
+            "reviews_count": "12 отзывов", "address": f"ш. Энтузиастов, {org_id}", "phones": "+7 495"}
+    item.update(fields)
+    return item
+
+
+@pytest.fixture(scope="module")
+def db():
+    init_db()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+def new_request(db):
+    request_log = RequestLog(query="автосервис")
+    db.add(request_log)
+    db.flush()
+    return request_log.id
+
+
+def stored(db, org_id):
+    return db.query(Organization).filter(Organization.organization_id == org_id).one()
+
+
+def test_one_row_per_organization(db):
+    first, second = new_request(db), new_request(db)
+    pks = save_organizations(db, first, [org("s1"), org("s2")])
+    again = save_organizations(db, second, [org("s2"), org("s1"), org("s3")])
+    assert again[:2] == [pks[1], pks[0]] and again[2] not in pks
+    db.commit()
+
+    assert db.query(Organization).filter(Organization.organization_id.in_(["s1", "s2", "s3"])).count() == 3
+    assert db.query(RequestOrganization).filter(RequestOrganization.request_id == second).count() == 3
+    assert [item.organization_id for _, item in load_request_organizations(db, second)] == ["s2", "s1", "s3"]
+    assert [position for position, _ in load_request_organizations(db, second, offset=1)] == [1, 2]
+
+
+def test_empty_fields_do_not_erase_details(db):
+    upsert_organizations(db, [org("s4", website="https://s4.example", schedule="9-21")])
+    unchanged = store_stats["unchanged"]
+    # Карточка из списка без сайта и графика
+    upsert_organizations(db, [org("s4")])
+    assert store_stats["unchanged"] == unchanged + 1
+
+    upsert_organizations(db, [org("s4", rating="4.8", phones="")])
+    db.commit()
+    item = stored(db, "s4")
+    assert (item.website, item.schedule, item.rating, item.phones) == ("https://s4.example", "9-21", "4.8", "+7 495")
+    assert item.reviews_count == 12
+
+
+def test_duplicates_within_batch_are_merged(db):
+    pks = upsert_organizations(db, [org("s5"), org("s5", website="https://s5.example")])
+    db.commit()
+    assert pks[0] == pks[1]
+    assert stored(db, "s5").website == "https://s5.example"
+
+
+def test_keys_and_counts():
+    assert organization_key({"id": 42}) == "42"
+    # Без идентификатора ключ - хэш названия и адреса
+    key = organization_key({"name": "Шиномонтаж", "address": "ул. Мира, 1"})
+    assert key.startswith("h:") and key == organization_key({"name": "Шиномонтаж", "address": "ул. Мира, 1"})
+    assert parse_reviews_count("1 234 отзыва") == 1234
+    assert parse_reviews_count(None) == 0
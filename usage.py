@@ -0,0 +1,163 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from database import License, DailyUsage, UsageRollup
+
+PERIODS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Окно счетчиков requests_30d, results_30d и errors_30d в списке лицензий
+WINDOW_DAYS = 30
+
+LICENSE_SORTS = (
+    "created_at", "owner_name", "expires_at", "requests_per_day", "total_requests",
+    "today_requests", "requests_30d", "results_30d", "errors_30d",
+)
+
+
+def bucket_start(at: datetime, period: str) -> datetime:
+    """Начало часа или суток, к которым относится момент at"""
+    if period == "hour":
+        return at.replace(minute=0, second=0, microsecond=0)
+    return at.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def record_usage(db: Session, license_id: int, requests: int = 0, results: int = 0,
+                 errors: int = 0, at: datetime = None):
+    """Прибавление к часовому и суточному агрегатам лицензии
+
+    Как и дневной лимит в quota.admit: UPDATE существующей строки,
+    а при ее отсутствии INSERT с повтором UPDATE, если строку успел
+    создать параллельный запрос. Изменение фиксируется вместе
+    с транзакцией вызывающего.
+    """
+    if not license_id or not (requests or results or errors):
+        return
+    at = at or datetime.utcnow()
+
+    for period in PERIODS:
+        bucket = bucket_start(at, period)
+        for attempt in range(2):
+            updated = db.query(UsageRollup).filter(
+                UsageRollup.license_id == license_id,
+                UsageRollup.period == period,
+                UsageRollup.bucket == bucket
+            ).update({
+                UsageRollup.requests: UsageRollup.requests + requests,
+                UsageRollup.results: UsageRollup.results + results,
+                UsageRollup.errors: UsageRollup.errors + errors,
+            }, synchronize_session=False)
+            if updated:
+                break
+            try:
+                with db.begin_nested():
+                    db.add(UsageRollup(license_id=license_id, period=period, bucket=bucket,
+                                       requests=requests, results=results, errors=errors))
+                break
+            except IntegrityError:
+                continue
+
+
+def usage_history(db: Session, period: str, since: datetime, until: datetime,
+                  license_id: Optional[int] = None) -> List[Dict]:
+    """Ряд по часам или суткам за [since, until), пропуски заполнены нулями
+
+    Без license_id суммируются все лицензии.
+    """
+    start = bucket_start(since, period)
+    rows = db.query(
+        UsageRollup.bucket,
+        func.sum(UsageRollup.requests),
+        func.sum(UsageRollup.results),
+        func.sum(UsageRollup.errors),
+    ).filter(
+        UsageRollup.period == period,
+        UsageRollup.bucket >= start,
+        UsageRollup.bucket < until
+    )
+    if license_id is not None:
+        rows = rows.filter(UsageRollup.license_id == license_id)
+    values = {bucket: (requests, results, errors) for bucket, requests, results, errors
+              in rows.group_by(UsageRollup.bucket)}
+
+    series = []
+    bucket = start
+    while bucket < until:
+        requests, results, errors = values.get(bucket, (0, 0, 0))
+        series.append({"bucket": bucket, "requests": requests or 0,
+                       "results": results or 0, "errors": errors or 0})
+        bucket += PERIODS[period]
+    return series
+
+
+def licenses_page(db: Session, page: int = 1, per_page: int = 50, sort: str = "created_at",
+                  order: str = "desc", q: str = "") -> Dict:
+    """Страница списка лицензий с использованием за сутки и за WINDOW_DAYS
+
+    Использование берется из daily_usage и суточных агрегатов,
+    сортировка и пагинация выполняются в базе.
+    """
+    now = datetime.utcnow()
+    window = db.query(
+        UsageRollup.license_id.label("license_id"),
+        func.sum(UsageRollup.requests).label("requests"),
+        func.sum(UsageRollup.results).label("results"),
+        func.sum(UsageRollup.errors).label("errors"),
+    ).filter(
+        UsageRollup.period == "day",
+        UsageRollup.bucket >= bucket_start(now - timedelta(days=WINDOW_DAYS - 1), "day")
+    ).group_by(UsageRollup.license_id).subquery()
+
+    columns = {
+        "created_at": License.created_at,
+        "owner_name": License.owner_name,
+        "expires_at": License.expires_at,
+        "requests_per_day": License.requests_per_day,
+        "total_requests": License.total_requests,
+        "today_requests": func.coalesce(DailyUsage.count, 0),
+        "requests_30d": func.coalesce(window.c.requests, 0),
+        "results_30d": func.coalesce(window.c.results, 0),
+        "errors_30d": func.coalesce(window.c.errors, 0),
+    }
+    query = db.query(
+        License, columns["today_requests"], columns["requests_30d"],
+        columns["results_30d"], columns["errors_30d"]
+    ).outerjoin(
+        DailyUsage, and_(DailyUsage.license_id == License.id, DailyUsage.day == now.date())
+    ).outerjoin(window, window.c.license_id == License.id)
+
+    total = db.query(func.count(License.id))
+    if q:
+        pattern = f"%{q}%"
+        condition = or_(License.owner_name.ilike(pattern), License.email.ilike(pattern),
+                        License.key.ilike(pattern))
+        query = query.filter(condition)
+        total = total.filter(condition)
+
+    column = columns.get(sort, License.created_at)
+    query = query.order_by(column.asc() if order == "asc" else column.desc(), License.id)
+
+    items = []
+    for license, today_requests, requests, results, errors in \
+            query.limit(per_page).offset((page - 1) * per_page):
+        items.append({
+            "id": license.id,
+            "key": license.key,
+            "owner_name": license.owner_name,
+            "email": license.email,
+            "is_active": license.is_active,
+            "created_at": license.created_at,
+            "expires_at": license.expires_at,
+            "requests_per_day": license.requests_per_day,
+            "priority": license.priority,
+            "today_requests": today_requests,
+            "total_requests": license.total_requests,
+            "requests_30d": requests,
+            "results_30d": results,
+            "errors_30d": errors,
+        })
+    return {"total": total.scalar(), "page": page, "per_page": per_page,
+            "sort": sort, "order": order, "items": items}
@@ -0,0 +1,83 @@
+import time
+from typing import Callable, Optional, Tuple
+
+from metrics import PARSER_WAIT_SECONDS
+
+NETWORK_IDLE_JS = """
+return [document.readyState, performance.getEntriesByType('resource').length];
+"""
+
+
+class AdaptiveWaiter:
+    """Ожидание состояний страницы вместо фиксированных пауз
+
+    Условие проверяется сразу, а затем с нарастающим интервалом,
+    ограниченным max_poll. Все время ожидания суммируется в wait_time,
+    чтобы можно было сравнить его со временем собственно разбора.
+    """
+
+    def __init__(self, driver, timeout: float = 10, poll: float = 0.05, max_poll: float = 0.5):
+        self.driver = driver
+        self.timeout = timeout
+        self.poll = poll
+        self.max_poll = max_poll
+        self.wait_time = 0.0
+
+    def reset(self):
+        self.wait_time = 0.0
+
+    def until(self, condition: Callable, timeout: Optional[float] = None, kind: str = "condition"):
+        """Ожидание, пока condition(driver) вернет истинное значение
+
+        Возвращает результат условия или None по истечении таймаута.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+        delay = self.poll
+        try:
+            while True:
+                try:
+                    result = condition(self.driver)
+                except Exception:
+                    result = None
+                if result:
+                    return result
+                now = time.monotonic()
+                if now >= deadline:
+                    return None
+                time.sleep(min(delay, deadline - now))
+                delay = min(delay * 2, self.max_poll)
+        finally:
+            elapsed = time.monotonic() - started
+            self.wait_time += elapsed
+            PARSER_WAIT_SECONDS.observe(elapsed, kind=kind)
+
+    def for_element(self, locator: Tuple[str, str], timeout: Optional[float] = None):
+        """Ожидание появления элемента"""
+        def condition(driver):
+            elements = driver.find_elements(*locator)
+            return elements[0] if elements else None
+        return self.until(condition, timeout, kind="element")
+
+    def for_network_idle(self, idle_time: float = 0.3, timeout: Optional[float] = None) -> bool:
+        """Ожидание, пока страница загружена и новые ресурсы не запрашиваются idle_time секунд"""
+        state = {"count": -1, "since": time.monotonic()}
+
+        def condition(driver):
+            ready, count = driver.execute_script(NETWORK_IDLE_JS)
+            now = time.monotonic()
+            if count != state["count"]:
+                state["count"] = count
+                state["since"] = now
+                return False
+            return ready == "complete" and now - state["since"] >= idle_time
+        return bool(self.until(condition, timeout, kind="network_idle"))
+
+    def pause(self, seconds: float):
+        """Явная пауза, учитываемая в общем времени ожидания"""
+        started = time.monotonic()
+        time.sleep(seconds)
+        elapsed = time.monotonic() - started
+        self.wait_time += elapsed
+        PARSER_WAIT_SECONDS.observe(elapsed, kind="pause")
@@ -0,0 +1,124 @@
+import re
+import sys
+import json
+import base64
+import logging
+from typing import Dict, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Запросы фронтенда карт за результатами поиска
+SEARCH_API_PATTERN = re.compile(r"/maps/api/search(?:\?|$)")
+
+
+def _text(value) -> str:
+    return str(value).strip() if value not in (None, "") else ""
+
+
+def _names(values, key: str) -> List[str]:
+    names = []
+    for value in values or []:
+        name = value.get(key) if isinstance(value, dict) else value
+        if name:
+            names.append(_text(name))
+    return names
+
+
+def parse_item(item: Dict) -> Optional[Dict]:
+    """Запись организации из элемента ответа поиска
+
+    Возвращает None для элементов, не являющихся организациями
+    (топонимы, рекламные блоки).
+    """
+    if item.get("type", "business") != "business" or not item.get("id"):
+        return None
+
+    rating = item.get("ratingData") or {}
+    coordinates = item.get("coordinates") or []
+    longitude, latitude = (coordinates + [None, None])[:2]
+    working = item.get("workingTimeText") or item.get("workingTime") or ""
+
+    return {
+        "id": _text(item["id"]),
+        "name": _text(item.get("title") or item.get("name")),
+        "categories": ", ".join(_names(item.get("categories"), "name")),
+        "rating": _text(rating.get("ratingValue")),
+        "reviews_count": _text(rating.get("reviewCount")) or "0",
+        "address": _text(item.get("address") or item.get("fullAddress")),
+        "phones": ";".join(_names(item.get("phones"), "number")),
+        "website": (_names(item.get("urls"), "value") or [""])[0],
+        "schedule": working if isinstance(working, str) else "",
+        "latitude": _text(latitude),
+        "longitude": _text(longitude),
+    }
+
+
+def parse_search_response(payload: Union[str, bytes, Dict]) -> List[Dict]:
+    """Организации из JSON-ответа /maps/api/search в формате парсера"""
+    if isinstance(payload, (str, bytes)):
+        payload = json.loads(payload)
+    data = payload.get("data", payload)
+    items = data.get("items") or []
+    return [record for record in map(parse_item, items) if record]
+
+
+class SearchResponseCapture:
+    """Перехват ответов поиска из performance-лога Chrome
+
+    Драйвер должен быть запущен с goog:loggingPrefs {"performance": "ALL"}.
+    Каждый вызов collect возвращает организации из ответов, полностью
+    загруженных после предыдущего вызова, тела ответов читаются через
+    Network.getResponseBody. Ответы, которые еще загружаются, ждут
+    следующего вызова.
+    """
+
+    def __init__(self, driver, pattern=SEARCH_API_PATTERN):
+        self.driver = driver
+        self.pattern = pattern
+        self.responses = 0
+        self._pending = set()
+
+    def reset(self):
+        """Сброс перед новым поиском: счетчик ответов и накопленные события
+
+        Драйверы из пула переиспользуются, и без обнуления responses
+        следующий поиск считал бы перехват уже работающим.
+        """
+        self.responses = 0
+        self._pending.clear()
+        self.driver.get_log("performance")
+
+    def _request_ids(self) -> Iterator[str]:
+        for entry in self.driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            params = message.get("params", {})
+            if method == "Network.responseReceived":
+                if self.pattern.search(params["response"]["url"]):
+                    self._pending.add(params["requestId"])
+            elif method == "Network.loadingFinished" and params.get("requestId") in self._pending:
+                self._pending.discard(params["requestId"])
+                yield params["requestId"]
+
+    def collect(self) -> List[Dict]:
+        records = []
+        for request_id in self._request_ids():
+            try:
+                body = self.driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+            except Exception as e:
+                # Тело могло быть уже вытеснено из буфера браузера
+                logger.warning(f"Не удалось получить тело ответа поиска: {e}")
+                continue
+            content = body["body"]
+            if body.get("base64Encoded"):
+                content = base64.b64decode(content)
+            records.extend(parse_search_response(content))
+            self.responses += 1
+        return records
+
+
+if __name__ == "__main__":
+    # Проверка разбора сохраненного ответа: python yandex_api.py response.json
+    with open(sys.argv[1], encoding="utf-8") as f:
+        for record in parse_search_response(f.read()):
+            print(json.dumps(record, ensure_ascii=False))